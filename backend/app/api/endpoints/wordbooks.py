@@ -10,6 +10,12 @@ from ...schemas.wordbooks import WordBook, WordBookResponse, WordBookCreate, Wor
 from ...schemas.words import WordResponse
 from ...schemas.search import SearchResponse
 from ...core.security import get_current_user_uid
+from ...core.pagination import encode_cursor, decode_cursor
+from ...services import wordbook_search
+from ...services import public_feed
+from ...services.wordbook_overlay import ChunkedBatch, add_copy, count_copies, delete_words, release_copy, resolve_words, retain_wordbook
+from ...services.wordbook_sync import TOMBSTONE_COLLECTION, tombstone
+from ...services.wordbook_query import SORT_FIELDS, WordbookSearchPlan, count_wordbooks, plan_wordbook_search, stream_wordbooks
 router = APIRouter()
 
 @router.post(
@@ -29,11 +35,15 @@ async def create_wordbook(request: WordBook, db: firestore.Client = Depends(get_
         "num_words": 0,
         "description": request.description,
         "created_at": now,
-        "updated_at": now
+        "updated_at": now,
+        # この単語帳の複製の数 (0なら単語の変更・削除で複製のために内容を残さない)
+        "num_copies": 0,
     }
 
     doc_ref = db.collection("wordbooks").document(wordbook_data["id"])
     doc_ref.set(wordbook_data)
+    wordbook_search.index_wordbook(wordbook_data)
+    public_feed.feed_wordbook(wordbook_data)
     return wordbook_data
 
 @router.post(
@@ -41,7 +51,7 @@ async def create_wordbook(request: WordBook, db: firestore.Client = Depends(get_
     status_code=status.HTTP_201_CREATED,
     response_model=WordBookResponse,
     summary="単語帳を複製",
-    description="指定された単語帳IDの単語帳と単語を複製する"
+    description="指定された単語帳IDの単語帳と単語を複製する (単語はコピーせず、複製元から引き継ぐ)"
 )
 async def duplicate_wordbook(
     wordbook_id: str,
@@ -49,6 +59,12 @@ async def duplicate_wordbook(
     db: firestore.Client = Depends(get_db),
     uid: str = Depends(get_current_user_uid)
 ):
+    """
+    単語帳を複製するエンドポイント。
+    単語はコピーせず、複製した時点 (base_cutoff) で複製元にあった単語を引き継ぐので、単語の数によらず
+    書き込みは複製した単語帳と複製元の複製の数 (num_copies) の2件で済む。
+    引き継いだ単語は、編集・削除したときに初めて複製した単語帳の単語として保存する
+    """
     # 元の単語帳の存在確認
     original_wordbook_ref = db.collection("wordbooks").document(wordbook_id)
     original_wordbook_doc = original_wordbook_ref.get()
@@ -72,71 +88,121 @@ async def duplicate_wordbook(
         "user_name": request.user_name,
         "owner_id": uid,
         "is_public": request.is_public,
-        "num_words": 0,  # 後で更新
+        "num_words": original_wordbook_data.get("num_words", 0),
         "description": request.description,
         "created_at": now,
-        "updated_at": now
+        "updated_at": now,
+        # 引き継ぐ単語の複製元と、引き継ぐ単語の範囲 (この日時までに複製元に加わった単語)
+        "base_wordbook_id": wordbook_id,
+        "base_cutoff": now,
+        # 引き継いだ単語のうち、この単語帳で削除したもの (複製元でのID)
+        "hidden_word_ids": [],
+        "num_copies": 0,
     }
-
-    # バッチ処理で単語帳と単語を同時に作成
-    batch = db.batch()
-
-    # 新しい単語帳を作成
-    new_wordbook_ref = db.collection("wordbooks").document(new_wordbook_id)
-    batch.set(new_wordbook_ref, new_wordbook_data)
-
-    # 元の単語帳の単語を取得して複製
-    words_query = db.collection("words").where("wordbook_id", "==", wordbook_id)
-    words = list(words_query.stream())
-
-    word_count = 0
-    for word_doc in words:
-        word_data = word_doc.to_dict()
-        new_word_id = str(uuid4())
-        new_word_data = {
-            **word_data,
-            "id": new_word_id,
-            "wordbook_id": new_wordbook_id,
-            "owner_id": uid,
-            "created_at": now,
-            "updated_at": now
-        }
-        
-        new_word_ref = db.collection("words").document(new_word_id)
-        batch.set(new_word_ref, new_word_data)
-        word_count += 1
-    
-    # 単語数を更新
-    new_wordbook_data["num_words"] = word_count
-    batch.update(new_wordbook_ref, {"num_words": word_count})
-    
-    # バッチ実行
+    batch = ChunkedBatch(db)
+    batch.set(db.collection("wordbooks").document(new_wordbook_id), new_wordbook_data)
+    add_copy(batch, db, original_wordbook_data)
     batch.commit()
+    wordbook_search.index_wordbook(new_wordbook_data)
+    public_feed.feed_wordbook(new_wordbook_data)
     
     return WordBookResponse(**new_wordbook_data)
 
-from fastapi import Request
+from fastapi import Request, Response
+
+def parse_cursor(cursor: str, sort_by: str, sort_order: str) -> tuple:
+    try:
+        return decode_cursor(cursor, sort_by, sort_order)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+def page_wordbooks(
+    wordbooks_ref: firestore.Query,
+    limit: int,
+    cursor: Optional[str],
+    exclude_owner_id: Optional[str] = None
+) -> tuple[List[dict], Optional[str]]:
+    """
+    作成日時の新しい順 (同じ日時はIDの順) にカーソルの次から limit 件を取得し、次のページのカーソルと返す。
+    start_after で続きから読むため、後ろのページでも読み込むのは1ページ分だけで済む。
+    """
+    wordbooks_ref = wordbooks_ref.order_by("created_at", direction=firestore.Query.DESCENDING)
+    wordbooks_ref = wordbooks_ref.order_by("__name__", direction=firestore.Query.DESCENDING)
+    if cursor:
+        created_at, wordbook_id = parse_cursor(cursor, "created_at", "desc")
+        wordbooks_ref = wordbooks_ref.start_after({"created_at": created_at, "__name__": wordbook_id})
+    if exclude_owner_id is None:
+        # 次のページがあるかどうかを知るために1件多く読む
+        wordbooks_ref = wordbooks_ref.limit(limit + 1)
+
+    result = []
+    for doc in wordbooks_ref.stream():
+        wordbook_data = doc.to_dict()
+        if exclude_owner_id is not None and wordbook_data.get("owner_id") == exclude_owner_id:
+            continue
+        result.append(wordbook_data)
+        if len(result) > limit:
+            break
+
+    if len(result) <= limit:
+        return result, None
+    last = result[limit - 1]
+    return result[:limit], encode_cursor("created_at", "desc", last["created_at"], last["id"])
 
 @router.get(
         "/",
         summary="ユーザの単語帳を取得",
         response_model=List[WordBookResponse],
-        description="指定されたユーザIDに紐づく単語帳のリストを取得する"
+        description="指定されたユーザIDに紐づく単語帳のリストを取得する。limit または cursor を指定すると作成日時の新しい順に1ページ分を返し、次のページのカーソルを X-Next-Cursor ヘッダーで返す"
 )
-async def get_owned_wordbooks(request: Request, db: firestore.Client = Depends(get_db), uid: str = Depends(get_current_user_uid)):
+async def get_owned_wordbooks(
+    request: Request,
+    response: Response,
+    limit: Optional[int] = Query(None, description="1ページの件数 (指定しなければ全件)", ge=1, le=100),
+    cursor: Optional[str] = Query(None, description="前のページの X-Next-Cursor"),
+    db: firestore.Client = Depends(get_db),
+    uid: str = Depends(get_current_user_uid)
+):
     wordbooks_ref = db.collection("wordbooks").where("owner_id", "==", uid)
-    docs = wordbooks_ref.stream()
-    return [WordBookResponse(**doc.to_dict()) for doc in docs]
+    if limit is None and cursor is None:
+        docs = wordbooks_ref.stream()
+        return [WordBookResponse(**doc.to_dict()) for doc in docs]
+
+    wordbooks, next_cursor = page_wordbooks(wordbooks_ref, limit or 20, cursor)
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return [WordBookResponse(**wordbook_data) for wordbook_data in wordbooks]
 
 @router.get(
         "/public/",
         summary="公開単語帳を取得",
         response_model=List[WordBookResponse],
-        description="公開されている単語帳のリストを取得する"
+        description="公開されている単語帳のリストを取得する。limit または cursor を指定すると作成日時の新しい順に1ページ分を返し、次のページのカーソルを X-Next-Cursor ヘッダーで返す"
 )
-async def get_public_wordbooks(db: firestore.Client = Depends(get_db), uid: str = Depends(get_current_user_uid)):
+async def get_public_wordbooks(
+    response: Response,
+    limit: Optional[int] = Query(None, description="1ページの件数 (指定しなければ全件)", ge=1, le=100),
+    cursor: Optional[str] = Query(None, description="前のページの X-Next-Cursor"),
+    db: firestore.Client = Depends(get_db),
+    uid: str = Depends(get_current_user_uid)
+):
+    feed = public_feed.get_public_feed()
+    if feed is not None:
+        # 作成済みの公開単語帳の一覧 (レスポンスのJSON) から、自分の単語帳を除いて1ページ分 (または全件) をつなげて返す
+        after = parse_cursor(cursor, "created_at", "desc") if cursor else None
+        paginate = limit is not None or cursor is not None
+        content, next_cursor = feed.page((limit or 20) if paginate else None, after, exclude_owner_id=uid)
+        headers = {"X-Next-Cursor": next_cursor} if next_cursor else None
+        return Response(content=content, media_type="application/json", headers=headers)
+
     # 公開されている単語帳のみを取得（単一条件クエリ）
     wordbooks_ref = db.collection("wordbooks").where("is_public", "==", True)
+    if limit is not None or cursor is not None:
+        wordbooks, next_cursor = page_wordbooks(wordbooks_ref, limit or 20, cursor, exclude_owner_id=uid)
+        if next_cursor:
+            response.headers["X-Next-Cursor"] = next_cursor
+        return [WordBookResponse(**wordbook_data) for wordbook_data in wordbooks]
+
     docs = wordbooks_ref.stream()
 
     # 自分の単語帳を除外（アプリケーション側でフィルタ）
@@ -171,10 +237,9 @@ async def get_words_in_wordbook(wordbook_id: str, db: firestore.Client = Depends
         if uid is None or wordbook_data.get("owner_id") != uid:
             raise HTTPException(status_code=403, detail="Access denied")
 
-    # 指定された単語帳に含まれる単語を取得
-    words_query = db.collection("words").where("wordbook_id", "==", wordbook_id)
-    words = words_query.stream()
-    return [WordResponse(**doc.to_dict()) for doc in words]
+    # 指定された単語帳に含まれる単語を取得 (複製した単語帳では、複製元から引き継いだ単語を含む)
+    words = resolve_words(db, wordbook_data)
+    return [WordResponse(**word_data) for word_data in words]
 
 @router.put("/{wordbook_id}/",
     response_model=WordBookResponse,
@@ -211,12 +276,39 @@ async def update_wordbook(
 
     # 更新されたデータを返す
     updated_doc = wordbook_ref.get()
+    wordbook_search.index_wordbook(updated_doc.to_dict())
+    public_feed.feed_wordbook(updated_doc.to_dict())
     return WordBookResponse(**updated_doc.to_dict())
 
+def scan_wordbooks(
+    db: firestore.Client,
+    plan: WordbookSearchPlan,
+    q: Optional[str],
+    sort_by: str,
+    sort_order: str,
+    after: Optional[tuple] = None,
+    limit: Optional[int] = None,
+) -> List[dict]:
+    """
+    検索インデックスが使えないときの検索。サーバー側で絞り込んだクエリ (plan) を sort_by の順に読み込みながら、
+    クエリ文字列の部分一致をアプリケーション側で確かめる。
+    after (ソートキーの値, ID) を指定するとその次から読み込み、limit を指定すると limit 件が見つかった時点で読み込みをやめる。
+    """
+    filtered_docs = []
+    query_norm = wordbook_search.normalize_search_text(q) if q and q.strip() else ''
+    for wordbook_data in stream_wordbooks(db, plan, sort_by, sort_order, after):
+        # 柔軟なテキスト検索 (記号・空白を除いて小文字にした部分一致)
+        if query_norm and query_norm not in wordbook_search.searchable_text(wordbook_data):
+            continue
+        filtered_docs.append(wordbook_data)
+        if limit is not None and len(filtered_docs) >= limit:
+            break
+    return filtered_docs
+
 @router.get("/search",
     response_model=SearchResponse,
     summary="単語帳を検索",
-    description="クエリに基づいて単語帳を検索し、フィルタリング・ソート機能を提供する"
+    description="クエリに基づいて単語帳を検索し、フィルタリング・ソート機能を提供する。cursor に前のページの next_cursor を指定すると、その続きを返す"
 )
 async def search_wordbooks(
     q: Optional[str] = Query(None, description="検索クエリ"),
@@ -227,64 +319,38 @@ async def search_wordbooks(
     sort_order: str = Query("desc", description="ソート順"),
     page: int = Query(1, description="ページ番号", ge=1),
     limit: int = Query(20, description="1ページの件数", ge=1, le=100),
+    cursor: Optional[str] = Query(None, description="前のページの next_cursor (指定すると page は使わない)"),
     db: firestore.Client = Depends(get_db),
     uid: str = Depends(get_current_user_uid)
 ):
+    if sort_by not in SORT_FIELDS:
+        raise HTTPException(status_code=400, detail=f"sort_by must be one of: {', '.join(SORT_FIELDS)}")
+    after = parse_cursor(cursor, sort_by, sort_order) if cursor else None
     try:
-        # ベースクエリでまず全ての単語帳を取得
-        wordbooks_ref = db.collection("wordbooks")
-        # まずソートのみ適用
-        if sort_order == "desc":
-            wordbooks_ref = wordbooks_ref.order_by(sort_by, direction=firestore.Query.DESCENDING)
+        index = wordbook_search.get_wordbook_search_index()
+        if index is not None:
+            # 転置インデックスでクエリを含みうる単語帳だけを確かめ、必要な件数だけを並べる
+            offset = 0 if after is not None else (page - 1) * limit
+            page_docs, total, has_next = index.search_page(
+                q, uid, is_public, is_owned, min_words, sort_by, sort_order, after=after, offset=offset, limit=limit
+            )
         else:
-            wordbooks_ref = wordbooks_ref.order_by(sort_by, direction=firestore.Query.ASCENDING)
-        # 全件数を取得
-        all_docs = list(wordbooks_ref.stream())
-        # クライアントサイドでフィルタリング
-        filtered_docs = []
-        import re
-        def normalize(text):
-            if not text:
-                return ''
-            # 記号・空白を除去し小文字化
-            return re.sub(r'\W+', '', text).lower()
-
-        for doc in all_docs:
-            wordbook_data = doc.to_dict()
-            # セキュリティチェック: 他人の非公開単語帳は除外
-            is_owner = wordbook_data.get('owner_id') == uid
-            is_public_wordbook = wordbook_data.get('is_public', False)
-            if not is_owner and not is_public_wordbook:
-                continue
-            # is_public フィルター
-            if is_public is not None and wordbook_data.get('is_public') != is_public:
-                continue
-            # is_owned フィルター
-            if is_owned is not None:
-                if is_owned and not is_owner:
-                    continue
-                elif not is_owned and is_owner:
-                    continue
-            # min_words フィルター
-            if min_words is not None and wordbook_data.get('num_words', 0) < min_words:
-                continue
-            # 柔軟なテキスト検索
-            if q and q.strip():
-                query_norm = normalize(q)
-                searchable_text = f"{wordbook_data.get('name', '')} {wordbook_data.get('description', '')} {wordbook_data.get('user_name', '')}"
-                searchable_norm = normalize(searchable_text)
-                if query_norm not in searchable_norm:
-                    continue
-            filtered_docs.append(wordbook_data)
-        
-        total = len(filtered_docs)
-        total_pages = math.ceil(total / limit) if total > 0 else 1
-        
-        # ページネーション
-        start_index = (page - 1) * limit
-        end_index = start_index + limit
-        page_docs = filtered_docs[start_index:end_index]
-        
+            # インデックスの作成前・作成に失敗した場合は、条件をFirestoreのクエリに変換し (自分の単語帳と
+            # 公開単語帳だけを読む)、そのページと次のページの有無がわかるまでだけ読み込む
+            plan = plan_wordbook_search(uid, is_public, is_owned, min_words, sort_by)
+            start_index = 0 if after is not None else (page - 1) * limit
+            filtered_docs = scan_wordbooks(db, plan, q, sort_by, sort_order, after=after, limit=start_index + limit + 1)
+            page_docs = filtered_docs[start_index:start_index + limit]
+            has_next = len(filtered_docs) > start_index + limit
+            # 総数は集計クエリで数えられる場合だけ返す (クエリ文字列の部分一致はFirestoreで数えられない)
+            total = count_wordbooks(db, plan) if after is None and not (q and q.strip()) else None
+
+        total_pages = (math.ceil(total / limit) if total > 0 else 1) if total is not None else None
+        next_cursor = None
+        if has_next and page_docs:
+            last = page_docs[-1]
+            next_cursor = encode_cursor(sort_by, sort_order, last[sort_by], last["id"])
+
         # レスポンス作成
         wordbooks = [WordBookResponse(**doc) for doc in page_docs]
         return SearchResponse(
@@ -292,9 +358,10 @@ async def search_wordbooks(
             total=total,
             page=page,
             total_pages=total_pages,
-            has_next=page < total_pages,
-            has_prev=page > 1,
-            query=q or ""
+            has_next=has_next,
+            has_prev=page > 1 or after is not None,
+            query=q or "",
+            next_cursor=next_cursor
         )
         
     except Exception as e:
@@ -315,16 +382,26 @@ async def delete_wordbook(wordbook_id: str, db: firestore.Client = Depends(get_d
     if not wordbook_doc.exists:
         raise HTTPException(status_code=404, detail="Wordbook not found")
 
-    if wordbook_doc.to_dict().get("owner_id") != uid:
+    wordbook_data = wordbook_doc.to_dict()
+    if wordbook_data.get("owner_id") != uid:
         raise HTTPException(status_code=403, detail="You do not have permission to delete this wordbook")
 
-    # 単語帳に紐づく単語を全て削除
-    words_ref = db.collection("words").where("wordbook_id", "==", wordbook_id)
-    batch = db.batch()
-    for doc in words_ref.stream():
-        batch.delete(doc.reference)
+    # 単語の数が多くてもバッチの上限を超えないように、分けてコミットする
+    batch = ChunkedBatch(db)
 
-    # 単語帳自体を削除
+    if count_copies(db, wordbook_data) > 0:
+        # 複製がある単語帳の単語は、複製が引き継げるように残す (書き込みは複製・単語の数によらない)
+        retain_wordbook(batch, db, wordbook_data)
+    else:
+        # 単語帳に紐づく単語を全て削除
+        delete_words(batch, db, wordbook_id)
+    # 複製元の複製の数を減らす (削除した複製元の最後の複製なら、残していた単語も削除する)
+    release_copy(batch, db, wordbook_data)
+
+    # 単語帳自体を削除し、削除したことを他のインスタンスの検索インデックス・公開単語帳の一覧に伝える記録を残す
     batch.delete(wordbook_ref)
+    batch.set(db.collection(TOMBSTONE_COLLECTION).document(wordbook_id), tombstone(wordbook_id, datetime.now()))
 
-    batch.commit()
\ No newline at end of file
+    batch.commit()
+    wordbook_search.remove_wordbook(wordbook_id)
+    public_feed.remove_feed_wordbook(wordbook_id)
\ No newline at end of file
@@ -1,16 +1,79 @@
-from fastapi import APIRouter, status, Depends, HTTPException
+from fastapi import APIRouter, status, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
 from firebase_admin import firestore
 from datetime import datetime
+import json
+import os
 from uuid import uuid4
 
 from app.core.firebase import get_db
 from app.core.security import get_current_user_uid
-from ...schemas.words import WordRequest, WordResponse, WordGenerated
-from ...services.words import generate_enhanced_word_info, get_dictionary_data_for_word, get_word_info_from_free_dictionary
+from ...schemas.words import WordRequest, WordResponse, WordGenerated, WordBatchRequest, WordBatchResponse, WordSuggestion, WordSuggestResponse
+from ...services.words import client as llm_client, get_enhanced_word, word_cache, word_flight, free_dictionary_cache, local_dictionary
+from ...services.word_stream import stream_enhanced_word
+from ...services.word_batch import get_enhanced_words_batch
+from ...services.word_suggest import get_suggestion_index
+from ...services.word_cache import normalize_word
+from ...services.wordbook_search import adjust_wordbook_num_words
+from ...services.public_feed import adjust_feed_num_words
+from ...services.wordbook_overlay import ChunkedBatch, get_word, materialize_word, retain_version, split_overlay_word_id
 
 router = APIRouter()
 
 
+@router.get(
+    "/cache/stats/",
+    summary="単語キャッシュの統計を取得",
+    description="AI拡張単語情報キャッシュのヒット・ミス・追い出し件数、同時リクエストの集約件数、Free Dictionary APIキャッシュ、同梱の辞書ファイルの統計を返す。"
+)
+async def get_word_cache_stats() -> dict:
+    return {
+        **word_cache.stats(),
+        "single_flight": word_flight.stats(),
+        "free_dictionary": free_dictionary_cache.stats(),
+        "local_dictionary": local_dictionary.stats() if local_dictionary else None,
+    }
+
+@router.get(
+    "/llm/stats/",
+    summary="LLMクライアントの統計を取得",
+    description="LLM呼び出しの同時実行数・待機キューの深さ・レイテンシを返す。"
+)
+async def get_llm_stats() -> dict:
+    return llm_client.stats()
+
+@router.get(
+    "/suggest/",
+    response_model=WordSuggestResponse,
+    summary="単語の入力補完・綴り訂正候補を取得",
+    description="起動時に作成したメモリ上のインデックスから、入力で始まる単語と綴りが近い単語を返す。"
+)
+async def suggest_words(
+    q: str = Query(..., min_length=1, max_length=64, description="入力中の文字列"),
+    limit: int = Query(10, ge=1, le=50, description="それぞれの候補の最大件数"),
+) -> WordSuggestResponse:
+    index = get_suggestion_index()
+    if index is None:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="候補検索用インデックスが利用できません"
+        )
+    return WordSuggestResponse(
+        query=normalize_word(q),
+        exists=index.contains(q),
+        completions=index.prefix(q, limit),
+        corrections=[WordSuggestion(word=word, distance=distance) for word, distance in index.corrections(q, limit)],
+    )
+
+@router.get(
+    "/suggest/stats/",
+    summary="候補検索用インデックスの統計を取得",
+    description="収録語数・削除インデックスの件数・作成時間・おおよそのメモリ使用量を返す。"
+)
+async def get_suggest_stats() -> dict:
+    index = get_suggestion_index()
+    return index.stats() if index else {"words": 0}
+
 @router.get(
     "/{word}/",
     response_model=WordGenerated,
@@ -20,10 +83,39 @@ router = APIRouter()
 async def get_enhanced_word_info(
     word: str,
 ) -> WordGenerated:
-    dictionary_data = await get_dictionary_data_for_word(word)
-    free_dictionary_data = await get_word_info_from_free_dictionary(word)
-    enhanced_info = await generate_enhanced_word_info(dictionary_data, free_dictionary_data)
-    return enhanced_info
+    return await get_enhanced_word(word)
+
+@router.get(
+    "/{word}/stream/",
+    summary="単語情報をAIで拡張してストリーミング取得",
+    description="AIの生成結果を NDJSON 形式で逐次返す。定義・類義語・例文が1つ完成するたびに1行のイベントを送信し、最後に完成した単語情報を `done` イベントで返す。"
+)
+async def stream_enhanced_word_info(word: str) -> StreamingResponse:
+    async def ndjson():
+        async for event in stream_enhanced_word(word):
+            yield json.dumps(event, ensure_ascii=False) + "\n"
+
+    return StreamingResponse(
+        ndjson(),
+        media_type="application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@router.post(
+    "/batch/",
+    response_model=WordBatchResponse,
+    summary="複数の単語情報をAIで拡張して一括取得",
+    description="辞書データを一括で読み込み、複数の単語を1つのプロンプトにまとめてAIで生成する。一括生成に失敗した単語は個別に生成する。"
+)
+async def get_enhanced_words_info_batch(request: WordBatchRequest) -> WordBatchResponse:
+    max_words = int(os.getenv("WORD_BATCH_MAX_WORDS", "50"))
+    if len(request.words) > max_words:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"一度に取得できる単語は{max_words}語までです"
+        )
+    results, errors = await get_enhanced_words_batch(request.words)
+    return WordBatchResponse(results=results, errors=errors)
 
 @router.post("/", response_model=WordResponse, status_code=status.HTTP_201_CREATED)
 async def create_word(request: WordRequest, db: firestore.Client = Depends(get_db), uid: str = Depends(get_current_user_uid)):
@@ -38,9 +130,10 @@ async def create_word(request: WordRequest, db: firestore.Client = Depends(get_d
 
     batch = db.batch()
 
-    batch.update(wordbook_ref, {"num_words": firestore.Increment(1)})
-
     now = datetime.now()
+    # 単語数が変わったことを、他のインスタンスの検索インデックス・公開単語帳の一覧に伝えるため updated_at も更新する
+    batch.update(wordbook_ref, {"num_words": firestore.Increment(1), "updated_at": now})
+
     word_id = str(uuid4())
     word_ref = db.collection("words").document(word_id)
     word_data = {
@@ -58,6 +151,8 @@ async def create_word(request: WordRequest, db: firestore.Client = Depends(get_d
     batch.set(word_ref, word_data)
 
     batch.commit()
+    adjust_wordbook_num_words(request.wordbook_id, 1)
+    adjust_feed_num_words(request.wordbook_id, 1)
 
     return WordResponse(**word_data)
 
@@ -69,15 +164,16 @@ async def update_word(
     uid: str = Depends(get_current_user_uid)
 ):
     """
-    単語情報を更新するエンドポイント
+    単語情報を更新するエンドポイント。
+    複製した単語帳が複製元から引き継いだ単語は、このときに複製した単語帳の単語として保存する (新しいIDになる)
     """
-    word_ref = db.collection("words").document(word_id)
-    word_doc = word_ref.get()
+    found = get_word(db, word_id)
 
-    if not word_doc.exists:
+    if found is None:
         raise HTTPException(status_code=404, detail="Word not found")
 
-    if word_doc.to_dict().get("owner_id") != uid:
+    word_data, wordbook_data = found
+    if word_data.get("owner_id") != uid:
         raise HTTPException(status_code=403, detail="You do not have permission to update this word")
 
     now = datetime.now()
@@ -90,9 +186,20 @@ async def update_word(
         "updated_at": now
     }
 
-    word_ref.update(updated_data)
+    batch = ChunkedBatch(db)
+    # 単語帳に複製があれば、複製が引き継ぐ変更前の内容を残す
+    retain_version(batch, db, wordbook_data, word_data)
+    overlay = split_overlay_word_id(word_id)
+    if overlay is not None:
+        word_data = materialize_word(batch, db, wordbook_data, overlay[1], word_data, updated_data)
+    else:
+        # revised_at: 複製がこの日時より前に複製していれば、残した変更前の内容を引き継ぐ
+        updated_data["revised_at"] = now
+        batch.update(db.collection("words").document(word_id), updated_data)
+        word_data = {**word_data, **updated_data, "id": word_id}
+    batch.commit()
 
-    return WordResponse(**{**word_doc.to_dict(), **updated_data, "id": word_id})
+    return WordResponse(**word_data)
 
 @router.delete("/{word_id}/", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_word(
@@ -101,23 +208,37 @@ async def delete_word(
     uid: str = Depends(get_current_user_uid)
 ):
     """
-    単語情報を削除するエンドポイント
+    単語情報を削除するエンドポイント。
+    複製した単語帳が複製元から引き継いだ単語は、複製した単語帳で見えないようにする (複製元の単語は残る)
     """
-    word_ref = db.collection("words").document(word_id)
-    word_doc = word_ref.get()
+    found = get_word(db, word_id)
 
-    if not word_doc.exists:
+    if found is None:
         raise HTTPException(status_code=404, detail="Word not found")
 
-    if word_doc.to_dict().get("owner_id") != uid:
+    word_data, wordbook_data = found
+    if word_data.get("owner_id") != uid:
         raise HTTPException(status_code=403, detail="You do not have permission to delete this word")
 
-    # 単語帳の単語数を減らす
-    wordbook_ref = db.collection("wordbooks").document(word_doc.to_dict()["wordbook_id"])
-    batch = db.batch()
-    batch.update(wordbook_ref, {"num_words": firestore.Increment(-1)})
+    batch = ChunkedBatch(db)
+    # 単語帳に複製があれば、複製が引き継ぐ削除前の内容を残す
+    retain_version(batch, db, wordbook_data, word_data)
 
-    # 単語を削除
-    batch.delete(word_ref)
+    # 単語帳の単語数を減らす
+    wordbook_id = wordbook_data["id"]
+    wordbook_ref = db.collection("wordbooks").document(wordbook_id)
+    wordbook_updates = {"num_words": firestore.Increment(-1), "updated_at": datetime.now()}
+    overlay = split_overlay_word_id(word_id)
+    if overlay is not None:
+        wordbook_updates["hidden_word_ids"] = firestore.ArrayUnion([overlay[1]])
+    else:
+        # 単語を削除
+        batch.delete(db.collection("words").document(word_id))
+        if word_data.get("base_word_id"):
+            # 編集して保存した引き継ぎの単語を削除したときは、複製元の単語が再び見えないようにする
+            wordbook_updates["hidden_word_ids"] = firestore.ArrayUnion([word_data["base_word_id"]])
+    batch.update(wordbook_ref, wordbook_updates)
 
-    batch.commit()
\ No newline at end of file
+    batch.commit()
+    adjust_wordbook_num_words(wordbook_id, -1)
+    adjust_feed_num_words(wordbook_id, -1)
\ No newline at end of file
@@ -0,0 +1,56 @@
+from typing import Optional
+import logging
+import os
+import httpx
+
+_free_dictionary_client: Optional[httpx.AsyncClient] = None
+
+
+def create_free_dictionary_client(transport: Optional[httpx.AsyncBaseTransport] = None) -> httpx.AsyncClient:
+    """
+    Free Dictionary API用の共有HTTPクライアントを作成する。
+    Keep-Aliveで接続を使い回し、HTTP/2で多重化する (依存関係の httpx[http2] で h2 を入れている)。
+    """
+    max_connections = int(os.getenv("FREE_DICTIONARY_MAX_CONNECTIONS", "20"))
+    return httpx.AsyncClient(
+        http2=True,
+        limits=httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_connections,
+            keepalive_expiry=float(os.getenv("FREE_DICTIONARY_KEEPALIVE_SECONDS", "30")),
+        ),
+        timeout=httpx.Timeout(float(os.getenv("FREE_DICTIONARY_HTTP_TIMEOUT_SECONDS", "5.0"))),
+        transport=transport,
+    )
+
+
+def init_http_clients() -> None:
+    """アプリケーション起動時に共有HTTPクライアントを作成する"""
+    global _free_dictionary_client
+    if _free_dictionary_client is None:
+        _free_dictionary_client = create_free_dictionary_client()
+        logging.info(f"Free Dictionary API用HTTPクライアントを初期化しました")
+
+
+def get_free_dictionary_client() -> httpx.AsyncClient:
+    """
+    共有HTTPクライアントを返す。
+    lifespanを経由しない実行 (スクリプトやテスト) のために、未作成の場合はここで作成する。
+    """
+    if _free_dictionary_client is None:
+        init_http_clients()
+    return _free_dictionary_client
+
+
+def set_free_dictionary_client(client: Optional[httpx.AsyncClient]) -> None:
+    """共有HTTPクライアントを差し替える (ベンチマークやスタブサーバとの接続用)"""
+    global _free_dictionary_client
+    _free_dictionary_client = client
+
+
+async def close_http_clients() -> None:
+    """アプリケーション終了時に共有HTTPクライアントを閉じる"""
+    global _free_dictionary_client
+    if _free_dictionary_client is not None:
+        await _free_dictionary_client.aclose()
+        _free_dictionary_client = None
@@ -0,0 +1,147 @@
+from openai import AsyncOpenAI, APITimeoutError
+from dotenv import load_dotenv
+from typing import AsyncIterator, Optional
+import asyncio
+import os
+import time
+import httpx
+
+load_dotenv()
+
+
+class LLMClient:
+    """
+    非同期LLMクライアント。
+    共有のHTTPコネクションプールを使い、同時実行数をセマフォで制限する。
+    上限を超えたリクエストは待機キューに入り、その深さをメトリクスとして記録する。
+    """
+
+    def __init__(
+        self,
+        base_url: str,
+        api_key: Optional[str],
+        max_concurrency: int = 16,
+        timeout_seconds: float = 60.0,
+        max_retries: int = 2,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+    ):
+        self.max_concurrency = max_concurrency
+        self.timeout_seconds = timeout_seconds
+        self._http_client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=max_concurrency,
+                max_keepalive_connections=max_concurrency,
+            ),
+            timeout=httpx.Timeout(timeout_seconds, connect=10.0),
+            transport=transport,
+        )
+        self._client = AsyncOpenAI(
+            base_url=base_url,
+            api_key=api_key,
+            http_client=self._http_client,
+            max_retries=max_retries,
+        )
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+
+        # メトリクス
+        self.in_flight = 0
+        self.queued = 0
+        self.max_queue_depth = 0
+        self.completed = 0
+        self.failed = 0
+        self.timeouts = 0
+        self.total_queue_wait_seconds = 0.0
+        self.total_latency_seconds = 0.0
+
+    async def _acquire(self) -> None:
+        self.queued += 1
+        self.max_queue_depth = max(self.max_queue_depth, self.queued)
+        started = time.perf_counter()
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.queued -= 1
+            self.total_queue_wait_seconds += time.perf_counter() - started
+        self.in_flight += 1
+
+    def _release(self) -> None:
+        self.in_flight -= 1
+        self._semaphore.release()
+
+    async def create_chat_completion(self, timeout: Optional[float] = None, **kwargs):
+        """
+        チャット補完を非同期に実行する。
+        同時実行数の上限に達している場合は空きが出るまで待機する。
+        """
+        await self._acquire()
+        started = time.perf_counter()
+        try:
+            completion = await self._client.chat.completions.create(
+                timeout=timeout or self.timeout_seconds,
+                **kwargs,
+            )
+            self.completed += 1
+            return completion
+        except Exception as e:
+            self.failed += 1
+            if isinstance(e, (APITimeoutError, httpx.TimeoutException, TimeoutError)):
+                self.timeouts += 1
+            raise
+        finally:
+            self.total_latency_seconds += time.perf_counter() - started
+            self._release()
+
+    async def stream_chat_completion(self, timeout: Optional[float] = None, **kwargs) -> AsyncIterator[str]:
+        """
+        チャット補完をストリーミングで実行し、受信したテキスト断片を順に返す。
+        ストリームを読み終えるまで同時実行数の枠を占有する。
+        """
+        await self._acquire()
+        started = time.perf_counter()
+        try:
+            stream = await self._client.chat.completions.create(
+                timeout=timeout or self.timeout_seconds,
+                stream=True,
+                **kwargs,
+            )
+            async for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+            self.completed += 1
+        except Exception as e:
+            self.failed += 1
+            if isinstance(e, (APITimeoutError, httpx.TimeoutException, TimeoutError)):
+                self.timeouts += 1
+            raise
+        finally:
+            self.total_latency_seconds += time.perf_counter() - started
+            self._release()
+
+    def stats(self) -> dict:
+        finished = self.completed + self.failed
+        return {
+            "max_concurrency": self.max_concurrency,
+            "in_flight": self.in_flight,
+            "queue_depth": self.queued,
+            "max_queue_depth": self.max_queue_depth,
+            "completed": self.completed,
+            "failed": self.failed,
+            "timeouts": self.timeouts,
+            "avg_queue_wait_seconds": self.total_queue_wait_seconds / finished if finished else 0.0,
+            "avg_latency_seconds": self.total_latency_seconds / finished if finished else 0.0,
+        }
+
+    async def aclose(self) -> None:
+        await self._http_client.aclose()
+
+
+def create_llm_client_from_env(transport: Optional[httpx.AsyncBaseTransport] = None) -> LLMClient:
+    """環境変数から設定を読み込み、LLMクライアントを作成する"""
+    return LLMClient(
+        base_url=os.getenv("LLM_BASE_URL", "https://openrouter.ai/api/v1"),
+        api_key=os.getenv("OPENROUTER_API_KEY"),
+        max_concurrency=int(os.getenv("LLM_MAX_CONCURRENCY", "16")),
+        timeout_seconds=float(os.getenv("LLM_TIMEOUT_SECONDS", "60")),
+        max_retries=int(os.getenv("LLM_MAX_RETRIES", "2")),
+        transport=transport,
+    )
@@ -0,0 +1,42 @@
+from datetime import datetime, timezone
+from typing import Any
+import base64
+import binascii
+import json
+
+
+def as_utc(value: Any) -> Any:
+    """
+    タイムゾーンのない日時をUTCとして扱う (Firestoreもタイムゾーンのない日時はUTCとして保存し、
+    読み込むとUTCの日時を返すため、保存前の値と読み込んだ値を比較できるようにする)
+    """
+    if isinstance(value, datetime) and value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value
+
+
+def encode_cursor(sort_by: str, sort_order: str, value: Any, document_id: str) -> str:
+    """
+    ページの最後の要素の (ソートキーの値, ID) から、次のページを取得するための不透明なカーソルを作る。
+    ソートの条件も含め、別の条件のカーソルを使い回せないようにする。
+    """
+    if isinstance(value, datetime):
+        value = {"datetime": as_utc(value).isoformat()}
+    payload = json.dumps({"sort_by": sort_by, "sort_order": sort_order, "value": value, "id": document_id}, ensure_ascii=False)
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str, sort_by: str, sort_order: str) -> tuple[Any, str]:
+    """カーソルから (ソートキーの値, ID) を取り出す。壊れたカーソル、ソートの条件が異なるカーソルは ValueError"""
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        value, document_id = payload["value"], payload["id"]
+        if isinstance(value, dict):
+            value = datetime.fromisoformat(value["datetime"])
+    except (binascii.Error, UnicodeDecodeError, json.JSONDecodeError, KeyError, TypeError, ValueError) as e:
+        raise ValueError(f"Invalid cursor: {e}")
+    if payload.get("sort_by") != sort_by or payload.get("sort_order") != sort_order:
+        raise ValueError("Cursor does not match the sort order")
+    if not isinstance(document_id, str):
+        raise ValueError("Invalid cursor: id")
+    return value, document_id
@@ -0,0 +1,42 @@
+from typing import Any, Awaitable, Callable
+import asyncio
+import logging
+
+
+class SingleFlight:
+    """
+    同じキーに対する同時実行中の処理を1つにまとめる (single-flight)。
+    最初の呼び出しだけが処理を実行し、実行中に来た同じキーの呼び出しはその結果を共有する。
+    結果や例外は保持せず、処理が終わった時点でキーは解放される。
+    """
+
+    def __init__(self):
+        self._tasks: dict[str, asyncio.Task] = {}
+        self.executions = 0
+        self.coalesced = 0
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        task = self._tasks.get(key)
+        if task is None:
+            self.executions += 1
+            # 呼び出し元がキャンセルされても他の待機者に影響しないよう、独立したタスクとして実行する
+            task = asyncio.ensure_future(fn())
+            self._tasks[key] = task
+            task.add_done_callback(lambda t: self._forget(key, t))
+        else:
+            self.coalesced += 1
+        return await asyncio.shield(task)
+
+    def _forget(self, key: str, task: asyncio.Task) -> None:
+        if self._tasks.get(key) is task:
+            del self._tasks[key]
+        # 待機者が全員キャンセルされた場合に未取得の例外として警告されないよう取り出しておく
+        if not task.cancelled() and task.exception() is not None:
+            logging.debug(f"single-flight処理が失敗しました: {key} ({task.exception()!r})")
+
+    def stats(self) -> dict:
+        return {
+            "executions": self.executions,
+            "coalesced": self.coalesced,
+            "in_flight": len(self._tasks),
+        }
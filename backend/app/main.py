@@ -3,17 +3,30 @@ from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
 
 from .core.firebase import initialize_firebase
+from .core.http import init_http_clients, close_http_clients
 
 from .api.router import api_router
+from .services import words as word_service
+from .services.word_suggest import init_suggestion_index
+from .services.wordbook_search import init_wordbook_search_index, close_wordbook_search_index
+from .services.public_feed import init_public_feed, close_public_feed
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # アプリケーション起動時に実行
     print("アプリケーションを起動します...")
     initialize_firebase()
+    init_http_clients()
+    await init_suggestion_index(word_service.local_dictionary)
+    await init_wordbook_search_index()
+    await init_public_feed()
     yield
     # アプリケーション終了時に実行
     print("アプリケーションをシャットダウンします...")
+    await word_service.client.aclose()
+    await close_http_clients()
+    await close_wordbook_search_index()
+    await close_public_feed()
 
 app = FastAPI(lifespan=lifespan)
 
@@ -38,6 +51,8 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # 単語帳一覧の次のページのカーソル
+    expose_headers=["X-Next-Cursor"],
 )
 
 app.include_router(api_router, prefix="/api", tags=["api"])
\ No newline at end of file
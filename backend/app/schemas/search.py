@@ -11,12 +11,16 @@ class SearchQuery(BaseModel):
     sort_order: Optional[str] = "desc"
     page: Optional[int] = 1
     limit: Optional[int] = 20
+    cursor: Optional[str] = None
 
 class SearchResponse(BaseModel):
     wordbooks: List[WordBookResponse]
-    total: int
+    # カーソルでページを指定し、総数を数えられない場合は None
+    total: Optional[int] = None
     page: int
-    total_pages: int
+    total_pages: Optional[int] = None
     has_next: bool
     has_prev: bool
     query: str
+    # 次のページを取得するためのカーソル (次のページがなければ None)
+    next_cursor: Optional[str] = None
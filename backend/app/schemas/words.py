@@ -183,6 +183,8 @@ class WordGenerated(BaseModel):
     example_sentences: Optional[List[ExampleSentence]] = Field(None, description="例文オブジェクトのリスト")
     phonetics: Optional[PhoneticInfo] = Field(None, description="発音記号と音声データのオブジェクト")
     wordbook_id: str = Field(None, description="単語帳ID (オプション)")
+    missing_sources: Optional[List[str]] = Field(None, description="期限内に取得できなかったデータソース (部分的な結果の場合のみ)")
+    inflected_form: Optional[str] = Field(None, description="入力された変化形 (見出し語に解決して取得した場合のみ)")
 
     class Config:
         json_schema_extra = {
@@ -240,4 +242,45 @@ class DictionaryData(BaseModel):
     definitions: Optional[List[DictionaryDefinition]] = Field(None, description="定義のリスト")
     translations: Optional[dict[str, List[str]]] = Field(None, description="翻訳のリスト")
     raw_examples: Optional[List[str]] = Field(None, description="生の例文のリスト")
-    synonyms: Optional[List[str]] = Field(None, description="類義語のリスト")
\ No newline at end of file
+    synonyms: Optional[List[str]] = Field(None, description="類義語のリスト")
+    phonetics: Optional[PhoneticInfo] = Field(None, description="辞書構築時に保存された発音情報")
+
+
+class WordBatchRequest(BaseModel):
+    """
+    複数単語のAI拡張情報を一括取得するリクエストのスキーマ
+    """
+    words: List[str] = Field(..., min_length=1, description="取得する英単語のリスト")
+
+    class Config:
+        json_schema_extra = {
+            "example": {
+                "words": ["example", "information", "study"]
+            }
+        }
+
+
+class WordBatchResponse(BaseModel):
+    """
+    複数単語のAI拡張情報の一括取得レスポンスのスキーマ
+    """
+    results: dict[str, WordGenerated] = Field(..., description="正規化した単語をキーとする生成結果")
+    errors: dict[str, str] = Field(default_factory=dict, description="生成に失敗した単語とエラー内容")
+
+
+class WordSuggestion(BaseModel):
+    """
+    綴りの誤りを訂正した候補の単語
+    """
+    word: str = Field(..., description="候補の単語")
+    distance: int = Field(..., description="入力との編集距離")
+
+
+class WordSuggestResponse(BaseModel):
+    """
+    単語の入力補完・綴り訂正候補のレスポンスのスキーマ
+    """
+    query: str = Field(..., description="正規化した入力")
+    exists: bool = Field(..., description="入力と一致する単語が辞書にあるか")
+    completions: List[str] = Field(default_factory=list, description="入力で始まる単語 (辞書順)")
+    corrections: List[WordSuggestion] = Field(default_factory=list, description="綴りが近い単語 (編集距離の近い順)")
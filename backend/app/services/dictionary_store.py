@@ -0,0 +1,104 @@
+from typing import Iterator, Optional
+import json
+import logging
+import os
+import sqlite3
+import threading
+
+
+class LocalDictionary:
+    """
+    dictionary_builder が書き出した読み込み専用のSQLite辞書ファイルから辞書データを引く。
+    ファイルはimmutableとして開き、mmapで読み込むため、同じマシン上の複数ワーカーで
+    OSのページキャッシュを共有できる。接続はスレッドごとに作成する。
+    """
+
+    def __init__(self, path: str, mmap_size: int = 256 * 1024 * 1024):
+        self.path = path
+        self.mmap_size = mmap_size
+        self._local = threading.local()
+        self.hits = 0
+        self.misses = 0
+        meta = dict(self._connection().execute("SELECT key, value FROM meta").fetchall())
+        self.format_version = meta.get("format_version")
+        self.entry_count = int(meta.get("entry_count", 0))
+        # 変化形の対応表は形式バージョン2以降のファイルにのみある
+        self.has_inflections = self._connection().execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'inflections'"
+        ).fetchone() is not None
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(f"file:{self.path}?mode=ro&immutable=1", uri=True, check_same_thread=False)
+            conn.execute(f"PRAGMA mmap_size={self.mmap_size}")
+            self._local.conn = conn
+        return conn
+
+    def get(self, word: str) -> Optional[dict]:
+        """単語 (小文字) のドキュメントを返す。ない場合はNone"""
+        row = self._connection().execute("SELECT data FROM entries WHERE word = ?", (word,)).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return json.loads(row[0])
+
+    def contains(self, word: str) -> bool:
+        return self._connection().execute("SELECT 1 FROM entries WHERE word = ?", (word,)).fetchone() is not None
+
+    def get_lemmas(self, form: str) -> list[str]:
+        """変化形 (小文字) に対応する見出し語のリストを返す。対応表にない場合は空のリスト"""
+        if not self.has_inflections:
+            return []
+        row = self._connection().execute("SELECT lemmas FROM inflections WHERE form = ?", (form,)).fetchone()
+        return json.loads(row[0]) if row else []
+
+    def get_many(self, words: list[str]) -> dict[str, dict]:
+        """複数の単語のドキュメントをまとめて返す。辞書にない単語は結果に含めない"""
+        results = {}
+        # SQLiteのパラメータ数の上限を超えないよう分割して問い合わせる
+        for i in range(0, len(words), 500):
+            chunk = words[i:i + 500]
+            placeholders = ",".join("?" * len(chunk))
+            rows = self._connection().execute(
+                f"SELECT word, data FROM entries WHERE word IN ({placeholders})", chunk
+            ).fetchall()
+            for word, data in rows:
+                results[word] = json.loads(data)
+        self.hits += len(results)
+        self.misses += len(set(words)) - len(results)
+        return results
+
+    def iter_words(self) -> Iterator[str]:
+        """収録されている単語を辞書順に返す"""
+        for (word,) in self._connection().execute("SELECT word FROM entries ORDER BY word"):
+            yield word
+
+    def stats(self) -> dict:
+        return {
+            "path": self.path,
+            "format_version": self.format_version,
+            "entries": self.entry_count,
+            "has_inflections": self.has_inflections,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+def load_local_dictionary_from_env() -> Optional[LocalDictionary]:
+    """
+    環境変数 DICTIONARY_DB_PATH の辞書ファイルを開く。
+    ファイルがない、または開けない場合はNoneを返し、Firestoreのみから辞書データを取得する。
+    """
+    path = os.getenv("DICTIONARY_DB_PATH", os.path.join("data", "dictionary.sqlite3"))
+    if not path or not os.path.exists(path):
+        logging.info(f"ローカル辞書ファイルがないため、辞書データはFirestoreから取得します: {path}")
+        return None
+    try:
+        dictionary = LocalDictionary(path, mmap_size=int(os.getenv("DICTIONARY_DB_MMAP_BYTES", str(256 * 1024 * 1024))))
+    except sqlite3.Error as e:
+        logging.error(f"ローカル辞書ファイルを開けませんでした。Firestoreから取得します: {path} ({e})")
+        return None
+    logging.info(f"ローカル辞書ファイルを読み込みました: {path} ({dictionary.entry_count}語)")
+    return dictionary
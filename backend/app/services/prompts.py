@@ -0,0 +1,265 @@
+import hashlib
+import json
+import os
+
+from ..schemas.words import DictionaryData
+
+try:
+    import tiktoken
+    _tiktoken_encoding = tiktoken.get_encoding("o200k_base")
+except Exception:
+    # tiktoken は任意の依存関係 (未インストールやエンコーディング取得失敗時は概算を使う)
+    _tiktoken_encoding = None
+
+# 新しい要件に基づいたシステムプロンプト
+SYSTEM_PROMPT_TEMPLATE = """
+    あなたは、与えられた信頼できる辞書データに基づいて、単語情報を指定されたJSON形式で提供する専門家です。
+    絶対に辞書データにない情報は生成せず、事実に基づいて以下のタスクを実行してください。
+
+    # 辞書データ (事実情報):
+    {dictionary_json}
+
+    # 重要な制約:
+    1. 出力は必ず有効なJSONオブジェクトのみとしてください
+    2. 説明やコメント、マークダウン形式は一切含めないでください
+    3. JSON以外のテキストは絶対に含めないでください
+    4. JSONの構文エラーがないように注意してください
+
+    # あなたのタスク:
+    以下の制約と出力JSONフォーマットを「絶対厳守」して、上記の辞書データから情報を抽出し、整形してください。
+
+    - `definitions`: `part_of_speech` と `translations` を関連付け、品詞ごとに「日本語訳」をまとめたオブジェクトのリストを作成してください。各オブジェクトには `part_of_speech(品詞は日本語で生成してください。例：「名詞」「動詞」)`  と、それに対応する `japanese` (日本語訳のリスト) を含めてください。日本語訳は、"{word}"について最も一般的なものを3つ以内で選んでください。日本語訳は、品詞に則した訳である必要があります。出現するpart_of_speechは、一意である必要があります。
+    - `synonyms`: `synonyms`の中から、最も意味が一般的なものを最大5つ選んでください。ない場合は空の配列 `[]` を使用してください。なお、`synonyms`は英単語の同義語のリストであり、重複は除外してください。日本語は含めないでください。
+    - `example_sentences`: `raw_examples`を参考に、英語と日本語の両方を含む新しい例文を最大3つ生成してください。英語の例文は、{word}を確実に含む自然かつ簡潔な文である必要があります。日本語の例文は、英語の例文を自然な「日本語」に翻訳してください。例文は、与えられた単語の意味を明確に示す、純粋な日本語のものでなければなりません。例文は、`english`と`japanese`のペアで表現してください。
+
+    出力は以下のJSONフォーマットに厳密に従ってください（余計なテキストは一切含めず、有効なJSONのみ）:
+
+    {{
+        "english": "{word}",
+        "definitions": [
+            {{
+                "part_of_speech": "名詞",
+                "japanese": ["情報", "知識"]
+            }}
+        ],
+        "synonyms": ["data", "details"],
+        "example_sentences": [
+            {{
+                "english": "I need more information about the project.",
+                "japanese": "そのプロジェクトに関するもっと多くの情報が必要です。"
+            }}
+        ]
+    }}
+    """
+
+# 複数の単語をまとめて生成するためのシステムプロンプト
+# 指示文は1回だけ送り、単語ごとの辞書データを配列として埋め込む
+BATCH_SYSTEM_PROMPT_TEMPLATE = """
+    あなたは、与えられた信頼できる辞書データに基づいて、単語情報を指定されたJSON形式で提供する専門家です。
+    絶対に辞書データにない情報は生成せず、事実に基づいて以下のタスクを実行してください。
+
+    # 対象の単語 (この順番で出力してください):
+    {words_json}
+
+    # 辞書データ (事実情報、単語ごとの配列):
+    {dictionary_json}
+
+    # 重要な制約:
+    1. 出力は必ず有効なJSONオブジェクトのみとしてください
+    2. 説明やコメント、マークダウン形式は一切含めないでください
+    3. JSON以外のテキストは絶対に含めないでください
+    4. JSONの構文エラーがないように注意してください
+    5. 対象の単語それぞれについて、`words` 配列に1つずつオブジェクトを出力してください
+
+    # あなたのタスク:
+    各単語について、その単語の辞書データだけを使い、以下の制約に従って情報を抽出・整形してください。
+
+    - `english`: 対象の単語をそのまま出力してください。
+    - `definitions`: `part_of_speech` と `translations` を関連付け、品詞ごとに「日本語訳」をまとめたオブジェクトのリストを作成してください。各オブジェクトには `part_of_speech(品詞は日本語で生成してください。例：「名詞」「動詞」)`  と、それに対応する `japanese` (日本語訳のリスト) を含めてください。日本語訳は、その単語について最も一般的なものを3つ以内で選んでください。日本語訳は、品詞に則した訳である必要があります。出現するpart_of_speechは、一意である必要があります。
+    - `synonyms`: `synonyms`の中から、最も意味が一般的なものを最大5つ選んでください。ない場合は空の配列 `[]` を使用してください。なお、`synonyms`は英単語の同義語のリストであり、重複は除外してください。日本語は含めないでください。
+    - `example_sentences`: `raw_examples`を参考に、英語と日本語の両方を含む新しい例文を最大3つ生成してください。英語の例文は、その単語を確実に含む自然かつ簡潔な文である必要があります。日本語の例文は、英語の例文を自然な「日本語」に翻訳してください。例文は、`english`と`japanese`のペアで表現してください。
+
+    出力は以下のJSONフォーマットに厳密に従ってください（余計なテキストは一切含めず、有効なJSONのみ）:
+
+    {{
+        "words": [
+            {{
+                "english": "information",
+                "definitions": [
+                    {{
+                        "part_of_speech": "名詞",
+                        "japanese": ["情報", "知識"]
+                    }}
+                ],
+                "synonyms": ["data", "details"],
+                "example_sentences": [
+                    {{
+                        "english": "I need more information about the project.",
+                        "japanese": "そのプロジェクトに関するもっと多くの情報が必要です。"
+                    }}
+                ]
+            }}
+        ]
+    }}
+    """
+
+# 辞書データをプロンプトに埋め込む形式のバージョン (形式を変えたら上げる)
+PROMPT_FORMAT_VERSION = "2"
+
+
+def prompt_limits() -> dict[str, int]:
+    """辞書データをプロンプトに埋め込むときの上限値とトークン予算 (環境変数で調整できる)"""
+    return {
+        "max_definitions_per_pos": int(os.getenv("PROMPT_MAX_DEFINITIONS_PER_POS", "3")),
+        "max_examples": int(os.getenv("PROMPT_MAX_EXAMPLES", "5")),
+        "max_synonyms": int(os.getenv("PROMPT_MAX_SYNONYMS", "10")),
+        "max_translations_per_pos": int(os.getenv("PROMPT_MAX_TRANSLATIONS_PER_POS", "8")),
+        "token_budget": int(os.getenv("PROMPT_DICTIONARY_TOKEN_BUDGET", "600")),
+    }
+
+
+def build_prompt_version(limits: dict[str, int]) -> str:
+    """
+    プロンプトのバージョンを算出する。テンプレートか、埋め込む辞書データの上限値・トークン予算を
+    変更するとバージョンが変わり、キャッシュ済みの生成結果は自動的に無効になる
+    (単体生成と一括生成の結果は同じキャッシュを共有するため、両方のテンプレートから算出する)
+    """
+    source = PROMPT_FORMAT_VERSION + json.dumps(limits, sort_keys=True) + SYSTEM_PROMPT_TEMPLATE + BATCH_SYSTEM_PROMPT_TEMPLATE
+    return hashlib.sha256(source.encode("utf-8")).hexdigest()[:12]
+
+
+PROMPT_VERSION = build_prompt_version(prompt_limits())
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    テキストのトークン数を見積もる。
+    tiktoken がインストールされていればそれを使い、なければ
+    ASCII文字は約4文字で1トークン、それ以外 (日本語など) は1文字1トークンとして概算する。
+    """
+    if _tiktoken_encoding is not None:
+        return len(_tiktoken_encoding.encode(text))
+    ascii_chars = sum(1 for char in text if char.isascii())
+    return (ascii_chars + 3) // 4 + (len(text) - ascii_chars)
+
+
+def _unique(items, key=lambda item: item) -> list:
+    """順序を保ったまま重複を取り除く"""
+    seen = set()
+    result = []
+    for item in items:
+        k = key(item)
+        if k in seen:
+            continue
+        seen.add(k)
+        result.append(item)
+    return result
+
+
+def compact_dictionary_data(
+    dictionary_data: DictionaryData,
+    max_definitions_per_pos: int,
+    max_examples: int,
+    max_synonyms: int,
+    max_translations_per_pos: int,
+) -> dict:
+    """
+    プロンプトに埋め込む辞書データを、出力に必要な項目だけに絞って小さくする。
+    定義は品詞ごとに先頭から上位k件 (WordNetの並びは頻度順)、例文は重複を除いて
+    対象の単語を含むものを優先し、類義語・日本語訳もそれぞれ上限までに切り詰める。
+    """
+    word = dictionary_data.word
+    definitions_by_pos: dict[str, list[str]] = {}
+    for definition in dictionary_data.definitions or []:
+        texts = definitions_by_pos.setdefault(definition.pos, [])
+        if len(texts) < max_definitions_per_pos and definition.def_text not in texts:
+            texts.append(definition.def_text)
+
+    examples = _unique(
+        (example.strip() for example in dictionary_data.raw_examples or [] if example.strip()),
+        key=str.lower,
+    )
+    # 対象の単語を含む例文を優先する (sortedは安定なので元の順序は保たれる)
+    examples = sorted(examples, key=lambda example: word.lower() not in example.lower())
+
+    payload = {
+        "word": word,
+        "part_of_speech": dictionary_data.part_of_speech or [],
+        "definitions": definitions_by_pos,
+        "translations": {
+            pos: _unique(translations)[:max_translations_per_pos]
+            for pos, translations in (dictionary_data.translations or {}).items()
+        },
+        "synonyms": _unique(dictionary_data.synonyms or [], key=str.lower)[:max_synonyms],
+        "raw_examples": examples[:max_examples],
+    }
+    return {key: value for key, value in payload.items() if value}
+
+
+def fit_to_token_budget(payload: dict, token_budget: int) -> dict:
+    """
+    コンパクトなJSONがトークン予算に収まるまで、重要度の低いものから削る。
+    例文 → 類義語 → 品詞ごとの定義 → 日本語訳 の順に1件ずつ減らす。
+    """
+    def size() -> int:
+        return estimate_tokens(json.dumps(payload, ensure_ascii=False, separators=(",", ":")))
+
+    def trim_list(key: str, minimum: int) -> bool:
+        values = payload.get(key)
+        if values and len(values) > minimum:
+            values.pop()
+            return True
+        return False
+
+    def trim_grouped(key: str, minimum: int) -> bool:
+        groups = payload.get(key) or {}
+        longest = max(groups.values(), key=len, default=[])
+        if len(longest) > minimum:
+            longest.pop()
+            return True
+        return False
+
+    steps = [
+        lambda: trim_list("raw_examples", 1),
+        lambda: trim_list("synonyms", 3),
+        lambda: trim_grouped("definitions", 1),
+        lambda: trim_grouped("translations", 3),
+        lambda: trim_list("raw_examples", 0),
+    ]
+    for step in steps:
+        while size() > token_budget:
+            if not step():
+                break
+    return payload
+
+
+def build_dictionary_payload(dictionary_data: DictionaryData) -> str:
+    """
+    辞書データを、トークン予算内に収まるコンパクトなJSON文字列にする。
+    上限値は環境変数で調整できる (prompt_limits)。
+    """
+    limits = prompt_limits()
+    payload = compact_dictionary_data(
+        dictionary_data,
+        max_definitions_per_pos=limits["max_definitions_per_pos"],
+        max_examples=limits["max_examples"],
+        max_synonyms=limits["max_synonyms"],
+        max_translations_per_pos=limits["max_translations_per_pos"],
+    )
+    payload = fit_to_token_budget(payload, limits["token_budget"])
+    return json.dumps(payload, ensure_ascii=False, separators=(",", ":"))
+
+
+def build_system_prompt(dictionary_data: DictionaryData) -> str:
+    """辞書データを埋め込んだシステムプロンプトを作成する"""
+    return SYSTEM_PROMPT_TEMPLATE.format(
+        word=dictionary_data.word,
+        dictionary_json=build_dictionary_payload(dictionary_data),
+    )
+
+def build_batch_system_prompt(dictionary_items: list[DictionaryData]) -> str:
+    """複数単語の辞書データをまとめて埋め込んだシステムプロンプトを作成する"""
+    return BATCH_SYSTEM_PROMPT_TEMPLATE.format(
+        words_json=json.dumps([item.word for item in dictionary_items], ensure_ascii=False),
+        dictionary_json="[" + ",".join(build_dictionary_payload(item) for item in dictionary_items) + "]",
+    )
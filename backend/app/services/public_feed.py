@@ -0,0 +1,260 @@
+from bisect import bisect_left, insort
+from datetime import datetime
+from itertools import compress, repeat
+from operator import ne
+from typing import Iterable, Optional
+import asyncio
+import json
+import logging
+import os
+import tempfile
+import time
+
+from ..core.pagination import as_utc, encode_cursor
+from ..schemas.wordbooks import WordBookResponse
+from .wordbook_sync import TOMBSTONE_RETENTION, WordbookViewSync, run_periodically
+
+# スナップショットの形式を変えたら上げる (古いスナップショットは読み込まない)
+FEED_FORMAT_VERSION = 2
+
+
+class PublicWordbookFeed:
+    """
+    公開単語帳の一覧を、作成日時の新しい順 (同じ日時はIDの順) に並べてメモリ上に持つ。
+    単語帳ごとにレスポンスのJSONを作っておき、一覧の取得ではそれをつなげるだけにする
+    (リクエストのたびにFirestoreから読み込んだり WordBookResponse を作ったりしない)。
+    自分の単語帳の除外とページ分割は、並べ済みの一覧をたどりながら行う。
+
+    単語帳の作成・更新・削除と単語数の増減はその単語帳の分だけ反映し、一覧全体は作り直さない。
+    """
+
+    def __init__(self, wordbooks: Iterable[dict] = ()):
+        started = time.perf_counter()
+        # ID → (並べ替えのキー, 所有者ID, レスポンスのJSON)
+        self._entries: dict[str, tuple[tuple[datetime, str], Optional[str], bytes]] = {}
+        for wordbook in wordbooks:
+            entry = self._render(wordbook)
+            if entry is not None:
+                self._entries[wordbook["id"]] = entry
+        self._set_up()
+        self.build_seconds = time.perf_counter() - started
+
+    def _set_up(self) -> None:
+        # (作成日時, ID) の昇順。新しい順に返すときは後ろからたどる
+        self._keys: list[tuple[datetime, str]] = sorted(entry[0] for entry in self._entries.values())
+        # 所有者ID → 公開単語帳の数 (公開単語帳を持たないユーザーには、全件のJSONを使い回して返す)
+        self._owner_counts: dict[Optional[str], int] = {}
+        for _, owner_id, _ in self._entries.values():
+            self._owner_counts[owner_id] = self._owner_counts.get(owner_id, 0) + 1
+        self._ordered: Optional[tuple[list[bytes], list[Optional[str]]]] = None
+        self._all: Optional[bytes] = None
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @staticmethod
+    def _render(wordbook: dict) -> Optional[tuple[tuple[datetime, str], Optional[str], bytes]]:
+        """公開単語帳のレスポンスのJSONを作る (公開されていない単語帳、レスポンスを作れない単語帳は None)"""
+        if not wordbook.get("is_public"):
+            return None
+        try:
+            response = WordBookResponse(**{field: as_utc(value) for field, value in wordbook.items()})
+        except ValueError as e:
+            logging.warning(f"公開単語帳の一覧に追加できない単語帳を読み飛ばします ({wordbook.get('id')}): {e}")
+            return None
+        return (as_utc(response.created_at), response.id), wordbook.get("owner_id"), response.model_dump_json().encode("utf-8")
+
+    def upsert(self, wordbook: dict) -> None:
+        """単語帳を追加・置き換える。公開されていない単語帳は一覧から外す"""
+        entry = self._render(wordbook)
+        if entry is None:
+            self.remove(wordbook["id"])
+            return
+        self.remove(wordbook["id"])
+        insort(self._keys, entry[0])
+        self._owner_counts[entry[1]] = self._owner_counts.get(entry[1], 0) + 1
+        self._entries[wordbook["id"]] = entry
+        self._ordered = self._all = None
+
+    def remove(self, wordbook_id: str) -> None:
+        previous = self._entries.pop(wordbook_id, None)
+        if previous is not None:
+            del self._keys[bisect_left(self._keys, previous[0])]
+            self._owner_counts[previous[1]] -= 1
+            self._ordered = self._all = None
+
+    def adjust_num_words(self, wordbook_id: str, delta: int) -> None:
+        entry = self._entries.get(wordbook_id)
+        if entry is not None:
+            key, owner_id, content = entry
+            data = json.loads(content)
+            data["num_words"] = max(0, (data.get("num_words") or 0) + delta)
+            self._entries[wordbook_id] = (key, owner_id, json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8"))
+            self._ordered = self._all = None
+
+    def page(
+        self,
+        limit: Optional[int] = None,
+        after: Optional[tuple] = None,
+        exclude_owner_id: Optional[str] = None,
+    ) -> tuple[bytes, Optional[str]]:
+        """
+        (作成日時, ID) が after より古い公開単語帳を新しい順に limit 件 (None なら全件) 選び、
+        レスポンスのJSON配列と次のページのカーソル (次のページがなければ None) を返す。
+        """
+        if not self._owner_counts.get(exclude_owner_id):
+            exclude_owner_id = None
+        if limit is None and after is None:
+            return self._render_all(exclude_owner_id), None
+        end = bisect_left(self._keys, (as_utc(after[0]), after[1])) if after is not None else len(self._keys)
+        parts = []
+        last = None
+        for i in range(end - 1, -1, -1):
+            key = self._keys[i]
+            _, owner_id, content = self._entries[key[1]]
+            if exclude_owner_id is not None and owner_id == exclude_owner_id:
+                continue
+            if limit is not None and len(parts) == limit:
+                return b"[" + b",".join(parts) + b"]", encode_cursor("created_at", "desc", last[0], last[1])
+            parts.append(content)
+            last = key
+        return b"[" + b",".join(parts) + b"]", None
+
+    def _render_all(self, exclude_owner_id: Optional[str]) -> bytes:
+        """全件のJSON配列。並べ済みのJSONと所有者IDの列を変更があるまで使い回す"""
+        if self._ordered is None:
+            entries = [self._entries[key[1]] for key in reversed(self._keys)]
+            self._ordered = [entry[2] for entry in entries], [entry[1] for entry in entries]
+        contents, owners = self._ordered
+        if exclude_owner_id is None:
+            if self._all is None:
+                self._all = b"[" + b",".join(contents) + b"]"
+            return self._all
+        return b"[" + b",".join(compress(contents, map(ne, owners, repeat(exclude_owner_id)))) + b"]"
+
+    def snapshot(self, synced_at: Optional[datetime] = None) -> bytes:
+        """一覧のスナップショット (Firestoreと最後に同期した日時と、所有者IDとレスポンスのJSONの組) を作る"""
+        synced_at = json.dumps(synced_at.isoformat() if synced_at else None).encode("utf-8")
+        return b'{"format_version":%d,"synced_at":%s,"wordbooks":[' % (FEED_FORMAT_VERSION, synced_at) + b",".join(
+            b'{"owner_id":' + json.dumps(owner_id).encode("utf-8") + b',"wordbook":' + content + b"}"
+            for _, owner_id, content in self._entries.values()
+        ) + b"]}"
+
+    @classmethod
+    def load(cls, path: str) -> tuple["PublicWordbookFeed", Optional[datetime]]:
+        """
+        スナップショットから一覧を作り、一覧とFirestoreと最後に同期した日時を返す。
+        スナップショットのJSONは保存したときにレスポンスとして作ったものなので、WordBookResponse を作り直さずにそのまま使う。
+        """
+        started = time.perf_counter()
+        with open(path, "rb") as f:
+            snapshot = json.load(f)
+        if snapshot.get("format_version") != FEED_FORMAT_VERSION:
+            raise ValueError(f"スナップショットの形式が異なります: {snapshot.get('format_version')}")
+        feed = cls.__new__(cls)
+        feed._entries = {}
+        for item in snapshot["wordbooks"]:
+            wordbook = item["wordbook"]
+            key = (as_utc(datetime.fromisoformat(wordbook["created_at"])), wordbook["id"])
+            content = json.dumps(wordbook, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+            feed._entries[wordbook["id"]] = (key, item["owner_id"], content)
+        feed._set_up()
+        feed.build_seconds = time.perf_counter() - started
+        synced_at = snapshot.get("synced_at")
+        return feed, datetime.fromisoformat(synced_at) if synced_at else None
+
+    def stats(self) -> dict:
+        return {"wordbooks": len(self._entries), "build_seconds": round(self.build_seconds, 3)}
+
+
+# Firestoreの公開単語帳と一覧の同期 (差分の読み込みでは非公開になった単語帳も読み、upsert で一覧から外す)
+_sync = WordbookViewSync("公開単語帳の一覧", PublicWordbookFeed, filters=[("is_public", "==", True)])
+# 最後にスナップショットに保存したときの一覧の版 (_sync.version と同じなら保存しない)
+_saved_version: Optional[int] = None
+_background_tasks: list[asyncio.Task] = []
+
+
+def write_snapshot(path: str, content: bytes) -> None:
+    """スナップショットを保存する (書き込み途中で止まっても前のスナップショットが残るよう、置き換えで保存する)"""
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    fd, temporary = tempfile.mkstemp(dir=directory, prefix=".public_feed.")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(content)
+        os.replace(temporary, path)
+    except BaseException:
+        os.remove(temporary)
+        raise
+
+
+def snapshot_path() -> str:
+    return os.getenv("PUBLIC_FEED_SNAPSHOT_PATH", "data/public_wordbook_feed.json")
+
+
+async def save_public_feed() -> None:
+    """前回の保存から一覧が変わっていれば、スナップショットに保存する"""
+    global _saved_version
+    feed, version = _sync.view, _sync.version
+    if feed is None or version == _saved_version:
+        return
+    try:
+        # 一覧の変更と同じスレッドでスナップショットを作り、ファイルへの書き込みだけを別スレッドで行う
+        await asyncio.to_thread(write_snapshot, snapshot_path(), feed.snapshot(_sync.synced_at))
+        _saved_version = version
+    except Exception as e:
+        logging.error(f"公開単語帳の一覧を保存できませんでした: {e}")
+
+
+async def init_public_feed() -> None:
+    """
+    アプリケーション起動時に、保存済みのスナップショットがあれば読み込んですぐに使えるようにし、
+    スナップショット以降の変更だけをバックグラウンドでFirestoreから読み込んで反映する
+    (スナップショットがない、または削除の記録が残っている期間より古ければ、全件を読み込んで作り直す)。
+    一覧がない間、公開単語帳の取得はFirestoreから読み込む。
+    PUBLIC_FEED_REFRESH_SECONDS ごとに他のインスタンスでの変更を取り込み、
+    PUBLIC_FEED_SAVE_SECONDS ごとに変更をスナップショットに保存する (どちらも0なら行わない)。
+    """
+    global _saved_version
+    path = snapshot_path()
+    if os.path.exists(path):
+        try:
+            feed, synced_at = await asyncio.to_thread(PublicWordbookFeed.load, path)
+            if synced_at is not None and datetime.now() - synced_at >= TOMBSTONE_RETENTION:
+                synced_at = None
+            _sync.restore(feed, synced_at)
+            _saved_version = _sync.version
+            logging.info(f"公開単語帳の一覧をスナップショットから読み込みました: {len(feed)}件")
+        except Exception as e:
+            logging.warning(f"公開単語帳の一覧のスナップショットを読み込めませんでした: {e}")
+    _background_tasks.append(asyncio.create_task(_sync.refresh()))
+    refresh_interval = int(os.getenv("PUBLIC_FEED_REFRESH_SECONDS", "600"))
+    if refresh_interval > 0:
+        _background_tasks.append(asyncio.create_task(run_periodically(refresh_interval, _sync.refresh)))
+    save_interval = int(os.getenv("PUBLIC_FEED_SAVE_SECONDS", "30"))
+    if save_interval > 0:
+        _background_tasks.append(asyncio.create_task(run_periodically(save_interval, save_public_feed)))
+
+
+async def close_public_feed() -> None:
+    for task in _background_tasks:
+        task.cancel()
+    _background_tasks.clear()
+    await save_public_feed()
+
+
+def feed_wordbook(wordbook: dict) -> None:
+    """作成・更新した単語帳を一覧に反映する (非公開になった単語帳は一覧から外れる)"""
+    _sync.upsert(wordbook)
+
+
+def remove_feed_wordbook(wordbook_id: str) -> None:
+    _sync.remove(wordbook_id)
+
+
+def adjust_feed_num_words(wordbook_id: str, delta: int) -> None:
+    _sync.adjust_num_words(wordbook_id, delta)
+
+
+def get_public_feed() -> Optional[PublicWordbookFeed]:
+    return _sync.view
@@ -0,0 +1,189 @@
+from typing import Optional
+from fastapi import HTTPException
+from pydantic import ValidationError
+import asyncio
+import json
+import logging
+import os
+import re
+
+from ..schemas.words import DictionaryData, FDAData, WordGenerated
+from . import words as word_service
+from .prompts import build_batch_system_prompt
+from .word_cache import normalize_word
+
+
+def _chunks(items: list, size: int) -> list[list]:
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+
+def _extract_json_object(response_content: str) -> dict:
+    """LLMの応答からJSONオブジェクトを取り出す (コードブロックなどが混ざっていても対応する)"""
+    try:
+        return json.loads(response_content)
+    except json.JSONDecodeError:
+        cleaned_content = re.sub(r'```json\s*|\s*```', '', response_content)
+        first_brace = cleaned_content.find('{')
+        last_brace = cleaned_content.rfind('}')
+        if first_brace == -1 or last_brace == -1 or first_brace >= last_brace:
+            raise ValueError("有効なJSONオブジェクトが見つかりません")
+        return json.loads(cleaned_content[first_brace:last_brace + 1])
+
+
+async def generate_enhanced_words_chunk(dictionary_items: list[DictionaryData]) -> dict[str, WordGenerated]:
+    """
+    複数の単語を1回のLLM呼び出しでまとめて生成する。
+    解析・検証に成功した単語だけを返し、失敗した単語は結果に含めない。
+    """
+    completion = await word_service.client.create_chat_completion(
+        model=os.getenv("MODEL_NAME"),
+        messages=[{"role": "system", "content": build_batch_system_prompt(dictionary_items)}],
+        response_format={"type": "json_object"}
+    )
+    response_content = completion.choices[0].message.content
+    logging.info(f"LLMからの一括生成レスポンス: {response_content}")
+
+    try:
+        items = _extract_json_object(response_content).get("words", [])
+    except (ValueError, AttributeError) as e:
+        logging.error(f"一括生成のJSON解析に失敗しました: {e}")
+        return {}
+
+    expected = {normalize_word(item.word) for item in dictionary_items}
+    results = {}
+    for item in items if isinstance(items, list) else []:
+        try:
+            word_info = WordGenerated.model_validate(item)
+        except ValidationError as e:
+            logging.warning(f"一括生成の要素の検証に失敗しました: {e}")
+            continue
+        key = normalize_word(word_info.english)
+        if key in expected and key not in results:
+            results[key] = word_info
+    return results
+
+
+async def _fetch_batch_sources(words: list[str]) -> tuple[dict[str, DictionaryData], dict[str, Optional[FDAData]], dict[str, list[str]]]:
+    """
+    辞書データを一括で取得したあと、発音情報が保存されていない単語についてのみ
+    Free Dictionary APIのデータを単語ごとに並行して取得する。
+    期限内に取得できなかったソースは単語ごとの欠損リストに記録する。
+    """
+    dictionary_timeout = float(os.getenv("DICTIONARY_FETCH_TIMEOUT_SECONDS", "2.0"))
+    free_dictionary_timeout = float(os.getenv("FREE_DICTIONARY_TIMEOUT_SECONDS", "1.5"))
+
+    missing_sources = {word: [] for word in words}
+    try:
+        dictionary_data = await asyncio.wait_for(word_service.get_words_from_firestore(words), timeout=dictionary_timeout)
+    except Exception as e:
+        logging.warning(f"辞書データの一括取得に失敗したため、辞書データなしで生成します: {e!r}")
+        dictionary_data = {
+            word: DictionaryData(word=word, part_of_speech=[], definitions=[], synonyms=[], raw_examples=[])
+            for word in words
+        }
+        for word in words:
+            missing_sources[word].append("dictionary")
+
+    free_dictionary_data = {word: None for word in words}
+    lookup_words = [word for word in words if not dictionary_data[word].phonetics]
+    free_dictionary_results = await asyncio.gather(
+        *(
+            asyncio.wait_for(word_service.get_word_info_from_free_dictionary(word), timeout=free_dictionary_timeout)
+            for word in lookup_words
+        ),
+        return_exceptions=True,
+    )
+    for word, result in zip(lookup_words, free_dictionary_results):
+        if isinstance(result, BaseException):
+            missing_sources[word].append("free_dictionary")
+            result = None
+        free_dictionary_data[word] = result
+
+    return dictionary_data, free_dictionary_data, missing_sources
+
+
+async def get_enhanced_words_batch(words: list[str]) -> tuple[dict[str, WordGenerated], dict[str, str]]:
+    """
+    複数の単語のAI拡張情報をまとめて取得する。
+    変化形は見出し語に解決し (同じ見出し語になる単語は1回だけ生成する)、辞書にない単語は
+    生成せずに綴りの候補をエラーとして返す。キャッシュ済みの単語はそのまま返し、残りは
+    辞書データを一括取得したうえで複数単語ずつ1つのプロンプトにまとめて生成する。
+    一括生成で得られなかった単語は単体の取得処理で個別に生成し直す。
+    戻り値は (入力を正規化した単語ごとの結果, 単語ごとのエラー内容)。
+    """
+    keys = list(dict.fromkeys(normalize_word(word) for word in words if word.strip()))
+    results: dict[str, WordGenerated] = {}
+    errors: dict[str, str] = {}
+
+    lemma_by_key = {}
+    for key, (lemma, suggestions) in zip(keys, await asyncio.gather(*(word_service.resolve_word(key) for key in keys))):
+        if suggestions is not None:
+            errors[key] = word_service.unknown_word_message(key, suggestions)
+        else:
+            lemma_by_key[key] = lemma
+
+    lemma_results, lemma_errors = await _get_enhanced_lemmas_batch(list(dict.fromkeys(lemma_by_key.values())))
+    for key, lemma in lemma_by_key.items():
+        if lemma in lemma_results:
+            word_info = lemma_results[lemma].model_copy(deep=True)
+            results[key] = word_service.with_inflected_form(word_info, key, lemma)
+        else:
+            errors[key] = lemma_errors.get(lemma, "AI生成中に予期しないエラーが発生しました")
+    return results, errors
+
+
+async def _get_enhanced_lemmas_batch(keys: list[str]) -> tuple[dict[str, WordGenerated], dict[str, str]]:
+    """見出し語のリストについて、キャッシュ・一括生成・個別生成の順にAI拡張情報を取得する"""
+    results: dict[str, WordGenerated] = {}
+    errors: dict[str, str] = {}
+
+    misses = []
+    for key in keys:
+        cached = await word_service.word_cache.get(word_service.get_word_cache_key(key))
+        if cached is not None:
+            results[key] = cached
+        else:
+            misses.append(key)
+    if not misses:
+        return results, errors
+
+    dictionary_data, free_dictionary_data, missing_sources = await _fetch_batch_sources(misses)
+
+    chunk_size = max(1, int(os.getenv("WORD_BATCH_PROMPT_SIZE", "5")))
+    chunks = _chunks(misses, chunk_size)
+    chunk_results = await asyncio.gather(
+        *(generate_enhanced_words_chunk([dictionary_data[word] for word in chunk]) for chunk in chunks),
+        return_exceptions=True,
+    )
+
+    fallback_words = []
+    for chunk, generated in zip(chunks, chunk_results):
+        if isinstance(generated, BaseException):
+            logging.error(f"一括生成に失敗したため個別に生成します: {chunk} ({generated!r})")
+            generated = {}
+        for word in chunk:
+            word_info = generated.get(word)
+            if word_info is None:
+                fallback_words.append(word)
+                continue
+            word_info.phonetics = word_service.select_phonetics(free_dictionary_data[word], dictionary_data[word])
+            if missing_sources[word]:
+                word_info.missing_sources = missing_sources[word]
+            else:
+                await word_service.word_cache.set(word_service.get_word_cache_key(word), word_info)
+            results[word] = word_info
+
+    if fallback_words:
+        fallback_results = await asyncio.gather(
+            *(word_service.get_enhanced_word(word) for word in fallback_words),
+            return_exceptions=True,
+        )
+        for word, result in zip(fallback_words, fallback_results):
+            if isinstance(result, HTTPException):
+                errors[word] = result.detail["message"] if isinstance(result.detail, dict) else str(result.detail)
+            elif isinstance(result, BaseException):
+                errors[word] = "AI生成中に予期しないエラーが発生しました"
+            else:
+                results[word] = result
+
+    return results, errors
@@ -0,0 +1,299 @@
+from collections import OrderedDict
+from firebase_admin import firestore
+from typing import Optional
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+from ..schemas.words import FDAData, WordGenerated
+
+ENHANCED_WORDS_COLLECTION = "enhanced_words"
+
+
+def normalize_word(word: str) -> str:
+    """キャッシュキー用に単語を正規化する (前後の空白除去・小文字化)"""
+    return " ".join(word.strip().lower().split())
+
+
+def build_cache_key(word: str, model_name: str, prompt_version: str) -> str:
+    """
+    正規化した単語・モデル名・プロンプトバージョンからキャッシュキーを作成する。
+    モデルやプロンプトが変わると別のキーになるため、古いエントリは自然に無効化される。
+    """
+    return f"{normalize_word(word)}|{model_name}|{prompt_version}"
+
+
+class MemoryLRUCache:
+    """
+    TTL付きのインプロセスLRUキャッシュ。
+    上限を超えた場合は最も長く参照されていないエントリから追い出す。
+    """
+
+    def __init__(self, max_size: int, ttl_seconds: float):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._entries: OrderedDict[str, tuple[float, object]] = OrderedDict()
+        self._lock = threading.Lock()
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key: str) -> Optional[object]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                self.expirations += 1
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: object, ttl_seconds: Optional[float] = None) -> None:
+        if self.max_size <= 0:
+            return
+        ttl = self.ttl_seconds if ttl_seconds is None else ttl_seconds
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class FirestoreWordStore:
+    """
+    Firestoreの `enhanced_words` コレクションを永続キャッシュとして使うストア。
+    ドキュメントIDにはキーのハッシュを使う (モデル名に '/' が含まれるため)。
+    """
+
+    def __init__(self, collection: str = ENHANCED_WORDS_COLLECTION):
+        self.collection = collection
+
+    def _doc_ref(self, key: str):
+        doc_id = hashlib.sha256(key.encode("utf-8")).hexdigest()
+        return firestore.client().collection(self.collection).document(doc_id)
+
+    def get(self, key: str) -> Optional[tuple[float, dict]]:
+        document = self._doc_ref(key).get()
+        if not document.exists:
+            return None
+        data = document.to_dict()
+        if data.get("key") != key:
+            return None
+        return data.get("stored_at", 0.0), data.get("value")
+
+    def set(self, key: str, value: dict) -> None:
+        self._doc_ref(key).set({
+            "key": key,
+            "value": value,
+            "stored_at": time.time(),
+        })
+
+    def delete(self, key: str) -> None:
+        self._doc_ref(key).delete()
+
+
+class SQLiteWordStore:
+    """
+    ローカル開発・単体サーバ向けのSQLite版永続キャッシュストア。
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS enhanced_words ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, stored_at REAL NOT NULL)"
+        )
+        self._conn.commit()
+
+    def get(self, key: str) -> Optional[tuple[float, dict]]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT stored_at, value FROM enhanced_words WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None:
+            return None
+        return row[0], json.loads(row[1])
+
+    def set(self, key: str, value: dict) -> None:
+        payload = json.dumps(value, ensure_ascii=False)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO enhanced_words (key, value, stored_at) VALUES (?, ?, ?)",
+                (key, payload, time.time()),
+            )
+            self._conn.commit()
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM enhanced_words WHERE key = ?", (key,))
+            self._conn.commit()
+
+
+class EnhancedWordCache:
+    """
+    AI拡張済み単語情報の2層キャッシュ (インプロセスLRU + 永続ストア)。
+    メモリでヒットしなければ永続ストアを参照し、見つかればメモリに昇格させる。
+    """
+
+    def __init__(self, memory: MemoryLRUCache, store=None, store_ttl_seconds: float = 0):
+        self.memory = memory
+        self.store = store
+        self.store_ttl_seconds = store_ttl_seconds
+        self.memory_hits = 0
+        self.store_hits = 0
+        self.misses = 0
+        self.store_errors = 0
+
+    async def get(self, key: str) -> Optional[WordGenerated]:
+        value = self.memory.get(key)
+        if value is not None:
+            self.memory_hits += 1
+            return value.model_copy(deep=True)
+
+        if self.store is not None:
+            try:
+                # 永続ストアはブロッキングI/Oのため、イベントループを止めないようスレッドで実行する
+                entry = await asyncio.to_thread(self.store.get, key)
+            except Exception as e:
+                self.store_errors += 1
+                logging.error(f"永続キャッシュの読み込み中にエラー: {e}")
+                entry = None
+            if entry is not None:
+                stored_at, data = entry
+                if self.store_ttl_seconds <= 0 or time.time() - stored_at < self.store_ttl_seconds:
+                    value = WordGenerated.model_validate(data)
+                    self.memory.set(key, value)
+                    self.store_hits += 1
+                    return value.model_copy(deep=True)
+
+        self.misses += 1
+        return None
+
+    async def set(self, key: str, value: WordGenerated) -> None:
+        value = value.model_copy(deep=True)
+        self.memory.set(key, value)
+        if self.store is not None:
+            try:
+                await asyncio.to_thread(self.store.set, key, value.model_dump(exclude_none=True))
+            except Exception as e:
+                self.store_errors += 1
+                logging.error(f"永続キャッシュへの書き込み中にエラー: {e}")
+
+    async def delete(self, key: str) -> None:
+        self.memory.delete(key)
+        if self.store is not None:
+            try:
+                await asyncio.to_thread(self.store.delete, key)
+            except Exception as e:
+                self.store_errors += 1
+                logging.error(f"永続キャッシュからの削除中にエラー: {e}")
+
+    def stats(self) -> dict:
+        lookups = self.memory_hits + self.store_hits + self.misses
+        return {
+            "memory_hits": self.memory_hits,
+            "store_hits": self.store_hits,
+            "misses": self.misses,
+            "hit_rate": (self.memory_hits + self.store_hits) / lookups if lookups else 0.0,
+            "evictions": self.memory.evictions,
+            "expirations": self.memory.expirations,
+            "store_errors": self.store_errors,
+            "memory_size": len(self.memory),
+            "memory_max_size": self.memory.max_size,
+            "store": type(self.store).__name__ if self.store is not None else None,
+        }
+
+
+class FreeDictionaryCache:
+    """
+    Free Dictionary APIの解析済みレスポンスのキャッシュ。
+    見つかった単語だけでなく、見つからなかった (404) 単語も別のTTLで記憶する。
+    """
+
+    NOT_FOUND = object()
+
+    def __init__(self, max_size: int, ttl_seconds: float, not_found_ttl_seconds: float):
+        self.memory = MemoryLRUCache(max_size, ttl_seconds)
+        self.not_found_ttl_seconds = not_found_ttl_seconds
+        self.hits = 0
+        self.not_found_hits = 0
+        self.misses = 0
+
+    def get(self, word: str) -> tuple[bool, Optional[FDAData]]:
+        """(キャッシュにあったか, データ) を返す。見つからなかった単語は (True, None)。"""
+        value = self.memory.get(normalize_word(word))
+        if value is None:
+            self.misses += 1
+            return False, None
+        if value is self.NOT_FOUND:
+            self.not_found_hits += 1
+            return True, None
+        self.hits += 1
+        return True, value.model_copy(deep=True)
+
+    def set(self, word: str, value: FDAData) -> None:
+        self.memory.set(normalize_word(word), value.model_copy(deep=True))
+
+    def set_not_found(self, word: str) -> None:
+        self.memory.set(normalize_word(word), self.NOT_FOUND, ttl_seconds=self.not_found_ttl_seconds)
+
+    def stats(self) -> dict:
+        return {
+            "hits": self.hits,
+            "not_found_hits": self.not_found_hits,
+            "misses": self.misses,
+            "evictions": self.memory.evictions,
+            "expirations": self.memory.expirations,
+            "size": len(self.memory),
+        }
+
+
+def create_free_dictionary_cache_from_env() -> FreeDictionaryCache:
+    """環境変数から設定を読み込み、Free Dictionary APIのキャッシュを作成する"""
+    return FreeDictionaryCache(
+        max_size=int(os.getenv("FREE_DICTIONARY_CACHE_MAX_SIZE", "20000")),
+        ttl_seconds=float(os.getenv("FREE_DICTIONARY_CACHE_TTL_SECONDS", str(60 * 60 * 24 * 7))),
+        not_found_ttl_seconds=float(os.getenv("FREE_DICTIONARY_NOT_FOUND_TTL_SECONDS", str(60 * 60 * 24))),
+    )
+
+
+def create_word_cache_from_env() -> EnhancedWordCache:
+    """
+    環境変数から設定を読み込み、キャッシュを作成する。
+    WORD_CACHE_BACKEND: firestore (デフォルト) / sqlite / memory
+    """
+    memory = MemoryLRUCache(
+        max_size=int(os.getenv("WORD_CACHE_MAX_SIZE", "10000")),
+        ttl_seconds=float(os.getenv("WORD_CACHE_TTL_SECONDS", "3600")),
+    )
+    backend = os.getenv("WORD_CACHE_BACKEND", "firestore").lower()
+    store = None
+    if backend == "firestore":
+        store = FirestoreWordStore()
+    elif backend == "sqlite":
+        store = SQLiteWordStore(os.getenv("WORD_CACHE_SQLITE_PATH", "enhanced_words.sqlite3"))
+    elif backend != "memory":
+        logging.warning(f"不明なWORD_CACHE_BACKEND: {backend}。メモリキャッシュのみを使用します。")
+    return EnhancedWordCache(
+        memory,
+        store,
+        store_ttl_seconds=float(os.getenv("WORD_CACHE_STORE_TTL_SECONDS", str(60 * 60 * 24 * 30))),
+    )
@@ -0,0 +1,188 @@
+from typing import AsyncIterator, Optional
+from fastapi import HTTPException
+from pydantic import ValidationError
+import json
+import logging
+import os
+
+from ..schemas.words import Definition, ExampleSentence, WordGenerated
+from . import words as word_service
+from .word_cache import normalize_word
+
+# 要素が完成した時点で1件ずつ送出する配列と、その要素のスキーマ
+STREAMED_ITEM_MODELS = {
+    "definitions": ("definition", Definition),
+    "example_sentences": ("example_sentence", ExampleSentence),
+}
+
+
+class IncrementalJSONParser:
+    """
+    LLMが出力する途中のJSONを逐次解析するパーサー。
+    トップレベルのオブジェクト直下にある配列について、要素 (オブジェクト) が閉じた時点と
+    配列全体が閉じた時点でイベントを返す。先頭のコードブロック記号などJSON以外の文字は無視する。
+    """
+
+    def __init__(self):
+        self._buffer = ""
+        self._pos = 0
+        self._stack: list[str] = []
+        self._in_string = False
+        self._escape = False
+        self._string_start = 0
+        self._last_string: Optional[str] = None
+        self._current_key: Optional[str] = None
+        self._array_start = 0
+        self._item_start = 0
+        self._failed = False
+
+    def feed(self, chunk: str) -> list[tuple[str, str, object]]:
+        """
+        テキスト断片を追加し、新たに完成した値を (種類, キー, 値) のリストで返す。
+        種類は要素が完成した場合 "item"、配列全体が完成した場合 "array"。
+        逐次解析できない形式だった場合は以降のイベントを諦め、テキストの蓄積のみを続ける。
+        """
+        self._buffer += chunk
+        events = []
+        if self._failed:
+            return events
+        try:
+            self._scan(events)
+        except (ValueError, IndexError) as e:
+            logging.warning(f"ストリーミング応答の逐次解析を中止します: {e}")
+            self._failed = True
+        return events
+
+    def _scan(self, events: list) -> None:
+        buffer = self._buffer
+        while self._pos < len(buffer):
+            char = buffer[self._pos]
+            depth = len(self._stack)
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == "\\":
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+                    if depth == 1:
+                        self._last_string = json.loads(buffer[self._string_start:self._pos + 1])
+            elif depth == 0:
+                # トップレベルのオブジェクトが始まるまでの文字は読み飛ばす
+                if char == "{":
+                    self._stack.append("{")
+            elif char == '"':
+                self._in_string = True
+                self._string_start = self._pos
+            elif char == ":" and depth == 1:
+                self._current_key = self._last_string
+            elif char == "," and depth == 1:
+                self._current_key = None
+            elif char in "{[":
+                if depth == 1 and char == "[":
+                    self._array_start = self._pos
+                elif depth == 2 and self._stack[-1] == "[" and char == "{":
+                    self._item_start = self._pos
+                self._stack.append(char)
+            elif char in "}]":
+                self._stack.pop()
+                depth = len(self._stack)
+                if char == "}" and depth == 2 and self._stack[-1] == "[":
+                    value = json.loads(buffer[self._item_start:self._pos + 1])
+                    events.append(("item", self._current_key, value))
+                elif char == "]" and depth == 1:
+                    value = json.loads(buffer[self._array_start:self._pos + 1])
+                    events.append(("array", self._current_key, value))
+            self._pos += 1
+
+    @property
+    def text(self) -> str:
+        return self._buffer
+
+
+def _word_events(word_info: WordGenerated) -> list[dict]:
+    """完成済みのWordGeneratedを、ストリーミングと同じ形式のイベント列に変換する"""
+    events = []
+    if word_info.phonetics:
+        events.append({"type": "phonetics", "data": word_info.phonetics.model_dump()})
+    for definition in word_info.definitions:
+        events.append({"type": "definition", "data": definition.model_dump()})
+    events.append({"type": "synonyms", "data": word_info.synonyms or []})
+    for sentence in word_info.example_sentences or []:
+        events.append({"type": "example_sentence", "data": sentence.model_dump()})
+    events.append({"type": "done", "data": word_info.model_dump(exclude_none=True)})
+    return events
+
+
+async def stream_enhanced_word(word: str) -> AsyncIterator[dict]:
+    """
+    単語情報をイベントとして逐次返す。
+    変化形は見出し語に解決し、辞書にない単語は綴りの候補を含む "error" を返す。
+    キャッシュにあればすぐに全イベントを返し、なければLLMのストリーミング応答を逐次解析して、
+    定義・類義語リスト・例文が1つ完成するたびにイベントを返す。最後に完成形を "done" で返す。
+    """
+    lemma, suggestions = await word_service.resolve_word(word)
+    if suggestions is not None:
+        yield {
+            "type": "error",
+            "status_code": 404,
+            "detail": word_service.unknown_word_message(normalize_word(word), suggestions),
+            "suggestions": suggestions,
+        }
+        return
+
+    cache_key = word_service.get_word_cache_key(lemma)
+    cached = await word_service.word_cache.get(cache_key)
+    if cached is not None:
+        for event in _word_events(word_service.with_inflected_form(cached, word, lemma)):
+            yield event
+        return
+
+    try:
+        dictionary_data, free_dictionary_data, missing_sources = await word_service.fetch_word_sources(lemma)
+    except HTTPException as e:
+        yield {"type": "error", "status_code": e.status_code, "detail": e.detail}
+        return
+
+    phonetics = word_service.select_phonetics(free_dictionary_data, dictionary_data)
+    if phonetics:
+        yield {"type": "phonetics", "data": phonetics.model_dump()}
+
+    parser = IncrementalJSONParser()
+    try:
+        async for chunk in word_service.client.stream_chat_completion(
+            model=os.getenv("MODEL_NAME"),
+            messages=[{"role": "system", "content": word_service.build_system_prompt(dictionary_data)}],
+            response_format={"type": "json_object"}
+        ):
+            for kind, key, value in parser.feed(chunk):
+                event = _to_stream_event(kind, key, value)
+                if event is not None:
+                    yield event
+    except Exception as e:
+        logging.error(f"ストリーミング生成中にエラー: {e}")
+        yield {"type": "error", "status_code": 502, "detail": "AI生成中にエラーが発生しました"}
+        return
+
+    response_content = parser.text
+    word_info = word_service.parse_word_generated(response_content, dictionary_data.word, phonetics)
+    if missing_sources:
+        word_info.missing_sources = missing_sources
+    elif not word_service.is_fallback_word_info(word_info):
+        await word_service.word_cache.set(cache_key, word_info)
+    word_info = word_service.with_inflected_form(word_info, word, lemma)
+    yield {"type": "done", "data": word_info.model_dump(exclude_none=True)}
+
+
+def _to_stream_event(kind: str, key: Optional[str], value) -> Optional[dict]:
+    """パーサーのイベントを、検証済みのストリーミングイベントに変換する"""
+    try:
+        if kind == "item" and key in STREAMED_ITEM_MODELS:
+            event_type, model = STREAMED_ITEM_MODELS[key]
+            return {"type": event_type, "data": model.model_validate(value).model_dump()}
+        if kind == "array" and key == "synonyms" and isinstance(value, list):
+            return {"type": "synonyms", "data": [s for s in value if isinstance(s, str)]}
+    except ValidationError as e:
+        logging.warning(f"ストリーミング中の要素の検証に失敗しました: {key} ({e})")
+    return None
@@ -0,0 +1,218 @@
+from typing import Iterable, Optional
+from array import array
+from bisect import bisect_left
+import asyncio
+import logging
+import os
+import sys
+import time
+
+from firebase_admin import firestore
+
+from .dictionary_store import LocalDictionary
+from .word_cache import normalize_word
+
+# 削除インデックスのキー: 上位42ビットに削除文字列のハッシュ値、下位21ビットに単語番号を入れる
+WORD_ID_BITS = 21
+WORD_ID_MASK = (1 << WORD_ID_BITS) - 1
+HASH_MASK = (1 << (63 - WORD_ID_BITS)) - 1
+
+
+class SuggestionIndex:
+    """
+    辞書の見出し語から作る、前方一致と誤り訂正の候補検索用インデックス。
+    前方一致はソート済み配列の二分探索で、誤り訂正はSymSpell方式の削除インデックス
+    (各単語から最大 max_edit_distance 文字を削除した文字列 → 単語番号) で候補を引き、
+    編集距離を計算して絞り込む。削除候補は先頭 prefix_length 文字のみから作ってメモリを抑える。
+
+    削除インデックスは文字列の辞書ではなく、「削除文字列のハッシュ値の上位ビット + 単語番号」を
+    1つの64ビット整数にまとめたソート済み配列として持つ。ハッシュの衝突で余分な候補が
+    混ざっても、編集距離の計算で取り除かれる。
+    """
+
+    def __init__(self, words: Iterable[str], max_edit_distance: int = 2, prefix_length: int = 7):
+        started = time.perf_counter()
+        self.max_edit_distance = max_edit_distance
+        self.prefix_length = prefix_length
+        self.words: list[str] = sorted({normalize_word(word) for word in words if word and word.strip()})
+        if len(self.words) > WORD_ID_MASK:
+            raise ValueError(f"候補検索用インデックスに登録できる単語数 ({WORD_ID_MASK}) を超えています")
+
+        keys = []
+        for word_id, word in enumerate(self.words):
+            for deleted in set().union(*self._deletes_by_level(word[:prefix_length], max_edit_distance)):
+                keys.append(_hash_key(deleted) | word_id)
+        keys.sort()
+        self._delete_keys = array('q', keys)
+        self.build_seconds = time.perf_counter() - started
+
+    def _max_distance_for(self, query: str) -> int:
+        """短い入力ほど距離2の候補が大量に出るため、4文字以下では距離1までに抑える"""
+        return min(self.max_edit_distance, 1 if len(query) <= 4 else self.max_edit_distance)
+
+    @staticmethod
+    def _deletes_by_level(text: str, max_distance: int) -> list[set[str]]:
+        """text から 0〜max_distance 文字を削除した文字列を、削除した文字数ごとに返す"""
+        levels = [{text}]
+        seen = {text}
+        for _ in range(max_distance):
+            next_level = set()
+            for item in levels[-1]:
+                if len(item) <= 1:
+                    continue
+                for i in range(len(item)):
+                    deleted = item[:i] + item[i + 1:]
+                    if deleted not in seen:
+                        seen.add(deleted)
+                        next_level.add(deleted)
+            levels.append(next_level)
+        return levels
+
+    def prefix(self, query: str, limit: int = 10) -> list[str]:
+        """query で始まる単語を辞書順に最大 limit 件返す"""
+        query = normalize_word(query)
+        if not query:
+            return []
+        results = []
+        i = bisect_left(self.words, query)
+        while i < len(self.words) and len(results) < limit and self.words[i].startswith(query):
+            results.append(self.words[i])
+            i += 1
+        return results
+
+    def corrections(self, query: str, limit: int = 10) -> list[tuple[str, int]]:
+        """
+        query から編集距離の上限以内の単語を (単語, 距離) で距離の近い順に返す。
+        削除文字数の少ない削除文字列から順に調べ、距離 k 未満の候補が limit 件そろった時点で
+        k 文字以上削除した文字列は調べない (距離 d の単語は d 文字以下の削除で必ず見つかるので、
+        それ以降に見つかるのは距離 k 以上の候補だけで、上位 limit 件は変わらない)。
+        """
+        query = normalize_word(query)
+        if not query:
+            return []
+        max_distance = self._max_distance_for(query)
+        checked = set()
+        results = []
+        for level, deletes in enumerate(self._deletes_by_level(query[:self.prefix_length], max_distance)):
+            if sum(1 for _, distance in results if distance < level) >= limit:
+                break
+            for deleted in deletes:
+                key = _hash_key(deleted)
+                i = bisect_left(self._delete_keys, key)
+                while i < len(self._delete_keys) and self._delete_keys[i] & ~WORD_ID_MASK == key:
+                    word_id = self._delete_keys[i] & WORD_ID_MASK
+                    i += 1
+                    if word_id in checked:
+                        continue
+                    checked.add(word_id)
+                    word = self.words[word_id]
+                    if abs(len(word) - len(query)) > max_distance:
+                        continue
+                    distance = damerau_levenshtein(query, word, max_distance)
+                    if distance <= max_distance:
+                        results.append((word, distance))
+        results.sort(key=lambda item: (item[1], abs(len(item[0]) - len(query)), item[0]))
+        return results[:limit]
+
+    def contains(self, word: str) -> bool:
+        word = normalize_word(word)
+        i = bisect_left(self.words, word)
+        return i < len(self.words) and self.words[i] == word
+
+    def memory_bytes(self) -> int:
+        """インデックスが保持するオブジェクトのおおよそのメモリ使用量 (バイト)"""
+        total = sys.getsizeof(self.words) + sum(sys.getsizeof(word) for word in self.words)
+        return total + sys.getsizeof(self._delete_keys)
+
+    def stats(self) -> dict:
+        return {
+            "words": len(self.words),
+            "delete_entries": len(self._delete_keys),
+            "max_edit_distance": self.max_edit_distance,
+            "prefix_length": self.prefix_length,
+            "build_seconds": round(self.build_seconds, 3),
+            "memory_bytes": self.memory_bytes(),
+        }
+
+
+def _hash_key(text: str) -> int:
+    """削除文字列のハッシュ値を、下位ビットを単語番号用に空けた64ビット整数にする"""
+    return (hash(text) & HASH_MASK) << WORD_ID_BITS
+
+
+def damerau_levenshtein(a: str, b: str, max_distance: int) -> int:
+    """
+    隣接文字の入れ替えを1操作とする編集距離 (OSA距離) を計算する。
+    距離が max_distance を超えるセルは計算しない (対角線から max_distance 以内の帯のみを計算する)。
+    max_distance を超えることが確定した時点で max_distance + 1 を返す。
+    """
+    if a == b:
+        return 0
+    len_a, len_b = len(a), len(b)
+    if abs(len_a - len_b) > max_distance:
+        return max_distance + 1
+    limit = max_distance + 1
+    previous_previous = None
+    previous = [j if j <= max_distance else limit for j in range(len_b + 1)]
+    for i in range(1, len_a + 1):
+        current = [limit] * (len_b + 1)
+        if i <= max_distance:
+            current[0] = i
+        row_min = current[0]
+        char_a = a[i - 1]
+        for j in range(max(1, i - max_distance), min(len_b, i + max_distance) + 1):
+            value = previous[j - 1] if char_a == b[j - 1] else previous[j - 1] + 1
+            if previous[j] + 1 < value:
+                value = previous[j] + 1
+            if current[j - 1] + 1 < value:
+                value = current[j - 1] + 1
+            if (previous_previous is not None and j > 1 and char_a == b[j - 2] and a[i - 2] == b[j - 1]
+                    and previous_previous[j - 2] + 1 < value):
+                value = previous_previous[j - 2] + 1
+            if value > limit:
+                value = limit
+            current[j] = value
+            if value < row_min:
+                row_min = value
+        if row_min > max_distance:
+            return limit
+        previous_previous, previous = previous, current
+    return previous[len_b]
+
+
+suggestion_index: Optional[SuggestionIndex] = None
+
+
+def load_dictionary_words(local_dictionary: Optional[LocalDictionary]) -> list[str]:
+    """
+    見出し語の一覧を読み込む。同梱の辞書ファイルがあればそこから、
+    なければFirestoreの dictionary コレクションのドキュメントIDから読み込む。
+    """
+    if local_dictionary is not None:
+        return list(local_dictionary.iter_words())
+    db = firestore.client()
+    return [document.id for document in db.collection('dictionary').select([]).stream()]
+
+
+async def init_suggestion_index(local_dictionary: Optional[LocalDictionary] = None) -> None:
+    """アプリケーション起動時に候補検索用インデックスを作成する (失敗しても起動は続ける)"""
+    global suggestion_index
+    try:
+        words = await asyncio.to_thread(load_dictionary_words, local_dictionary)
+        suggestion_index = await asyncio.to_thread(
+            SuggestionIndex,
+            words,
+            int(os.getenv("SUGGEST_MAX_EDIT_DISTANCE", "2")),
+            int(os.getenv("SUGGEST_PREFIX_LENGTH", "7")),
+        )
+        stats = suggestion_index.stats()
+        logging.info(
+            f"候補検索用インデックスを作成しました: {stats['words']}語, "
+            f"{stats['build_seconds']}秒, 約{stats['memory_bytes'] / 1024 / 1024:.1f} MB"
+        )
+    except Exception as e:
+        logging.error(f"候補検索用インデックスの作成に失敗しました: {e}")
+
+
+def get_suggestion_index() -> Optional[SuggestionIndex]:
+    return suggestion_index
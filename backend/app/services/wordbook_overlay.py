@@ -0,0 +1,345 @@
+from datetime import datetime
+from typing import Optional
+from uuid import uuid4
+import logging
+
+from firebase_admin import firestore
+
+from ..core.pagination import as_utc
+
+# 複製元から引き継いだ単語のID「複製した単語帳のID:複製元でのID」の区切り
+OVERLAY_SEPARATOR = ":"
+# 複製の複製をたどる深さの上限 (循環した参照で止まらなくならないようにする)
+MAX_OVERLAY_DEPTH = 32
+# 1回のバッチにまとめる書き込みの上限 (Firestoreのバッチは500件まで)
+BATCH_LIMIT = 500
+# 単語のドキュメントのうち、単語帳ごとに付け替えるフィールド
+OVERLAY_FIELDS = ("id", "wordbook_id", "owner_id", "base_word_id", "added_at", "revised_at")
+# 複製がある単語帳で単語を変更・削除したときに、変更前の内容を残すコレクション
+VERSION_COLLECTION = "word_versions"
+# 変更前の内容のドキュメントのうち、単語の内容ではないフィールド
+VERSION_FIELDS = ("word_id", "valid_from", "valid_until")
+# 複製がある単語帳を削除したときに、複製が引き継ぐ単語をたどるために残す単語帳の記録
+RETAINED_COLLECTION = "retained_wordbooks"
+
+
+class ChunkedBatch:
+    """書き込みが BATCH_LIMIT 件に達するたびにコミットするバッチ (件数に上限のない書き込みに使う)"""
+
+    def __init__(self, db: firestore.Client):
+        self.db = db
+        self._batch = db.batch()
+        self._operations = 0
+
+    def set(self, reference, data: dict) -> None:
+        self._batch.set(reference, data)
+        self._count()
+
+    def update(self, reference, data: dict) -> None:
+        self._batch.update(reference, data)
+        self._count()
+
+    def delete(self, reference) -> None:
+        self._batch.delete(reference)
+        self._count()
+
+    def _count(self) -> None:
+        self._operations += 1
+        if self._operations >= BATCH_LIMIT:
+            self.commit()
+
+    def commit(self) -> None:
+        if self._operations:
+            self._batch.commit()
+        self._batch = self.db.batch()
+        self._operations = 0
+
+
+def overlay_word_id(wordbook_id: str, key: str) -> str:
+    return f"{wordbook_id}{OVERLAY_SEPARATOR}{key}"
+
+
+def split_overlay_word_id(word_id: str) -> Optional[tuple[str, str]]:
+    """引き継いだ単語のIDなら (単語帳のID, 複製元でのID)、そうでなければ None"""
+    if OVERLAY_SEPARATOR not in word_id:
+        return None
+    wordbook_id, key = word_id.split(OVERLAY_SEPARATOR, 1)
+    return wordbook_id, key
+
+
+def added_at(word: dict) -> datetime:
+    """単語がその単語帳に加わった日時 (複製した時点で含まれていたかどうかの判定に使う)"""
+    return as_utc(word.get("added_at") or word["created_at"])
+
+
+def revised_at(word: dict) -> datetime:
+    """単語が今の内容になった日時 (変更していなければ加わった日時)"""
+    return as_utc(word.get("revised_at")) if word.get("revised_at") else added_at(word)
+
+
+def inherit(word: dict, wordbook_data: dict) -> dict:
+    """複製元の単語を、複製した単語帳の単語として見せる"""
+    inherited = {field: value for field, value in word.items() if field not in OVERLAY_FIELDS}
+    return {
+        **inherited,
+        "id": overlay_word_id(wordbook_data["id"], word["id"]),
+        "wordbook_id": wordbook_data["id"],
+        "owner_id": wordbook_data.get("owner_id"),
+        "added_at": added_at(word),
+    }
+
+
+def own_words(db: firestore.Client, wordbook_id: str) -> list[dict]:
+    """単語帳に実際に保存されている単語 (複製元から引き継いだ単語を含まない)"""
+    words_query = db.collection("words").where("wordbook_id", "==", wordbook_id)
+    return [doc.to_dict() for doc in words_query.stream()]
+
+
+def replaced_keys(wordbook_data: dict, words: list[dict]) -> set[str]:
+    """複製元の単語のうち、この単語帳で編集 (実体化) または削除したもののID"""
+    keys = {word["base_word_id"] for word in words if word.get("base_word_id")}
+    return keys | set(wordbook_data.get("hidden_word_ids") or [])
+
+
+def get_wordbook(db: firestore.Client, wordbook_id: str, include_retained: bool = True) -> Optional[dict]:
+    """単語帳を返す。include_retained なら、削除したが複製のために残している単語帳の記録も返す"""
+    wordbook_doc = db.collection("wordbooks").document(wordbook_id).get()
+    if wordbook_doc.exists:
+        return wordbook_doc.to_dict()
+    if include_retained:
+        retained_doc = db.collection(RETAINED_COLLECTION).document(wordbook_id).get()
+        if retained_doc.exists:
+            return retained_doc.to_dict()
+    return None
+
+
+def get_base_wordbook(db: firestore.Client, wordbook_data: dict) -> Optional[dict]:
+    base_id = wordbook_data.get("base_wordbook_id")
+    if not base_id:
+        return None
+    return get_wordbook(db, base_id)
+
+
+def version_content(version: dict) -> dict:
+    content = {field: value for field, value in version.items() if field not in VERSION_FIELDS}
+    return {**content, "id": version["word_id"]}
+
+
+def versions_at(db: firestore.Client, wordbook_id: str, cutoff: datetime) -> dict[str, dict]:
+    """
+    単語帳の単語のうち、cutoff より後に変更・削除したものの cutoff の時点の内容 (単語帳でのID → 単語)。
+    読み込むのは cutoff より後の変更の分だけ。
+    """
+    versions_query = (
+        db.collection(VERSION_COLLECTION)
+        .where("wordbook_id", "==", wordbook_id)
+        .where("valid_until", ">", cutoff)
+    )
+    versions = {}
+    for doc in versions_query.stream():
+        version = doc.to_dict()
+        if as_utc(version["valid_from"]) <= cutoff:
+            versions[version["word_id"]] = version_content(version)
+    return versions
+
+
+def version_at(db: firestore.Client, wordbook_id: str, word_id: str, cutoff: datetime) -> Optional[dict]:
+    """単語帳の単語 word_id を cutoff より後に変更・削除していれば、cutoff の時点の内容"""
+    versions_query = (
+        db.collection(VERSION_COLLECTION)
+        .where("wordbook_id", "==", wordbook_id)
+        .where("word_id", "==", word_id)
+        .where("valid_until", ">", cutoff)
+        .order_by("valid_until")
+        .limit(1)
+    )
+    for doc in versions_query.stream():
+        version = doc.to_dict()
+        if as_utc(version["valid_from"]) <= cutoff:
+            return version_content(version)
+    return None
+
+
+def resolve_words(db: firestore.Client, wordbook_data: dict, depth: int = 0) -> list[dict]:
+    """
+    単語帳の単語を返す。複製した単語帳 (base_wordbook_id がある) では、自分の単語に加えて、
+    複製した時点 (base_cutoff) で複製元にあった単語のうち、編集・削除していないものを引き継ぐ。
+    複製元でその後に変更・削除された単語は、残しておいた複製の時点の内容を引き継ぐ
+    (複製元が削除されていても、複製のために残している単語と記録から同じように引き継ぐ)。
+    複製元が複製した単語帳でも、同じようにたどる。
+    """
+    words = own_words(db, wordbook_data["id"])
+    if depth >= MAX_OVERLAY_DEPTH:
+        logging.warning(f"複製元をたどる深さが上限に達しました: {wordbook_data['id']}")
+        return words
+    base_data = get_base_wordbook(db, wordbook_data)
+    if base_data is None:
+        return words
+    replaced = replaced_keys(wordbook_data, words)
+    cutoff = as_utc(wordbook_data["base_cutoff"])
+    versions = versions_at(db, base_data["id"], cutoff)
+    base_words = [word for word in resolve_words(db, base_data, depth + 1) if word["id"] not in versions and added_at(word) <= cutoff]
+    for word in base_words + list(versions.values()):
+        if word["id"] not in replaced:
+            words.append(inherit(word, wordbook_data))
+    return words
+
+
+def is_replaced(db: firestore.Client, wordbook_data: dict, key: str) -> bool:
+    """複製元の単語 key を、この単語帳で編集 (実体化) または削除したか"""
+    if key in (wordbook_data.get("hidden_word_ids") or []):
+        return True
+    overrides = (
+        db.collection("words")
+        .where("wordbook_id", "==", wordbook_data["id"])
+        .where("base_word_id", "==", key)
+        .limit(1)
+    )
+    return any(True for _ in overrides.stream())
+
+
+def get_word(db: firestore.Client, word_id: str, depth: int = 0) -> Optional[tuple[dict, dict]]:
+    """
+    IDの単語と、その単語が属する単語帳を返す (見つからなければ None)。
+    引き継いだ単語のIDなら、複製元をたどって引き継いだ内容を返す。
+    削除した単語帳に複製のために残している単語は、引き継いだ単語としてだけ返す (内容を変えられないようにする)。
+    """
+    parts = split_overlay_word_id(word_id)
+    if parts is None:
+        word_doc = db.collection("words").document(word_id).get()
+        if not word_doc.exists:
+            return None
+        word = word_doc.to_dict()
+        wordbook_id = word.get("wordbook_id")
+        if wordbook_id and depth == 0 and db.collection(RETAINED_COLLECTION).document(wordbook_id).get().exists:
+            return None
+        wordbook_data = get_wordbook(db, wordbook_id) if wordbook_id else None
+        # 単語帳が削除されている単語も、単語そのものは返す
+        return word, (wordbook_data if wordbook_data is not None else {"id": wordbook_id})
+
+    wordbook_id, key = parts
+    wordbook_data = get_wordbook(db, wordbook_id, include_retained=depth > 0)
+    if wordbook_data is None or depth >= MAX_OVERLAY_DEPTH:
+        return None
+    base_id = wordbook_data.get("base_wordbook_id")
+    if not base_id or is_replaced(db, wordbook_data, key):
+        return None
+    cutoff = as_utc(wordbook_data["base_cutoff"])
+    word = version_at(db, base_id, key, cutoff)
+    if word is None:
+        found = get_word(db, key, depth + 1)
+        if found is None:
+            return None
+        word, base_data = found
+        if base_data.get("id") != base_id or added_at(word) > cutoff:
+            return None
+    return inherit(word, wordbook_data), wordbook_data
+
+
+def materialize_word(batch: ChunkedBatch, db: firestore.Client, wordbook_data: dict, key: str, word: dict, updates: Optional[dict] = None) -> dict:
+    """引き継いだ単語 (複製元でのIDが key) を、この単語帳の単語として保存する (updates があれば内容を変更して保存する)"""
+    now = datetime.now()
+    word_id = str(uuid4())
+    content = {field: value for field, value in word.items() if field not in OVERLAY_FIELDS}
+    word_data = {
+        **content,
+        **(updates or {}),
+        "id": word_id,
+        "wordbook_id": wordbook_data["id"],
+        "owner_id": wordbook_data.get("owner_id"),
+        "base_word_id": key,
+        "added_at": now,
+    }
+    batch.set(db.collection("words").document(word_id), word_data)
+    return word_data
+
+
+def copies_query(db: firestore.Client, wordbook_id: str):
+    return db.collection("wordbooks").where("base_wordbook_id", "==", wordbook_id)
+
+
+def count_copies(db: firestore.Client, wordbook_data: dict) -> int:
+    """
+    単語帳の複製の数。単語帳の num_copies を使い、num_copies を記録する前に作られた単語帳では集計クエリで数える
+    """
+    if "num_copies" in wordbook_data:
+        return wordbook_data["num_copies"]
+    return copies_query(db, wordbook_data["id"]).count().get()[0][0].value
+
+
+def add_copy(batch: ChunkedBatch, db: firestore.Client, base_data: dict) -> None:
+    """複製元の num_copies を増やす (まだ記録していなければ、今ある複製の数から記録を始める)"""
+    base_ref = db.collection("wordbooks").document(base_data["id"])
+    if "num_copies" in base_data:
+        batch.update(base_ref, {"num_copies": firestore.Increment(1)})
+    else:
+        batch.update(base_ref, {"num_copies": count_copies(db, base_data) + 1})
+
+
+def retain_version(batch: ChunkedBatch, db: firestore.Client, wordbook_data: dict, word: dict) -> bool:
+    """
+    単語帳の単語 word (この単語帳でのIDが word["id"]) を変更・削除する前に、複製がある単語帳なら
+    変更前の内容を1件残す (複製はこれを見て、複製した時点の内容を引き継ぐ)。
+    書き込みは複製の数によらず1件で、複製がない単語帳では何も書き込まない。
+    """
+    if not wordbook_data.get("id") or count_copies(db, wordbook_data) <= 0:
+        return False
+    version = {
+        **word,
+        "wordbook_id": wordbook_data["id"],
+        "word_id": word["id"],
+        "valid_from": revised_at(word),
+        "valid_until": datetime.now(),
+    }
+    version.pop("id", None)
+    batch.set(db.collection(VERSION_COLLECTION).document(str(uuid4())), version)
+    return True
+
+
+def delete_words(batch: ChunkedBatch, db: firestore.Client, wordbook_id: str) -> None:
+    """単語帳に保存されている単語と、残しておいた変更前の内容を削除する"""
+    for doc in db.collection("words").where("wordbook_id", "==", wordbook_id).stream():
+        batch.delete(doc.reference)
+    for doc in db.collection(VERSION_COLLECTION).where("wordbook_id", "==", wordbook_id).stream():
+        batch.delete(doc.reference)
+
+
+def retain_wordbook(batch: ChunkedBatch, db: firestore.Client, wordbook_data: dict) -> None:
+    """
+    複製がある単語帳を削除するときに、単語を残し、複製元をたどるための記録を残す。
+    複製は削除した時点の単語を引き継ぎ続ける (単語帳は削除されているので、単語はもう変わらない)。
+    """
+    batch.set(db.collection(RETAINED_COLLECTION).document(wordbook_data["id"]), {
+        "id": wordbook_data["id"],
+        "owner_id": wordbook_data.get("owner_id"),
+        "base_wordbook_id": wordbook_data.get("base_wordbook_id"),
+        "base_cutoff": wordbook_data.get("base_cutoff"),
+        "hidden_word_ids": wordbook_data.get("hidden_word_ids") or [],
+        "num_copies": count_copies(db, wordbook_data),
+        "deleted_at": datetime.now(),
+    })
+
+
+def release_copy(batch: ChunkedBatch, db: firestore.Client, copy_data: dict, depth: int = 0) -> None:
+    """
+    複製を削除するときに、複製元の num_copies を減らす。複製元が削除した単語帳で、これが最後の複製なら、
+    残しておいた単語と記録を削除する (その複製元についても同じようにたどる)。
+    """
+    base_id = copy_data.get("base_wordbook_id")
+    if not base_id or depth >= MAX_OVERLAY_DEPTH:
+        return
+    base_doc = db.collection("wordbooks").document(base_id).get()
+    if base_doc.exists:
+        if "num_copies" in base_doc.to_dict():
+            batch.update(base_doc.reference, {"num_copies": firestore.Increment(-1)})
+        return
+    retained_doc = db.collection(RETAINED_COLLECTION).document(base_id).get()
+    if not retained_doc.exists:
+        return
+    retained_data = retained_doc.to_dict()
+    if retained_data.get("num_copies", 0) > 1:
+        batch.update(retained_doc.reference, {"num_copies": firestore.Increment(-1)})
+        return
+    delete_words(batch, db, base_id)
+    release_copy(batch, db, retained_data, depth + 1)
+    batch.delete(retained_doc.reference)
@@ -0,0 +1,144 @@
+from typing import Any, Iterator, Optional
+import heapq
+
+from firebase_admin import firestore
+
+# 検索で並べ替えに使えるフィールド (firestore.indexes.json にこれらの複合インデックスを定義している)
+SORT_FIELDS = ("created_at", "updated_at", "name", "num_words")
+
+
+class WordbookQuery:
+    """サーバー側で絞り込む1つのFirestoreクエリ (filters は (フィールド, 演算子, 値) のリスト)"""
+
+    def __init__(self, filters: list[tuple[str, str, Any]], exclude_owner_id: Optional[str] = None):
+        self.filters = filters
+        # 他のクエリと重複する単語帳 (公開されている自分の単語帳) を読み飛ばすための所有者ID
+        self.exclude_owner_id = exclude_owner_id
+
+    def build(self, db: firestore.Client, sort_by: str, sort_order: str, after: Optional[tuple] = None) -> firestore.Query:
+        direction = firestore.Query.DESCENDING if sort_order == "desc" else firestore.Query.ASCENDING
+        query = db.collection("wordbooks")
+        for field, operator, value in self.filters:
+            query = query.where(field, operator, value)
+        # 同じ値の単語帳はIDの順に並べ、カーソルの位置を一意にする
+        query = query.order_by(sort_by, direction=direction).order_by("__name__", direction=direction)
+        if after is not None:
+            query = query.start_after({sort_by: after[0], "__name__": after[1]})
+        return query
+
+    def __repr__(self) -> str:
+        return f"WordbookQuery({self.filters}, exclude_owner_id={self.exclude_owner_id})"
+
+
+class WordbookSearchPlan:
+    """
+    検索条件から作ったFirestoreクエリの組み合わせ。queries の結果を sort_by の順に併合したものが検索対象になる。
+    min_words はサーバー側で絞り込めない場合だけ、読み込んだ後にアプリケーション側で確かめる。
+    """
+
+    def __init__(self, queries: list[WordbookQuery], min_words: Optional[int] = None):
+        self.queries = queries
+        self.min_words = min_words
+
+    def matches(self, wordbook: dict) -> bool:
+        """サーバー側で絞り込めなかった条件を確かめる"""
+        return self.min_words is None or (wordbook.get("num_words") or 0) >= self.min_words
+
+    def __repr__(self) -> str:
+        return f"WordbookSearchPlan({self.queries}, min_words={self.min_words})"
+
+
+def plan_wordbook_search(
+    uid: str,
+    is_public: Optional[bool],
+    is_owned: Optional[bool],
+    min_words: Optional[int],
+    sort_by: str,
+) -> WordbookSearchPlan:
+    """
+    検索条件をFirestoreのクエリに変換する。読み込めるのは「自分の単語帳 (owner_id == uid)」と
+    「公開単語帳 (is_public == True)」だけなので、条件に応じてどちらか一方、または両方の和集合を検索する。
+    他人の非公開単語帳はどのクエリにも含まれないため、読み込まれることはない。
+
+    - is_owned / is_public はどちらも等価条件としてクエリに含める (両方を指定すれば両方で絞り込む)
+    - min_words は範囲条件なので、並べ替えと同じフィールド (sort_by == "num_words") のときだけクエリに含め、
+      それ以外はアプリケーション側で確かめる (範囲条件と異なるフィールドの並べ替えは同じインデックスで扱えない)
+    """
+    range_filters = []
+    residual_min_words = min_words
+    if min_words is not None and sort_by == "num_words":
+        range_filters.append(("num_words", ">=", min_words))
+        residual_min_words = None
+
+    own = [("owner_id", "==", uid)]
+    public = [("is_public", "==", True)]
+    if is_owned:
+        # 自分の単語帳だけ (公開・非公開の指定があれば、それも等価条件にする)
+        filters = own + ([("is_public", "==", is_public)] if is_public is not None else [])
+        queries = [WordbookQuery(filters + range_filters)]
+    elif is_owned is False:
+        # 他人の単語帳で読めるのは公開されているものだけ
+        queries = [] if is_public is False else [WordbookQuery(public + range_filters, exclude_owner_id=uid)]
+    elif is_public:
+        # 公開単語帳 (自分の公開単語帳を含む)
+        queries = [WordbookQuery(public + range_filters)]
+    elif is_public is False:
+        # 非公開で読めるのは自分の単語帳だけ
+        queries = [WordbookQuery(own + [("is_public", "==", False)] + range_filters)]
+    else:
+        # 自分の単語帳と公開単語帳の和集合 (自分の公開単語帳は1つ目のクエリで読むので、2つ目では読み飛ばす)
+        queries = [WordbookQuery(own + range_filters), WordbookQuery(public + range_filters, exclude_owner_id=uid)]
+    return WordbookSearchPlan(queries, residual_min_words)
+
+
+def stream_wordbooks(
+    db: firestore.Client,
+    plan: WordbookSearchPlan,
+    sort_by: str,
+    sort_order: str,
+    after: Optional[tuple] = None,
+) -> Iterator[dict]:
+    """
+    計画のクエリを sort_by の順 (同じ値はIDの順) に併合しながら読み込む。
+    Firestoreのクエリは読んだ分だけ取得するので、呼び出し側が途中で読むのをやめれば、それ以降は読み込まれない。
+    """
+    def stream(query: WordbookQuery) -> Iterator[dict]:
+        for doc in query.build(db, sort_by, sort_order, after).stream():
+            wordbook_data = doc.to_dict()
+            if query.exclude_owner_id is not None and wordbook_data.get("owner_id") == query.exclude_owner_id:
+                continue
+            if plan.matches(wordbook_data):
+                yield wordbook_data
+
+    streams = [stream(query) for query in plan.queries]
+    if len(streams) == 1:
+        yield from streams[0]
+        return
+    yield from heapq.merge(
+        *streams,
+        key=lambda wordbook_data: (wordbook_data[sort_by], wordbook_data["id"]),
+        reverse=sort_order == "desc",
+    )
+
+
+def _count(db: firestore.Client, filters: list[tuple[str, str, Any]]) -> int:
+    query = db.collection("wordbooks")
+    for field, operator, value in filters:
+        query = query.where(field, operator, value)
+    return query.count().get()[0][0].value
+
+
+def count_wordbooks(db: firestore.Client, plan: WordbookSearchPlan) -> Optional[int]:
+    """
+    計画に合う単語帳の数をFirestoreの集計クエリで数える (ドキュメントを読み込まない)。
+    読み飛ばす自分の単語帳の数は、同じ条件に owner_id を加えた集計で差し引く。
+    アプリケーション側で確かめる条件がある場合は数えられないので None。
+    """
+    if plan.min_words is not None:
+        return None
+    total = 0
+    for query in plan.queries:
+        total += _count(db, query.filters)
+        if query.exclude_owner_id is not None:
+            total -= _count(db, query.filters + [("owner_id", "==", query.exclude_owner_id)])
+    return total
@@ -0,0 +1,267 @@
+from typing import Iterable, Iterator, Optional
+from array import array
+import asyncio
+import heapq
+import logging
+import os
+import re
+import sys
+import time
+import unicodedata
+
+from ..core.pagination import as_utc
+from .wordbook_sync import WordbookViewSync, run_periodically
+
+# 索引に持つ単語帳のフィールド (検索結果のレスポンスもここから作る)
+WORDBOOK_FIELDS = ["id", "name", "user_name", "owner_id", "is_public", "num_words", "description", "created_at", "updated_at"]
+# 削除・更新で使われなくなった枠がこの数を超え、かつ有効な枠より多くなったら詰め直す
+COMPACT_MIN_DEAD = 1000
+NON_WORD_PATTERN = re.compile(r'\W+')
+
+
+def normalize_search_text(text: Optional[str]) -> str:
+    """全角・半角を揃え (NFKC)、記号・空白を除いて小文字にする。日本語の文字はそのまま残る"""
+    if not text:
+        return ''
+    return NON_WORD_PATTERN.sub('', unicodedata.normalize('NFKC', text)).lower()
+
+
+def searchable_text(wordbook: dict) -> str:
+    """単語帳の名前・説明・ユーザー名をつなげて正規化した検索対象の文字列"""
+    return normalize_search_text(" ".join(
+        wordbook.get(field) or '' for field in ("name", "description", "user_name")
+    ))
+
+
+def bigrams(text: str) -> set[str]:
+    return {text[i:i + 2] for i in range(len(text) - 1)}
+
+
+class WordbookSearchIndex:
+    """
+    単語帳の検索用の転置インデックス。検索対象の文字列 (名前・説明・ユーザー名を正規化してつなげたもの) の
+    文字バイグラム → 単語帳の枠番号 の対応を持つ。単語の区切りに依存しないため、日本語の名前でも部分一致で引ける。
+
+    検索では、クエリのバイグラムのうち最も該当件数の少ないものの枠番号だけを候補として取り出し、
+    候補の文字列にクエリが含まれるかを確かめる (従来の全件走査と同じ部分一致の結果になる)。
+    1文字のクエリだけはバイグラムで引けないため、全件の文字列を確かめる。
+
+    単語帳の追加・更新・削除はインデックスに直接反映する。更新・削除で使われなくなった枠は
+    一定数たまったら詰め直す。
+    """
+
+    def __init__(self, wordbooks: Iterable[dict] = ()):
+        started = time.perf_counter()
+        self._entries: list[Optional[dict]] = []
+        self._texts: list[str] = []
+        self._slots: dict[str, int] = {}
+        self._postings: dict[str, array] = {}
+        self._dead = 0
+        for wordbook in wordbooks:
+            self.upsert(wordbook)
+        self.build_seconds = time.perf_counter() - started
+
+    def __len__(self) -> int:
+        return len(self._slots)
+
+    def upsert(self, wordbook: dict) -> None:
+        """単語帳を追加する。同じIDの単語帳があれば置き換える"""
+        wordbook_id = wordbook["id"]
+        if wordbook_id in self._slots:
+            self._release(self._slots.pop(wordbook_id))
+        # 作成直後の単語帳 (タイムゾーンのない日時) とFirestoreから読み込んだ単語帳の日時を比較できるようにする
+        entry = {field: as_utc(wordbook.get(field)) for field in WORDBOOK_FIELDS}
+        text = searchable_text(entry)
+        slot = len(self._entries)
+        self._entries.append(entry)
+        self._texts.append(text)
+        self._slots[wordbook_id] = slot
+        for gram in bigrams(text):
+            postings = self._postings.get(gram)
+            if postings is None:
+                postings = self._postings[gram] = array('I')
+            postings.append(slot)
+        self._maybe_compact()
+
+    def remove(self, wordbook_id: str) -> None:
+        slot = self._slots.pop(wordbook_id, None)
+        if slot is not None:
+            self._release(slot)
+            self._maybe_compact()
+
+    def adjust_num_words(self, wordbook_id: str, delta: int) -> None:
+        """単語の追加・削除に合わせて単語数だけを更新する (検索対象の文字列は変わらない)"""
+        slot = self._slots.get(wordbook_id)
+        if slot is not None:
+            entry = self._entries[slot]
+            entry["num_words"] = max(0, (entry.get("num_words") or 0) + delta)
+
+    def _release(self, slot: int) -> None:
+        # 転置リストからは消さず、枠を空にするだけにする (検索時に読み飛ばし、詰め直しで消える)
+        self._entries[slot] = None
+        self._texts[slot] = ''
+        self._dead += 1
+
+    def _maybe_compact(self) -> None:
+        if self._dead > COMPACT_MIN_DEAD and self._dead > len(self._slots):
+            entries = [entry for entry in self._entries if entry is not None]
+            self._entries, self._texts, self._slots, self._postings, self._dead = [], [], {}, {}, 0
+            for entry in entries:
+                self.upsert(entry)
+
+    def get(self, wordbook_id: str) -> Optional[dict]:
+        slot = self._slots.get(wordbook_id)
+        return self._entries[slot] if slot is not None else None
+
+    def _candidates(self, query: str) -> Iterable[int]:
+        """クエリを含む可能性のある枠番号"""
+        if len(query) < 2:
+            return range(len(self._entries))
+        rarest = None
+        for gram in bigrams(query):
+            postings = self._postings.get(gram)
+            if postings is None:
+                return ()
+            if rarest is None or len(postings) < len(rarest):
+                rarest = postings
+        return rarest
+
+    def _matches(
+        self,
+        q: Optional[str],
+        uid: Optional[str],
+        is_public: Optional[bool],
+        is_owned: Optional[bool],
+        min_words: Optional[int],
+        sort_by: str,
+    ) -> Iterator[dict]:
+        """
+        条件に合う単語帳。他人の非公開単語帳は含めない。
+        sort_by のフィールドがない単語帳はFirestoreの order_by と同じく除外する。
+        """
+        query = normalize_search_text(q) if q and q.strip() else ''
+        for slot in self._candidates(query):
+            entry = self._entries[slot]
+            if entry is None or (query and query not in self._texts[slot]):
+                continue
+            is_owner = entry.get("owner_id") == uid
+            public = bool(entry.get("is_public"))
+            if not is_owner and not public:
+                continue
+            if is_public is not None and public != is_public:
+                continue
+            if is_owned is not None and is_owner != is_owned:
+                continue
+            if min_words is not None and (entry.get("num_words") or 0) < min_words:
+                continue
+            if entry.get(sort_by) is None:
+                continue
+            yield entry
+
+    def search(
+        self,
+        q: Optional[str],
+        uid: Optional[str],
+        is_public: Optional[bool] = None,
+        is_owned: Optional[bool] = None,
+        min_words: Optional[int] = None,
+        sort_by: str = "created_at",
+        sort_order: str = "desc",
+    ) -> list[dict]:
+        """条件に合う単語帳をすべて sort_by の順 (同じ値はIDの順) に並べて返す"""
+        results = list(self._matches(q, uid, is_public, is_owned, min_words, sort_by))
+        results.sort(key=lambda entry: (entry[sort_by], entry["id"]), reverse=sort_order == "desc")
+        return results
+
+    def search_page(
+        self,
+        q: Optional[str],
+        uid: Optional[str],
+        is_public: Optional[bool] = None,
+        is_owned: Optional[bool] = None,
+        min_words: Optional[int] = None,
+        sort_by: str = "created_at",
+        sort_order: str = "desc",
+        after: Optional[tuple] = None,
+        offset: int = 0,
+        limit: int = 20,
+    ) -> tuple[list[dict], int, bool]:
+        """
+        条件に合う単語帳のうち、(ソートキーの値, ID) が after より後ろの limit 件を返す
+        (after の代わりに offset で位置を指定してもよい)。
+        条件に合う単語帳をすべて並べ替えず、必要な件数だけをヒープで選ぶ。
+        戻り値は (単語帳のリスト, 条件に合う単語帳の総数, 次のページがあるか)。
+        """
+        descending = sort_order == "desc"
+        matches = list(self._matches(q, uid, is_public, is_owned, min_words, sort_by))
+        total = len(matches)
+        if after is not None:
+            after = (as_utc(after[0]), after[1])
+            if descending:
+                matches = [entry for entry in matches if (entry[sort_by], entry["id"]) < after]
+            else:
+                matches = [entry for entry in matches if (entry[sort_by], entry["id"]) > after]
+        select = heapq.nlargest if descending else heapq.nsmallest
+        selected = select(offset + limit + 1, matches, key=lambda entry: (entry[sort_by], entry["id"]))
+        return selected[offset:offset + limit], total, len(selected) > offset + limit
+
+    def memory_bytes(self) -> int:
+        """転置リストと文字列の大まかなメモリ使用量 (単語帳のデータ自体は含めない)"""
+        postings = sum(sys.getsizeof(gram) + postings.buffer_info()[1] * postings.itemsize for gram, postings in self._postings.items())
+        texts = sum(sys.getsizeof(text) for text in self._texts)
+        return postings + texts + sys.getsizeof(self._postings) + sys.getsizeof(self._slots)
+
+    def stats(self) -> dict:
+        return {
+            "wordbooks": len(self._slots),
+            "dead_slots": self._dead,
+            "grams": len(self._postings),
+            "postings": sum(len(postings) for postings in self._postings.values()),
+            "memory_bytes": self.memory_bytes(),
+            "build_seconds": round(self.build_seconds, 3),
+        }
+
+
+# Firestoreの単語帳と検索インデックスの同期
+_sync = WordbookViewSync("単語帳の検索インデックス", WordbookSearchIndex, field_paths=WORDBOOK_FIELDS)
+_refresh_task: Optional[asyncio.Task] = None
+
+
+async def init_wordbook_search_index() -> None:
+    """
+    アプリケーション起動時に単語帳の検索インデックスを作成する (失敗しても起動は続け、検索はFirestoreへのクエリで行う)。
+    WORDBOOK_SEARCH_REFRESH_SECONDS ごとに、他のインスタンスで更新・削除された単語帳だけを読み込んで反映する (0なら行わない)。
+    """
+    global _refresh_task
+    await _sync.rebuild()
+    if _sync.view is not None:
+        stats = _sync.view.stats()
+        logging.info(
+            f"単語帳の検索インデックス: {stats['wordbooks']}件, "
+            f"{stats['build_seconds']}秒, 約{stats['memory_bytes'] / 1024 / 1024:.1f} MB"
+        )
+    interval = int(os.getenv("WORDBOOK_SEARCH_REFRESH_SECONDS", "600"))
+    if interval > 0:
+        _refresh_task = asyncio.create_task(run_periodically(interval, _sync.refresh))
+
+
+async def close_wordbook_search_index() -> None:
+    if _refresh_task is not None:
+        _refresh_task.cancel()
+
+
+def index_wordbook(wordbook: dict) -> None:
+    """作成・更新した単語帳をインデックスに反映する"""
+    _sync.upsert(wordbook)
+
+
+def remove_wordbook(wordbook_id: str) -> None:
+    _sync.remove(wordbook_id)
+
+
+def adjust_wordbook_num_words(wordbook_id: str, delta: int) -> None:
+    _sync.adjust_num_words(wordbook_id, delta)
+
+
+def get_wordbook_search_index() -> Optional[WordbookSearchIndex]:
+    return _sync.view
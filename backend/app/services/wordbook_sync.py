@@ -0,0 +1,173 @@
+from datetime import datetime, timedelta
+from typing import Any, Callable, Optional
+import asyncio
+import logging
+import os
+
+from firebase_admin import firestore
+
+# 削除した単語帳の記録 (差分の読み込みで、削除された単語帳を他のインスタンスに伝える)
+TOMBSTONE_COLLECTION = "wordbook_tombstones"
+# 削除の記録を残す期間。Firestoreの TTL ポリシーで expire_at を過ぎた記録を削除する
+TOMBSTONE_RETENTION = timedelta(days=7)
+# 差分の読み込みで、インスタンス間の時計のずれを見込んで前回より少し前から読み直す (同じ単語帳を読んでも結果は変わらない)
+SYNC_OVERLAP = timedelta(seconds=int(os.getenv("WORDBOOK_SYNC_OVERLAP_SECONDS", "60")))
+
+
+def tombstone(wordbook_id: str, now: datetime) -> dict:
+    """単語帳を削除するときに TOMBSTONE_COLLECTION に書き込む記録"""
+    return {"id": wordbook_id, "deleted_at": now, "expire_at": now + TOMBSTONE_RETENTION}
+
+
+class WordbookViewSync:
+    """
+    Firestoreの単語帳から作るメモリ上のビュー (検索インデックス・公開単語帳の一覧) を同期する。
+    ビューは upsert(単語帳) / remove(ID) / adjust_num_words(ID, 増減) を持つ。
+
+    - rebuild(): 単語帳を全件読み込んでビューを作り直す (起動時)
+    - refresh(): 前回の同期以降に updated_at が変わった単語帳と、削除の記録だけを読み込んで反映する
+    - upsert() / remove() / adjust_num_words(): このインスタンスでの変更をすぐにビューに反映する
+
+    読み込み中に行われた変更は、読み込んだ内容より新しいかどうかがわからないため、変更の内容 (増減) を
+    もう一度適用するのではなく、変更された単語帳をFirestoreから読み直して現在の値で置き換える。
+    """
+
+    def __init__(
+        self,
+        name: str,
+        build: Callable[[list[dict]], Any],
+        field_paths: Optional[list[str]] = None,
+        filters: Optional[list[tuple[str, str, Any]]] = None,
+    ):
+        self.name = name
+        self.build = build
+        # 読み込むフィールド (None なら全フィールド)
+        self.field_paths = field_paths
+        # 全件を読み込むときの条件 (差分の読み込みでは、条件から外れた単語帳も外すために全単語帳から読む)
+        self.filters = filters or []
+        self.view = None
+        # 最後に同期した時点 (この時点より後に更新された単語帳を次の差分の読み込みで読む)
+        self.synced_at: Optional[datetime] = None
+        # ビューが変わるか、Firestoreと同期するたびに増える (スナップショットの保存の要否の判断に使う)
+        self.version = 0
+        # 読み込み中に変更された単語帳のID (読み込みが終わったらFirestoreから読み直す)
+        self._touched: Optional[set[str]] = None
+        self._lock = asyncio.Lock()
+
+    def _collection(self):
+        return firestore.client().collection("wordbooks")
+
+    def _select(self, query):
+        return query.select(self.field_paths) if self.field_paths is not None else query
+
+    def load_all(self) -> list[dict]:
+        query = self._collection()
+        for field, operator, value in self.filters:
+            query = query.where(field, operator, value)
+        return [document.to_dict() for document in self._select(query).stream()]
+
+    def load_changes(self, since: datetime) -> tuple[list[dict], list[str]]:
+        """since より後に更新された単語帳と、削除された単語帳のID"""
+        db = firestore.client()
+        changed = self._select(self._collection().where("updated_at", ">", since)).stream()
+        removed = db.collection(TOMBSTONE_COLLECTION).where("deleted_at", ">", since).stream()
+        return [document.to_dict() for document in changed], [document.id for document in removed]
+
+    def load_current(self, wordbook_ids: set[str]) -> tuple[list[dict], list[str]]:
+        """IDの単語帳の現在の内容と、存在しない (削除された) 単語帳のID"""
+        db = firestore.client()
+        references = [self._collection().document(wordbook_id) for wordbook_id in wordbook_ids]
+        found, missing = [], []
+        for snapshot in db.get_all(references, field_paths=self.field_paths):
+            if snapshot.exists:
+                found.append({**snapshot.to_dict(), "id": snapshot.id})
+            else:
+                missing.append(snapshot.id)
+        return found, missing
+
+    def _apply(self, view, changed: list[dict], removed: list[str]) -> None:
+        for wordbook in changed:
+            view.upsert(wordbook)
+        for wordbook_id in removed:
+            view.remove(wordbook_id)
+        self.version += 1
+
+    async def _reload_touched(self, view) -> None:
+        """読み込み中に変更された単語帳を、変更がなくなるまで読み直してビューに反映する"""
+        while self._touched:
+            wordbook_ids, self._touched = self._touched, set()
+            changed, removed = await asyncio.to_thread(self.load_current, wordbook_ids)
+            self._apply(view, changed, removed)
+
+    async def rebuild(self) -> None:
+        """全件を読み込んでビューを作り直して置き換える (失敗しても現在のビューを使い続ける)"""
+        async with self._lock:
+            started = datetime.now()
+            self._touched = set()
+            try:
+                wordbooks = await asyncio.to_thread(self.load_all)
+                view = await asyncio.to_thread(self.build, wordbooks)
+                await self._reload_touched(view)
+                self.view = view
+                self.version += 1
+                self.synced_at = started
+                logging.info(f"{self.name}を作成しました: {len(wordbooks)}件")
+            except Exception as e:
+                logging.error(f"{self.name}の作成に失敗しました: {e}")
+            finally:
+                self._touched = None
+
+    async def refresh(self) -> None:
+        """前回の同期以降の変更だけを読み込んで反映する (まだビューがなければ作り直す)"""
+        if self.view is None or self.synced_at is None:
+            await self.rebuild()
+            return
+        async with self._lock:
+            started = datetime.now()
+            self._touched = set()
+            try:
+                changed, removed = await asyncio.to_thread(self.load_changes, self.synced_at - SYNC_OVERLAP)
+                self._apply(self.view, changed, removed)
+                await self._reload_touched(self.view)
+                self.synced_at = started
+                if changed or removed:
+                    logging.info(f"{self.name}に変更を反映しました: 更新 {len(changed)}件, 削除 {len(removed)}件")
+            except Exception as e:
+                logging.error(f"{self.name}の更新に失敗しました: {e}")
+            finally:
+                self._touched = None
+
+    def restore(self, view, synced_at: Optional[datetime]) -> None:
+        """
+        保存しておいたビューを使う。synced_at 以降の変更は次の refresh() で読み込む
+        (synced_at が None なら、次の refresh() で全件を読み込んで作り直すまでこのビューを使う)。
+        """
+        self.view = view
+        self.synced_at = synced_at
+        self.version += 1
+
+    def _touch(self, wordbook_id: str) -> None:
+        self.version += 1
+        if self._touched is not None:
+            self._touched.add(wordbook_id)
+
+    def upsert(self, wordbook: dict) -> None:
+        if self.view is not None:
+            self.view.upsert(dict(wordbook))
+        self._touch(wordbook["id"])
+
+    def remove(self, wordbook_id: str) -> None:
+        if self.view is not None:
+            self.view.remove(wordbook_id)
+        self._touch(wordbook_id)
+
+    def adjust_num_words(self, wordbook_id: str, delta: int) -> None:
+        if self.view is not None:
+            self.view.adjust_num_words(wordbook_id, delta)
+        self._touch(wordbook_id)
+
+
+async def run_periodically(interval: int, job) -> None:
+    while True:
+        await asyncio.sleep(interval)
+        await job()
@@ -1,37 +1,67 @@
-from openai import OpenAI
+from openai import APITimeoutError
 from dotenv import load_dotenv
 from firebase_admin import firestore
 from fastapi import HTTPException, status
 from typing import Optional
+import asyncio
 import logging
 import os
 import json
 import re
-import httpx
 
-from ..schemas.words import WordResponse, DictionaryData, FDAData, WordGenerated
+from ..schemas.words import WordResponse, DictionaryData, FDAData, WordGenerated, PhoneticInfo
+from ..core.http import get_free_dictionary_client
+from ..core.llm import create_llm_client_from_env
+from ..core.singleflight import SingleFlight
+from .dictionary_store import load_local_dictionary_from_env
+from .prompts import PROMPT_VERSION, build_system_prompt
+from .word_cache import build_cache_key, create_free_dictionary_cache_from_env, create_word_cache_from_env, normalize_word
+from .word_suggest import get_suggestion_index
 
 load_dotenv()
 
 try:
-    client = OpenAI(
-        base_url="https://openrouter.ai/api/v1",
-        api_key=os.getenv("OPENROUTER_API_KEY"),
-    )
+    client = create_llm_client_from_env()
     logging.info("LLMクライアントが正常に初期化されました。")
 except Exception as e:
     logging.error(f"LLMクライアントの初期化に失敗しました: {e}")
     raise
 
+# LLMの応答を解析できなかった場合に使う品詞 (この結果はキャッシュしない)
+FALLBACK_PART_OF_SPEECH = "未分類"
+
+word_cache = create_word_cache_from_env()
+
+free_dictionary_cache = create_free_dictionary_cache_from_env()
+
+# 同じ単語の同時リクエストを1回の生成にまとめる
+word_flight = SingleFlight()
+
+# 同梱の辞書ファイル (なければNone)。ここにない単語だけFirestoreに問い合わせる
+local_dictionary = load_local_dictionary_from_env()
+# 辞書ファイルが最新であれば、ファイルにない単語をFirestoreに問い合わせる必要はない
+dictionary_firestore_fallback = os.getenv("DICTIONARY_FIRESTORE_FALLBACK", "true").lower() == "true"
+# 見出し語にも変化形にもない単語は、LLMを呼ばずに綴りの候補を返す
+unknown_word_suggestions = os.getenv("UNKNOWN_WORD_SUGGESTIONS", "true").lower() == "true"
+
 async def get_word_from_firestore(word: str) -> WordResponse:
     """
     Firestoreから単語情報を取得する。
+    同梱の辞書ファイルがあればまずそこから引き、見つからない場合のみFirestoreに問い合わせる。
     単語が存在しない場合は、Noneを返す。
     """
     try:
+        if local_dictionary is not None:
+            document = local_dictionary.get(word.lower())
+            if document is not None:
+                return DictionaryData.model_validate(document)
+            if not dictionary_firestore_fallback:
+                return DictionaryData(word=word, part_of_speech=[], definitions=[], synonyms=[], raw_examples=[])
+
         db = firestore.client()
         doc_ref = db.collection('dictionary').document(word.lower())
-        document = doc_ref.get()
+        # Firestoreの読み込みはブロッキングのため、他の取得処理と並行できるようスレッドで実行する
+        document = await asyncio.to_thread(doc_ref.get)
         if document.exists:
             # 取得した辞書データをPydanticモデルに変換して返す
             return DictionaryData.model_validate(document.to_dict())
@@ -46,79 +76,52 @@ async def get_word_from_firestore(word: str) -> WordResponse:
         logging.error(f"Firestoreからのデータ取得中にエラー: {e}")
         return None
 
-"""
-単一の英単語から、その詳細情報を取得するためのサービス
-@param dictionary_data: DictionaryData型の辞書データ
-@return dict: LLMから抽出された単語情報の辞書
-"""
-async def generate_enhanced_word_info(dictionary_data: DictionaryData, free_dictionary_data: Optional[FDAData] = None) -> WordGenerated:
-    """辞書データを元に、AI(LLM)を使って最終的な応答JSONを生成する"""
-    if not client:
-        raise Exception("LLM client is not initialized.")
+async def get_words_from_firestore(words: list[str]) -> dict[str, DictionaryData]:
+    """
+    複数の単語の辞書データをFirestoreから1回の一括読み込みで取得する。
+    同梱の辞書ファイルにある単語はそこから引き、残りだけをFirestoreに問い合わせる。
+    辞書にない単語は空のDictionaryDataとして返す。キーは小文字化した単語。
+    """
+    keys = list(dict.fromkeys(word.lower() for word in words))
+    results = {
+        key: DictionaryData(word=key, part_of_speech=[], definitions=[], synonyms=[], raw_examples=[])
+        for key in keys
+    }
+    if local_dictionary is not None:
+        local_documents = local_dictionary.get_many(keys)
+        for key, document in local_documents.items():
+            results[key] = DictionaryData.model_validate(document)
+        keys = [key for key in keys if key not in local_documents] if dictionary_firestore_fallback else []
+    if not keys:
+        return results
 
-    word = dictionary_data.word
-    logging.debug(dictionary_data)
+    db = firestore.client()
+    refs = [db.collection('dictionary').document(key) for key in keys]
+    documents = await asyncio.to_thread(lambda: list(db.get_all(refs)))
+    for document in documents:
+        if document.exists:
+            results[document.id] = DictionaryData.model_validate(document.to_dict())
+    return results
 
-    phonetics = None
+def select_phonetics(free_dictionary_data: Optional[FDAData], dictionary_data: Optional[DictionaryData] = None) -> Optional[PhoneticInfo]:
+    """
+    発音情報を選ぶ。辞書構築時に保存された発音があればそれを優先し、
+    なければFree Dictionary APIのデータから音声URLを持つ最初の発音情報を選ぶ。
+    """
+    if dictionary_data and dictionary_data.phonetics:
+        return dictionary_data.phonetics
     if free_dictionary_data and free_dictionary_data.phonetics:
         # 最初の有効な音声URLを探す
         for phonetic in free_dictionary_data.phonetics:
             if phonetic.audio:
-                phonetics = phonetic
-                break
-
-    # 新しい要件に基づいたシステムプロンプト
-    system_prompt = f"""
-    あなたは、与えられた信頼できる辞書データに基づいて、単語情報を指定されたJSON形式で提供する専門家です。
-    絶対に辞書データにない情報は生成せず、事実に基づいて以下のタスクを実行してください。
-
-    # 辞書データ (事実情報):
-    {dictionary_data.model_dump_json(indent=2)}
-
-    # 重要な制約:
-    1. 出力は必ず有効なJSONオブジェクトのみとしてください
-    2. 説明やコメント、マークダウン形式は一切含めないでください
-    3. JSON以外のテキストは絶対に含めないでください
-    4. JSONの構文エラーがないように注意してください
-
-    # あなたのタスク:
-    以下の制約と出力JSONフォーマットを「絶対厳守」して、上記の辞書データから情報を抽出し、整形してください。
-
-    - `definitions`: `part_of_speech` と `translations` を関連付け、品詞ごとに「日本語訳」をまとめたオブジェクトのリストを作成してください。各オブジェクトには `part_of_speech(品詞は日本語で生成してください。例：「名詞」「動詞」)`  と、それに対応する `japanese` (日本語訳のリスト) を含めてください。日本語訳は、"{word}"について最も一般的なものを3つ以内で選んでください。日本語訳は、品詞に則した訳である必要があります。出現するpart_of_speechは、一意である必要があります。
-    - `synonyms`: `synonyms`の中から、最も意味が一般的なものを最大5つ選んでください。ない場合は空の配列 `[]` を使用してください。なお、`synonyms`は英単語の同義語のリストであり、重複は除外してください。日本語は含めないでください。
-    - `example_sentences`: `raw_examples`を参考に、英語と日本語の両方を含む新しい例文を最大3つ生成してください。英語の例文は、{word}を確実に含む自然かつ簡潔な文である必要があります。日本語の例文は、英語の例文を自然な「日本語」に翻訳してください。例文は、与えられた単語の意味を明確に示す、純粋な日本語のものでなければなりません。例文は、`english`と`japanese`のペアで表現してください。
-
-    出力は以下のJSONフォーマットに厳密に従ってください（余計なテキストは一切含めず、有効なJSONのみ）:
-
-    {{
-        "english": "{word}",
-        "definitions": [
-            {{
-                "part_of_speech": "名詞",
-                "japanese": ["情報", "知識"]
-            }}
-        ],
-        "synonyms": ["data", "details"],
-        "example_sentences": [
-            {{
-                "english": "I need more information about the project.",
-                "japanese": "そのプロジェクトに関するもっと多くの情報が必要です。"
-            }}
-        ]
-    }}
-    """
-
-    completion = client.chat.completions.create(
-        model=os.getenv("MODEL_NAME"),
-        messages=[{"role": "system", "content": system_prompt}],
-        response_format={"type": "json_object"}
-    )
-
-    response_content = completion.choices[0].message.content
-    
-    # レスポンス内容をログ出力（デバッグ用）
-    logging.info(f"LLMからの生レスポンス: {response_content}")
+                return phonetic
+    return None
 
+def parse_word_generated(response_content: str, word: str, phonetics: Optional[PhoneticInfo] = None) -> WordGenerated:
+    """
+    LLMの応答テキストをWordGeneratedに変換する。
+    解析できない場合はフォールバックデータを返す。
+    """
     try:
         # まず、レスポンス全体を直接JSONとして解析を試行
         try:
@@ -159,7 +162,7 @@ async def generate_enhanced_word_info(dictionary_data: DictionaryData, free_dict
         # フォールバック: 基本的な単語情報を返す
         fallback_data = {
             "english": word,
-            "definitions": [{"part_of_speech": "未分類", "japanese": ["データが取得できませんでした。"]}],
+            "definitions": [{"part_of_speech": FALLBACK_PART_OF_SPEECH, "japanese": ["データが取得できませんでした。"]}],
             "synonyms": [],
             "example_sentences": []
         }
@@ -177,6 +180,42 @@ async def generate_enhanced_word_info(dictionary_data: DictionaryData, free_dict
             detail="AI生成中に予期しないエラーが発生しました"
         )
 
+"""
+単一の英単語から、その詳細情報を取得するためのサービス
+@param dictionary_data: DictionaryData型の辞書データ
+@return dict: LLMから抽出された単語情報の辞書
+"""
+async def generate_enhanced_word_info(dictionary_data: DictionaryData, free_dictionary_data: Optional[FDAData] = None) -> WordGenerated:
+    """辞書データを元に、AI(LLM)を使って最終的な応答JSONを生成する"""
+    if not client:
+        raise Exception("LLM client is not initialized.")
+
+    word = dictionary_data.word
+    logging.debug(dictionary_data)
+
+    phonetics = select_phonetics(free_dictionary_data, dictionary_data)
+    system_prompt = build_system_prompt(dictionary_data)
+
+    try:
+        completion = await client.create_chat_completion(
+            model=os.getenv("MODEL_NAME"),
+            messages=[{"role": "system", "content": system_prompt}],
+            response_format={"type": "json_object"}
+        )
+    except APITimeoutError:
+        logging.error(f"LLMの応答がタイムアウトしました: {word}")
+        raise HTTPException(
+            status_code=status.HTTP_504_GATEWAY_TIMEOUT,
+            detail="AI生成がタイムアウトしました"
+        )
+
+    response_content = completion.choices[0].message.content
+    
+    # レスポンス内容をログ出力（デバッグ用）
+    logging.info(f"LLMからの生レスポンス: {response_content}")
+
+    return parse_word_generated(response_content, word, phonetics)
+
 async def get_dictionary_data_for_word(word: str) -> DictionaryData:
     """
     指定された単語の辞書データをFirestoreから取得する依存性。
@@ -194,28 +233,193 @@ async def get_word_info_from_free_dictionary(word: str) -> Optional[FDAData]:
     """
     Free Dictionary APIから単語情報を取得し、FDADataモデルにパースして返す。
     単語が見つからない場合はNoneを返す。
+    解析済みの結果と「見つからなかった」という結果は、それぞれのTTLでキャッシュする。
     """
+    found, cached = free_dictionary_cache.get(word)
+    if found:
+        return cached
+
     api_url = os.getenv("FREE_DICTIONARY_API_URL", "https://api.dictionaryapi.dev/api/v2/entries/en")
     full_url = f"{api_url}/{word}"
 
-    async with httpx.AsyncClient() as client:
-        response = await client.get(full_url)
-
-        if response.status_code == 200:
-            data = response.json()
-            if isinstance(data, list) and data:
-                try:
-                    # 最初の要素をFDADataモデルにパース
-                    return FDAData.model_validate(data[0])
-                except Exception as e:
-                    logging.error(f"Free Dictionary APIのレスポンスパース中にエラー: {e}, Data: {data[0]}")
-                    return None
-            elif response.status_code == 404:
-                logging.warning(f"Free Dictionary APIが単語を見つけられませんでした: {word}")
-                return None
-            else:
-                logging.warning(f"Free Dictionary APIが空のリストまたは予期しない形式を返しました: {data}")
+    response = await get_free_dictionary_client().get(full_url)
+
+    if response.status_code == 200:
+        data = response.json()
+        if isinstance(data, list) and data:
+            try:
+                # 最初の要素をFDADataモデルにパース
+                free_dictionary_data = FDAData.model_validate(data[0])
+            except Exception as e:
+                logging.error(f"Free Dictionary APIのレスポンスパース中にエラー: {e}, Data: {data[0]}")
                 return None
+            free_dictionary_cache.set(word, free_dictionary_data)
+            return free_dictionary_data
         else:
-            logging.error(f"Free Dictionary APIからのデータ取得中にエラー: ステータスコード {response.status_code}, レスポンス: {response.text}")
-            return None
\ No newline at end of file
+            logging.warning(f"Free Dictionary APIが空のリストまたは予期しない形式を返しました: {data}")
+            return None
+    elif response.status_code == 404:
+        logging.warning(f"Free Dictionary APIが単語を見つけられませんでした: {word}")
+        free_dictionary_cache.set_not_found(word)
+        return None
+    else:
+        logging.error(f"Free Dictionary APIからのデータ取得中にエラー: ステータスコード {response.status_code}, レスポンス: {response.text}")
+        return None
+
+def _is_headword(word: str) -> Optional[bool]:
+    """見出し語かどうかをメモリ上のインデックスか同梱の辞書ファイルで判定する。判定できない場合はNone"""
+    index = get_suggestion_index()
+    if index is not None:
+        return index.contains(word)
+    if local_dictionary is not None:
+        return local_dictionary.contains(word)
+    return None
+
+async def get_lemmas_for_form(word: str) -> list[str]:
+    """
+    変化形に対応する見出し語のリストを返す (running → ["run"] など)。
+    同梱の辞書ファイルに対応表があればそこから、なければFirestoreの dictionary_inflections から引く。
+    """
+    if local_dictionary is not None and (local_dictionary.has_inflections or not dictionary_firestore_fallback):
+        return local_dictionary.get_lemmas(word)
+    try:
+        db = firestore.client()
+        document = await asyncio.to_thread(db.collection('dictionary_inflections').document(word).get)
+        return document.to_dict().get("lemmas", []) if document.exists else []
+    except Exception as e:
+        logging.error(f"変化形の対応表の取得中にエラー: {e}")
+        return []
+
+async def resolve_word(word: str) -> tuple[str, Optional[list[str]]]:
+    """
+    入力された単語を辞書の見出し語に解決する。戻り値は (見出し語, 綴りの候補)。
+    見出し語ならそのまま、変化形なら対応する見出し語を返す。どちらでもない場合は
+    (変化形の対応表にある見出し語が見出し語の一覧にない場合も含めて) 綴りの候補のリストを返す
+    (見出し語の一覧を持っていない場合は判定せず、入力をそのまま返す)。
+    """
+    key = normalize_word(word)
+    is_headword = _is_headword(key)
+    if is_headword is None or is_headword:
+        return key, None
+
+    # 見出し語の一覧にない見出し語を返すと辞書データのない単語を生成しようとするため、一覧にあるものだけを使う
+    known_lemmas = [lemma for lemma in await get_lemmas_for_form(key) if _is_headword(lemma)]
+    if known_lemmas:
+        return known_lemmas[0], None
+
+    if not unknown_word_suggestions:
+        return key, None
+    index = get_suggestion_index()
+    return key, [candidate for candidate, _ in index.corrections(key, 5)] if index else []
+
+def unknown_word_message(word: str, suggestions: list[str]) -> str:
+    message = f"'{word}' は辞書に見つかりません"
+    return f"{message} (候補: {', '.join(suggestions)})" if suggestions else message
+
+def get_word_cache_key(word: str) -> str:
+    """単語・モデル名・プロンプトバージョンから拡張単語情報のキャッシュキーを作成する"""
+    return build_cache_key(word, os.getenv("MODEL_NAME", ""), PROMPT_VERSION)
+
+def is_fallback_word_info(word_info: WordGenerated) -> bool:
+    """LLM応答の解析に失敗した際のフォールバックデータかどうかを判定する"""
+    return any(d.part_of_speech == FALLBACK_PART_OF_SPEECH for d in word_info.definitions)
+
+async def fetch_word_sources(word: str) -> tuple[DictionaryData, Optional[FDAData], list[str]]:
+    """
+    辞書データとFree Dictionary APIのデータを並行して取得する。
+    各ソースには個別のタイムアウトがあり、期限内に取得できなかったソースは
+    結果なしとして扱い、そのソース名を欠損リストに含めて返す。
+    辞書データに発音情報が保存されている場合、Free Dictionary APIは呼ばない。
+    """
+    dictionary_timeout = float(os.getenv("DICTIONARY_FETCH_TIMEOUT_SECONDS", "2.0"))
+    free_dictionary_timeout = float(os.getenv("FREE_DICTIONARY_TIMEOUT_SECONDS", "1.5"))
+    free_dictionary_headstart = float(os.getenv("FREE_DICTIONARY_HEADSTART_SECONDS", "0.1"))
+
+    dictionary_task = asyncio.ensure_future(
+        asyncio.wait_for(get_dictionary_data_for_word(word), timeout=dictionary_timeout)
+    )
+    # 辞書データを少しだけ先に待ち、発音が保存されていればFree Dictionary APIの呼び出しを省く。
+    # 間に合わなければFree Dictionary APIの取得を並行して始める
+    await asyncio.wait({dictionary_task}, timeout=free_dictionary_headstart)
+
+    free_dictionary_task = None
+    if not _has_stored_phonetics(dictionary_task):
+        free_dictionary_task = asyncio.ensure_future(
+            asyncio.wait_for(get_word_info_from_free_dictionary(word), timeout=free_dictionary_timeout)
+        )
+
+    dictionary_result, = await asyncio.gather(dictionary_task, return_exceptions=True)
+    free_dictionary_result = None
+    if free_dictionary_task is not None:
+        if _has_stored_phonetics(dictionary_task):
+            free_dictionary_task.cancel()
+        free_dictionary_result, = await asyncio.gather(free_dictionary_task, return_exceptions=True)
+        if isinstance(free_dictionary_result, asyncio.CancelledError):
+            free_dictionary_result = None
+
+    missing_sources = []
+    if isinstance(dictionary_result, HTTPException):
+        raise dictionary_result
+    if isinstance(dictionary_result, BaseException):
+        logging.warning(f"辞書データの取得に失敗したため、辞書データなしで生成します: {word} ({dictionary_result!r})")
+        dictionary_result = DictionaryData(
+            word=word,
+            part_of_speech=[],
+            definitions=[],
+            synonyms=[],
+            raw_examples=[]
+        )
+        missing_sources.append("dictionary")
+    if isinstance(free_dictionary_result, BaseException):
+        logging.warning(f"Free Dictionary APIの取得に失敗したため、発音情報なしで生成します: {word} ({free_dictionary_result!r})")
+        free_dictionary_result = None
+        missing_sources.append("free_dictionary")
+
+    return dictionary_result, free_dictionary_result, missing_sources
+
+def _has_stored_phonetics(dictionary_task: asyncio.Future) -> bool:
+    """取得済みの辞書データに発音情報が保存されているかどうか"""
+    if not dictionary_task.done() or dictionary_task.cancelled() or dictionary_task.exception() is not None:
+        return False
+    return bool(dictionary_task.result().phonetics)
+
+async def _load_enhanced_word(word: str, cache_key: str) -> WordGenerated:
+    """キャッシュミス時に辞書データを取得してLLMで生成し、キャッシュに保存する"""
+    dictionary_data, free_dictionary_data, missing_sources = await fetch_word_sources(word)
+    enhanced_info = await generate_enhanced_word_info(dictionary_data, free_dictionary_data)
+
+    if missing_sources:
+        # 一部のデータソースが欠けた結果はキャッシュせず、次回の取得で補完する
+        enhanced_info.missing_sources = missing_sources
+    elif not is_fallback_word_info(enhanced_info):
+        await word_cache.set(cache_key, enhanced_info)
+    return enhanced_info
+
+async def get_enhanced_word(word: str) -> WordGenerated:
+    """
+    AI拡張済みの単語情報をキャッシュ経由で取得する (read-through)。
+    変化形は見出し語に解決してから取得し (running → run)、辞書にない単語はLLMを呼ばずに
+    綴りの候補とともに404を返す。
+    キャッシュにない場合のみ辞書データの取得とLLM生成を行い、結果をキャッシュに保存する。
+    同じ単語の取得が同時に実行中であれば、その結果を共有する (エラーも共有されるがキャッシュはされない)。
+    """
+    lemma, suggestions = await resolve_word(word)
+    if suggestions is not None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail={"message": unknown_word_message(normalize_word(word), suggestions), "suggestions": suggestions}
+        )
+
+    cache_key = get_word_cache_key(lemma)
+    enhanced_info = await word_cache.get(cache_key)
+    if enhanced_info is None:
+        enhanced_info = await word_flight.do(cache_key, lambda: _load_enhanced_word(lemma, cache_key))
+        # 待機者間で同じインスタンスを共有しないようコピーを返す
+        enhanced_info = enhanced_info.model_copy(deep=True)
+    return with_inflected_form(enhanced_info, word, lemma)
+
+def with_inflected_form(word_info: WordGenerated, word: str, lemma: str) -> WordGenerated:
+    """変化形から見出し語に解決した場合、入力された形を結果に記録する"""
+    if normalize_word(word) != lemma:
+        word_info.inflected_form = normalize_word(word)
+    return word_info
@@ -0,0 +1,177 @@
+"""
+高頻度語のAI拡張単語情報を事前に生成し、キャッシュに書き込むワーカー。
+
+頻度順の単語リスト (1行1語。タブ区切りの2列目以降は無視) を上から順に処理し、
+リクエスト時と同じ「辞書データ取得 → LLM生成」の処理結果を永続キャッシュに保存する。
+同時実行数と1秒あたりのリクエスト数を制限し、完了した単語をチェックポイントファイルに
+追記していくため、途中で停止しても `--resume` で続きから再開できる。
+
+実行方法 (backend ディレクトリで):
+    python -m app.workers.prewarm data/word_frequency.txt --top 5000 --concurrency 8 --rate 4 --resume
+"""
+import argparse
+import asyncio
+import logging
+import os
+import time
+
+from fastapi import HTTPException, status
+
+from ..core.firebase import initialize_firebase
+from ..core.http import close_http_clients
+from ..services import words as word_service
+from ..services.word_cache import normalize_word
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+
+class RateLimiter:
+    """1秒あたりの開始数を制限するトークンバケット"""
+
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = rate
+        self.capacity = max(1, burst)
+        self._tokens = float(self.capacity)
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        if self.rate <= 0:
+            return
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+def load_word_list(file_path: str, top: int) -> list[str]:
+    """頻度順の単語リストを読み込み、正規化・重複除去したうえで上位 top 語を返す"""
+    words = []
+    seen = set()
+    with open(file_path, 'r', encoding='utf-8-sig') as f:
+        for line in f:
+            if not line.strip() or line.startswith('#'):
+                continue
+            word = normalize_word(line.split('\t')[0])
+            if word and word not in seen:
+                seen.add(word)
+                words.append(word)
+            if top and len(words) >= top:
+                break
+    return words
+
+
+def load_checkpoint(file_path: str) -> set[str]:
+    """チェックポイントファイルから完了済みの単語を読み込む"""
+    if not os.path.exists(file_path):
+        return set()
+    with open(file_path, 'r', encoding='utf-8') as f:
+        return {line.strip() for line in f if line.strip()}
+
+
+async def prewarm(words: list[str], checkpoint_path: str, concurrency: int, rate: float) -> dict:
+    """
+    単語リストのAI拡張情報を生成してキャッシュに保存する。
+    リクエスト時と同じく変化形は見出し語に解決し、見出し語のキャッシュを確認する。
+    成功した単語と辞書にない単語 (スキップ) はチェックポイントファイルに1行ずつ追記する
+    (部分的な結果やフォールバックはキャッシュされないため、失敗として次回に再試行する)。
+    """
+    limiter = RateLimiter(rate, burst=concurrency)
+    queue: asyncio.Queue[str] = asyncio.Queue()
+    for word in words:
+        queue.put_nowait(word)
+
+    counts = {"warmed": 0, "already_cached": 0, "skipped": 0, "failed": 0}
+    started = time.perf_counter()
+
+    async def warm(word: str) -> str:
+        """1語を処理し、結果の種類 (counts のキー) を返す。キャッシュされなかった場合は例外を送出する"""
+        lemma, suggestions = await word_service.resolve_word(word)
+        if suggestions is not None:
+            # 辞書にない単語は何度実行しても生成できないため、完了として記録する
+            logging.info(f"辞書にない単語のためスキップします: {word}")
+            return "skipped"
+        if await word_service.word_cache.get(word_service.get_word_cache_key(lemma)) is not None:
+            return "already_cached"
+
+        await limiter.acquire()
+        try:
+            word_info = await word_service.get_enhanced_word(lemma)
+        except HTTPException as e:
+            if e.status_code != status.HTTP_404_NOT_FOUND:
+                raise
+            logging.info(f"辞書データがない単語のためスキップします: {word}")
+            return "skipped"
+        if word_info.missing_sources or word_service.is_fallback_word_info(word_info):
+            raise RuntimeError(f"部分的な結果のためキャッシュされませんでした: {word_info.missing_sources}")
+        return "warmed"
+
+    with open(checkpoint_path, 'a', encoding='utf-8') as checkpoint:
+        async def worker():
+            while True:
+                try:
+                    word = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                try:
+                    result = await warm(word)
+                    counts[result] += 1
+                    checkpoint.write(word + "\n")
+                    checkpoint.flush()
+                except Exception as e:
+                    counts["failed"] += 1
+                    logging.error(f"事前生成に失敗しました: {word} ({e})")
+
+                done = sum(counts.values())
+                if done % 100 == 0:
+                    elapsed = time.perf_counter() - started
+                    logging.info(f"進捗: {done}/{len(words)} | {done / elapsed:.1f} 語/秒 | {counts}")
+
+        await asyncio.gather(*(worker() for _ in range(max(1, concurrency))))
+
+    return counts
+
+
+async def run(words: list[str], checkpoint_path: str, concurrency: int, rate: float) -> dict:
+    """事前生成を実行し、終了時に共有クライアントを閉じる"""
+    try:
+        return await prewarm(words, checkpoint_path, concurrency, rate)
+    finally:
+        await word_service.client.aclose()
+        await close_http_clients()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="高頻度語のAI拡張単語情報を事前にキャッシュへ書き込む")
+    parser.add_argument("word_list", help="頻度順の単語リスト (1行1語)")
+    parser.add_argument("--top", type=int, default=0, help="上位N語のみ処理する (0はすべて)")
+    parser.add_argument("--concurrency", type=int, default=8, help="同時に処理する単語数")
+    parser.add_argument("--rate", type=float, default=4.0, help="1秒あたりに開始するLLM生成の上限 (0は無制限)")
+    parser.add_argument("--checkpoint", default="prewarm.checkpoint", help="完了した単語を記録するファイル")
+    parser.add_argument("--resume", action="store_true", help="チェックポイントに記録済みの単語を飛ばして再開する")
+    args = parser.parse_args()
+
+    if os.getenv("WORD_CACHE_BACKEND", "firestore").lower() == "memory":
+        logging.warning("WORD_CACHE_BACKEND=memory では生成結果がプロセス終了時に失われます。")
+
+    initialize_firebase()
+
+    words = load_word_list(args.word_list, args.top)
+    if args.resume:
+        completed = load_checkpoint(args.checkpoint)
+        words = [word for word in words if word not in completed]
+        logging.info(f"チェックポイントから再開します: 完了済み {len(completed)} 語、残り {len(words)} 語")
+    elif os.path.exists(args.checkpoint):
+        os.remove(args.checkpoint)
+
+    counts = asyncio.run(run(words, args.checkpoint, args.concurrency, args.rate))
+    logging.info(f"事前生成が完了しました: {counts} | LLM: {word_service.client.stats()}")
+
+
+if __name__ == "__main__":
+    main()
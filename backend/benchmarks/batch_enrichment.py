@@ -0,0 +1,135 @@
+"""
+一括生成 (POST /api/words/batch/) と単語ごとの生成のスループット比較ベンチマーク。
+
+スタブのLLM (固定の遅延 + 出力単語数に比例する遅延で応答する) を使い、
+同じ単語リストを「1語ずつ順に取得」と「一括取得」で処理したときの
+1秒あたりの単語数と、1語あたりのプロンプト文字数を比較する。
+
+実行方法 (backend ディレクトリで):
+    python -m benchmarks.batch_enrichment --words 30 --base-delay 0.5 --per-word-delay 0.1
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+
+import httpx
+
+os.environ.setdefault("OPENROUTER_API_KEY", "benchmark")
+os.environ.setdefault("MODEL_NAME", "benchmark-model")
+os.environ["WORD_CACHE_BACKEND"] = "memory"
+
+from app.core.llm import create_llm_client_from_env
+from app.main import app
+from app.schemas.words import DictionaryData
+from app.services import words as word_service
+
+BATCH_WORDS_MARKER = "# 対象の単語 (この順番で出力してください):"
+
+
+class StubLLM:
+    def __init__(self, base_delay: float, per_word_delay: float):
+        self.base_delay = base_delay
+        self.per_word_delay = per_word_delay
+        self.calls = 0
+        self.prompt_chars = 0
+
+    async def handler(self, request: httpx.Request) -> httpx.Response:
+        prompt = json.loads(request.content)["messages"][0]["content"]
+        self.calls += 1
+        self.prompt_chars += len(prompt)
+        if BATCH_WORDS_MARKER in prompt:
+            words = json.loads(prompt.split(BATCH_WORDS_MARKER)[1].strip().splitlines()[0])
+            content = {"words": [self._word(word) for word in words]}
+        else:
+            words = [json.loads(prompt.split('"english": ')[-1].split(",")[0])]
+            content = self._word(words[0])
+        await asyncio.sleep(self.base_delay + self.per_word_delay * len(words))
+        return httpx.Response(200, json={
+            "id": "stub",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": "benchmark-model",
+            "choices": [{
+                "index": 0,
+                "finish_reason": "stop",
+                "message": {"role": "assistant", "content": json.dumps(content, ensure_ascii=False)},
+            }],
+        })
+
+    @staticmethod
+    def _word(word: str) -> dict:
+        return {
+            "english": word,
+            "definitions": [{"part_of_speech": "名詞", "japanese": ["スタブ"]}],
+            "synonyms": [],
+            "example_sentences": [],
+        }
+
+
+def stub_dictionary_entry(word: str) -> DictionaryData:
+    return DictionaryData(
+        word=word,
+        part_of_speech=["noun", "verb"],
+        definitions=[{"pos": "noun", "def": f"a benchmark definition of {word} number {i}"} for i in range(8)],
+        translations={"noun": ["ベンチ", "計測"]},
+        raw_examples=[f"This sentence uses {word} as an example number {i}." for i in range(6)],
+        synonyms=[f"{word}{i}" for i in range(6)],
+    )
+
+
+async def stub_dictionary_data(word: str) -> DictionaryData:
+    return stub_dictionary_entry(word)
+
+
+async def stub_words_from_firestore(words: list[str]) -> dict[str, DictionaryData]:
+    return {word.lower(): stub_dictionary_entry(word.lower()) for word in words}
+
+
+async def stub_free_dictionary(word: str):
+    return None
+
+
+async def measure(label: str, stub: StubLLM, num_words: int, request) -> None:
+    word_service.client = create_llm_client_from_env(transport=httpx.MockTransport(stub.handler))
+    word_service.word_cache.memory._entries.clear()
+    started = time.perf_counter()
+    await request()
+    elapsed = time.perf_counter() - started
+    print(f"{label:>8}: {num_words / elapsed:7.2f} words/s, "
+          f"{stub.calls:3d} LLM calls, {stub.prompt_chars / num_words:8.0f} prompt chars/word")
+    await word_service.client.aclose()
+
+
+async def run(num_words: int, base_delay: float, per_word_delay: float) -> None:
+    word_service.get_dictionary_data_for_word = stub_dictionary_data
+    word_service.get_words_from_firestore = stub_words_from_firestore
+    word_service.get_word_info_from_free_dictionary = stub_free_dictionary
+    words = [f"benchword{i}" for i in range(num_words)]
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as http:
+        async def one_by_one():
+            for word in words:
+                await http.get(f"/api/words/{word}/")
+
+        async def batch():
+            response = await http.post("/api/words/batch/", json={"words": words})
+            assert len(response.json()["results"]) == num_words
+
+        await measure("single", StubLLM(base_delay, per_word_delay), num_words, one_by_one)
+        await measure("batch", StubLLM(base_delay, per_word_delay), num_words, batch)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="一括生成と単語ごとの生成の比較ベンチマーク")
+    parser.add_argument("--words", type=int, default=30)
+    parser.add_argument("--base-delay", type=float, default=0.5)
+    parser.add_argument("--per-word-delay", type=float, default=0.1)
+    args = parser.parse_args()
+    asyncio.run(run(args.words, args.base_delay, args.per_word_delay))
+
+
+if __name__ == "__main__":
+    main()
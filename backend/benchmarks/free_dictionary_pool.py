@@ -0,0 +1,97 @@
+"""
+Free Dictionary API取得の接続プール・キャッシュのベンチマーク。
+
+ローカルにスタブのFree Dictionary APIサーバを起動し、同じ単語リストを
+以下の3通りで取得したときの1件あたりの所要時間を比較する。
+
+- per-request: 以前の実装と同じく、リクエストごとに新しいhttpx.AsyncClientを作る
+- pooled: 共有クライアント (Keep-Alive) を使い、キャッシュは使わない
+- pooled+cache: 共有クライアントとレスポンスキャッシュ (見つからなかった単語も記憶) を使う
+
+実行方法 (backend ディレクトリで):
+    python -m benchmarks.free_dictionary_pool --words 200 --rounds 3
+"""
+import argparse
+import asyncio
+import os
+import socket
+import threading
+import time
+
+import httpx
+import uvicorn
+from fastapi import FastAPI, HTTPException
+
+os.environ.setdefault("OPENROUTER_API_KEY", "benchmark")
+
+from app.core import http as http_clients
+from app.services import words as word_service
+from app.services.word_cache import create_free_dictionary_cache_from_env
+
+stub_app = FastAPI()
+
+
+@stub_app.get("/api/v2/entries/en/{word}")
+async def stub_entry(word: str):
+    # 末尾が "x" の単語は見つからない単語として扱う
+    if word.endswith("x"):
+        raise HTTPException(status_code=404, detail="No Definitions Found")
+    return [{
+        "word": word,
+        "phonetics": [{"text": f"/{word}/", "audio": f"https://example.com/{word}.mp3"}],
+        "meanings": [{"partOfSpeech": "noun", "definitions": [{"definition": f"stub definition of {word}"}]}],
+    }]
+
+
+def start_stub_server() -> str:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    server = uvicorn.Server(uvicorn.Config(stub_app, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return f"http://127.0.0.1:{port}/api/v2/entries/en"
+
+
+async def per_request_fetch(api_url: str, word: str) -> None:
+    async with httpx.AsyncClient() as client:
+        await client.get(f"{api_url}/{word}")
+
+
+async def run(num_words: int, rounds: int) -> None:
+    api_url = start_stub_server()
+    os.environ["FREE_DICTIONARY_API_URL"] = api_url
+    words = [f"word{i}" + ("x" if i % 5 == 0 else "") for i in range(num_words)]
+
+    async def measure(label: str, fetch) -> None:
+        started = time.perf_counter()
+        for _ in range(rounds):
+            for word in words:
+                await fetch(word)
+        elapsed = time.perf_counter() - started
+        print(f"{label:>13}: {elapsed / (num_words * rounds) * 1000:7.3f} ms/lookup")
+
+    await measure("per-request", lambda word: per_request_fetch(api_url, word))
+
+    # キャッシュを無効化した状態で共有クライアントのみを計測する
+    word_service.free_dictionary_cache.memory.max_size = 0
+    await measure("pooled", word_service.get_word_info_from_free_dictionary)
+
+    word_service.free_dictionary_cache = create_free_dictionary_cache_from_env()
+    await measure("pooled+cache", word_service.get_word_info_from_free_dictionary)
+    print(f"cache stats: {word_service.free_dictionary_cache.stats()}")
+
+    await http_clients.close_http_clients()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Free Dictionary API取得の接続プール・キャッシュのベンチマーク")
+    parser.add_argument("--words", type=int, default=200)
+    parser.add_argument("--rounds", type=int, default=3)
+    args = parser.parse_args()
+    asyncio.run(run(args.words, args.rounds))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""
+LLM呼び出しの並行性ベンチマーク。
+
+スタブのLLM (固定の遅延でJSONを返すモックトランスポート) を使い、
+50件の単語拡張リクエストを同時に送りながら `/health` の応答時間を計測する。
+LLM呼び出しがイベントループをブロックしていなければ、全体の所要時間は
+「遅延 × (件数 / 同時実行数)」程度に収まり、`/health` も即座に応答する。
+
+実行方法 (backend ディレクトリで):
+    python -m benchmarks.llm_concurrency --requests 50 --delay 1.0
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import time
+
+import httpx
+
+os.environ.setdefault("OPENROUTER_API_KEY", "benchmark")
+os.environ.setdefault("MODEL_NAME", "benchmark-model")
+os.environ.setdefault("WORD_CACHE_BACKEND", "memory")
+
+from app.core.llm import create_llm_client_from_env
+from app.main import app
+from app.schemas.words import DictionaryData
+from app.services import words as word_service
+
+
+def make_stub_transport(delay: float) -> httpx.MockTransport:
+    async def handler(request: httpx.Request) -> httpx.Response:
+        await asyncio.sleep(delay)
+        content = json.dumps({
+            "english": "stub",
+            "definitions": [{"part_of_speech": "名詞", "japanese": ["スタブ"]}],
+            "synonyms": [],
+            "example_sentences": [],
+        }, ensure_ascii=False)
+        return httpx.Response(200, json={
+            "id": "stub",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": "benchmark-model",
+            "choices": [{
+                "index": 0,
+                "finish_reason": "stop",
+                "message": {"role": "assistant", "content": content},
+            }],
+        })
+    return httpx.MockTransport(handler)
+
+
+async def stub_dictionary_data(word: str) -> DictionaryData:
+    return DictionaryData(word=word, part_of_speech=[], definitions=[], synonyms=[], raw_examples=[])
+
+
+async def stub_free_dictionary(word: str):
+    return None
+
+
+async def run(num_requests: int, delay: float) -> None:
+    word_service.client = create_llm_client_from_env(transport=make_stub_transport(delay))
+    word_service.get_dictionary_data_for_word = stub_dictionary_data
+    word_service.get_word_info_from_free_dictionary = stub_free_dictionary
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as http:
+        health_latencies = []
+        done = asyncio.Event()
+
+        async def probe_health():
+            while not done.is_set():
+                started = time.perf_counter()
+                await http.get("/health")
+                health_latencies.append(time.perf_counter() - started)
+                await asyncio.sleep(0.05)
+
+        probe = asyncio.create_task(probe_health())
+        started = time.perf_counter()
+        responses = await asyncio.gather(*(
+            http.get(f"/api/words/benchword{i}/") for i in range(num_requests)
+        ))
+        elapsed = time.perf_counter() - started
+        done.set()
+        await probe
+
+    ok = sum(1 for r in responses if r.status_code == 200)
+    print(f"requests: {num_requests} (ok={ok}), LLM delay: {delay:.2f}s")
+    print(f"wall time: {elapsed:.2f}s (serialized would be {num_requests * delay:.2f}s)")
+    print(f"/health probes: {len(health_latencies)}, "
+          f"p50={statistics.median(health_latencies) * 1000:.2f}ms, "
+          f"max={max(health_latencies) * 1000:.2f}ms")
+    print(f"llm stats: {word_service.client.stats()}")
+    await word_service.client.aclose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="LLM呼び出しの並行性ベンチマーク")
+    parser.add_argument("--requests", type=int, default=50)
+    parser.add_argument("--delay", type=float, default=1.0)
+    args = parser.parse_args()
+    asyncio.run(run(args.requests, args.delay))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""
+プロンプトのトークン数ベンチマーク。
+
+同じ辞書データについて、以前の埋め込み方 (インデント付きJSONをそのまま埋め込む) と
+トークン予算付きのプロンプト構築で、システムプロンプトのトークン数を比較する。
+
+辞書データは `--input` に Firestore の `dictionary` ドキュメントを1行1件で書き出した
+JSONLファイルを指定できる。指定しない場合は、WordNetで定義が多い単語を模した合成データを使う。
+
+実行方法 (backend ディレクトリで):
+    python -m benchmarks.prompt_tokens
+    python -m benchmarks.prompt_tokens --input dictionary_sample.jsonl
+"""
+import argparse
+import json
+import os
+import statistics
+
+os.environ.setdefault("OPENROUTER_API_KEY", "benchmark")
+
+from app.schemas.words import DictionaryData
+from app.services.prompts import SYSTEM_PROMPT_TEMPLATE, build_system_prompt, estimate_tokens
+
+# 定義数の多い一般的な単語 (WordNetの synset 数のおおよその規模)
+BENCHMARK_WORDS = {
+    "run": 57, "set": 45, "take": 44, "get": 36, "make": 49, "break": 75,
+    "light": 45, "play": 52, "line": 39, "apple": 2, "information": 5, "study": 15,
+}
+
+
+def synthetic_dictionary_data(word: str, num_definitions: int) -> DictionaryData:
+    pos_names = ["noun", "verb", "adjective", "adverb"]
+    return DictionaryData(
+        word=word,
+        part_of_speech=pos_names[:min(4, 1 + num_definitions // 10)],
+        definitions=[
+            {"pos": pos_names[i % 4], "def": f"sense {i} of {word}: a fairly typical WordNet gloss describing one meaning"}
+            for i in range(num_definitions)
+        ],
+        translations={"noun": [f"訳語{i}" for i in range(12)], "verb": [f"動詞訳{i}" for i in range(8)]},
+        raw_examples=[f"An example sentence number {i} that uses {word} in context." for i in range(num_definitions)]
+        + [f"An unrelated WordNet example {i}." for i in range(num_definitions // 2)],
+        synonyms=[f"{word}_synonym_{i}" for i in range(num_definitions)],
+    )
+
+
+def legacy_system_prompt(dictionary_data: DictionaryData) -> str:
+    return SYSTEM_PROMPT_TEMPLATE.format(
+        word=dictionary_data.word,
+        dictionary_json=dictionary_data.model_dump_json(indent=2, exclude={"phonetics"}),
+    )
+
+
+def load_input(path: str) -> list[DictionaryData]:
+    with open(path, encoding="utf-8") as f:
+        return [DictionaryData.model_validate(json.loads(line)) for line in f if line.strip()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="プロンプトのトークン数ベンチマーク")
+    parser.add_argument("--input", help="dictionaryドキュメントのJSONLファイル")
+    args = parser.parse_args()
+
+    if args.input:
+        items = load_input(args.input)
+    else:
+        items = [synthetic_dictionary_data(word, n) for word, n in BENCHMARK_WORDS.items()]
+
+    before_counts, after_counts = [], []
+    print(f"{'word':<16}{'before':>8}{'after':>8}{'saved':>8}")
+    for item in items:
+        before = estimate_tokens(legacy_system_prompt(item))
+        after = estimate_tokens(build_system_prompt(item))
+        before_counts.append(before)
+        after_counts.append(after)
+        print(f"{item.word:<16}{before:>8}{after:>8}{1 - after / before:>8.0%}")
+    print(f"{'mean':<16}{statistics.mean(before_counts):>8.0f}{statistics.mean(after_counts):>8.0f}"
+          f"{1 - sum(after_counts) / sum(before_counts):>8.0%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""
+公開単語帳の一覧 (GET /api/wordbooks/public/) のベンチマーク。
+
+合成の公開単語帳から一覧を作成し、以前と同じ「全件の WordBookResponse を作って自分の単語帳を除く」処理と、
+作成済みの一覧から1ページ分・全件を返す処理のレイテンシを比較する。Firestoreからの読み込み時間は
+含めない (以前の処理では実際にはこれに全件の読み込みが加わる)。スナップショットの保存・読み込み時間も計測する。
+
+実行方法 (backend ディレクトリで):
+    python -m benchmarks.public_feed --wordbooks 100000
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from app.schemas.wordbooks import WordBookResponse
+from app.services.public_feed import PublicWordbookFeed, write_snapshot
+
+
+def synthetic_public_wordbooks(count: int, seed: int) -> list[dict]:
+    rng = random.Random(seed)
+    started = datetime(2024, 1, 1)
+    wordbooks = []
+    for i in range(count):
+        created_at = started + timedelta(seconds=rng.randrange(60 * 60 * 24 * 600))
+        wordbooks.append({
+            "id": f"wordbook{i:07d}",
+            "name": f"公開単語帳 {i}",
+            "user_name": f"user{i % 1000}",
+            "owner_id": f"uid{i % 1000}",
+            "is_public": True,
+            "num_words": rng.randrange(300),
+            "description": "毎日10語ずつ覚える",
+            "created_at": created_at,
+            "updated_at": created_at,
+        })
+    return wordbooks
+
+
+def percentile(values: list[float], ratio: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * ratio))]
+
+
+def measure(fn, rounds: int) -> list[float]:
+    latencies = []
+    for _ in range(rounds):
+        started = time.perf_counter()
+        fn()
+        latencies.append((time.perf_counter() - started) * 1000)
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description="公開単語帳の一覧のベンチマーク")
+    parser.add_argument("--wordbooks", type=int, default=100000, help="公開単語帳の件数")
+    parser.add_argument("--rounds", type=int, default=200, help="1ページ分の取得を計測する回数")
+    parser.add_argument("--limit", type=int, default=20, help="1ページの件数")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    wordbooks = synthetic_public_wordbooks(args.wordbooks, args.seed)
+    feed = PublicWordbookFeed(wordbooks)
+    print(f"公開単語帳: {len(feed)}件 | 一覧の作成時間: {feed.build_seconds:.2f}秒")
+
+    uid = "uid0"
+
+    def rebuild_responses():
+        return [WordBookResponse(**wordbook) for wordbook in wordbooks if wordbook["owner_id"] != uid]
+
+    cursor_after = (wordbooks[len(wordbooks) // 2]["created_at"], wordbooks[len(wordbooks) // 2]["id"])
+    for name, fn, rounds in [
+        ("以前の処理 (全件)", rebuild_responses, 3),
+        ("一覧 (全件)", lambda: feed.page(None, exclude_owner_id=uid), 10),
+        ("一覧 (全件, 公開単語帳のないユーザー)", lambda: feed.page(None, exclude_owner_id="uid-without-public-books"), 10),
+        ("一覧 (1ページ目)", lambda: feed.page(args.limit, exclude_owner_id=uid), args.rounds),
+        ("一覧 (カーソルの続き)", lambda: feed.page(args.limit, cursor_after, exclude_owner_id=uid), args.rounds),
+    ]:
+        latencies = measure(fn, rounds)
+        print(f"{name:<24} p50 {statistics.median(latencies):10.3f} ms | p99 {percentile(latencies, 0.99):10.3f} ms")
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "public_wordbook_feed.json")
+        started = time.perf_counter()
+        write_snapshot(path, feed.snapshot())
+        saved = time.perf_counter() - started
+        started = time.perf_counter()
+        PublicWordbookFeed.load(path)
+        loaded = time.perf_counter() - started
+        print(f"スナップショット: {os.path.getsize(path) / 1024 / 1024:.1f} MB | 保存 {saved:.2f}秒 | 読み込み {loaded:.2f}秒")
+
+
+if __name__ == "__main__":
+    main()
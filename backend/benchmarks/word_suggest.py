@@ -0,0 +1,116 @@
+"""
+入力補完・綴り訂正インデックスのベンチマーク。
+
+見出し語の一覧からインデックスを作成し、作成時間・メモリ使用量と、
+1打鍵ごとの前方一致検索・綴り訂正検索のレイテンシを計測する。
+
+見出し語は `--words-file` に1行1語のテキストファイル、または dictionary_builder が
+書き出した辞書ファイル (.sqlite3) を指定できる。指定しない場合は、WordNetの見出し語数
+(約147,000語) と同じ規模の合成データを使う。
+
+実行方法 (backend ディレクトリで):
+    python -m benchmarks.word_suggest
+    python -m benchmarks.word_suggest --words-file data/dictionary.sqlite3
+"""
+import argparse
+import random
+import statistics
+import string
+import time
+import tracemalloc
+
+from app.services.dictionary_store import LocalDictionary
+from app.services.word_suggest import SuggestionIndex
+
+
+def synthetic_words(count: int, seed: int) -> list[str]:
+    """英単語に近い長さ分布 (3〜14文字) のランダムな単語を作る"""
+    rng = random.Random(seed)
+    letters = "etaoinshrdlcumwfgypbvkjxqz"
+    weights = [26 - i for i in range(26)]
+    words = set()
+    while len(words) < count:
+        length = min(14, max(3, int(rng.gauss(8, 2.5))))
+        words.add("".join(rng.choices(letters, weights=weights, k=length)))
+    return list(words)
+
+
+def load_words(path: str) -> list[str]:
+    if path.endswith(".sqlite3"):
+        return list(LocalDictionary(path).iter_words())
+    with open(path, encoding="utf-8") as f:
+        return [line.split("\t")[0].strip() for line in f if line.strip()]
+
+
+def misspell(word: str, rng: random.Random) -> str:
+    """1〜2文字の挿入・削除・置換・入れ替えで綴りを崩す"""
+    for _ in range(rng.randint(1, 2)):
+        i = rng.randrange(len(word))
+        operation = rng.choice(["insert", "delete", "replace", "transpose"])
+        if operation == "insert":
+            word = word[:i] + rng.choice(string.ascii_lowercase) + word[i:]
+        elif operation == "delete" and len(word) > 2:
+            word = word[:i] + word[i + 1:]
+        elif operation == "replace":
+            word = word[:i] + rng.choice(string.ascii_lowercase) + word[i + 1:]
+        elif i + 1 < len(word):
+            word = word[:i] + word[i + 1] + word[i] + word[i + 2:]
+    return word
+
+
+def percentile(values: list[float], ratio: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * ratio))]
+
+
+def measure(fn, queries: list[str]) -> list[float]:
+    latencies = []
+    for query in queries:
+        started = time.perf_counter()
+        fn(query)
+        latencies.append((time.perf_counter() - started) * 1000)
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description="入力補完・綴り訂正インデックスのベンチマーク")
+    parser.add_argument("--words-file", help="見出し語のファイル (1行1語、または .sqlite3)")
+    parser.add_argument("--words", type=int, default=147000, help="合成データの語数")
+    parser.add_argument("--queries", type=int, default=2000, help="計測に使う単語数")
+    parser.add_argument("--max-edit-distance", type=int, default=2)
+    parser.add_argument("--prefix-length", type=int, default=7)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    words = load_words(args.words_file) if args.words_file else synthetic_words(args.words, args.seed)
+    print(f"見出し語: {len(words)}語")
+
+    tracemalloc.start()
+    index = SuggestionIndex(words, args.max_edit_distance, args.prefix_length)
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    stats = index.stats()
+    print(f"作成時間: {stats['build_seconds']:.2f}秒 | 削除インデックス: {stats['delete_entries']}件")
+    print(f"メモリ: 推定 {stats['memory_bytes'] / 1024 / 1024:.1f} MB | "
+          f"tracemalloc 保持 {current / 1024 / 1024:.1f} MB (作成中のピーク {peak / 1024 / 1024:.1f} MB)")
+
+    rng = random.Random(args.seed)
+    samples = rng.sample(index.words, min(args.queries, len(index.words)))
+    # 1打鍵ごとの入力を模して、単語の先頭1〜全文字を前方一致の問い合わせにする
+    keystrokes = [word[:rng.randint(1, len(word))] for word in samples]
+    typos = [misspell(word, rng) for word in samples]
+
+    found = sum(1 for word, typo in zip(samples, typos) if word in [w for w, _ in index.corrections(typo)])
+    for name, fn, queries in [
+        ("prefix", index.prefix, keystrokes),
+        ("corrections", index.corrections, typos),
+    ]:
+        latencies = measure(fn, queries)
+        print(f"{name:<12} p50 {statistics.median(latencies):.3f} ms | p99 {percentile(latencies, 0.99):.3f} ms | "
+              f"max {max(latencies):.3f} ms")
+    print(f"綴り訂正の再現率 (元の単語が候補に含まれる割合): {found / len(samples):.0%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""
+単語帳検索のベンチマーク。
+
+日本語・英語の名前と説明を持つ合成の単語帳から検索インデックスを作成し、作成時間・メモリ使用量と、
+以前と同じ全件走査 (1件ずつ文字列を正規化して部分一致を確かめる) と転置インデックスでの
+検索レイテンシを比較する。Firestoreからの読み込み時間は含めない (全件走査では実際には
+これに全件の読み込みが加わる)。
+
+実行方法 (backend ディレクトリで):
+    python -m benchmarks.wordbook_search --sizes 10000,100000
+"""
+import argparse
+import random
+import statistics
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+from app.services.wordbook_search import WordbookSearchIndex, normalize_search_text, searchable_text
+
+TOPICS = ["TOEIC", "TOEFL", "英検", "IELTS", "ビジネス英語", "日常会話", "医学英語", "旅行", "大学受験", "Academic", "Daily", "Phrasal Verbs"]
+LEVELS = ["基本", "頻出", "上級", "初級", "必修", "essential", "advanced", "basic"]
+NOUNS = ["単語帳", "英単語", "フレーズ集", "word list", "vocabulary", "熟語", "表現"]
+DESCRIPTIONS = ["毎日10語ずつ覚える", "試験直前の確認用", "仕事でよく使う表現をまとめました", "Words I met while reading novels",
+                "ニュース記事から集めた単語", "for my daily commute", "", "苦手な単語だけ"]
+
+
+def pseudo_word(rng: random.Random) -> str:
+    return "".join(rng.choices("etaoinshrdlcumwfgypbvk", k=rng.randint(5, 9)))
+
+
+def synthetic_wordbooks(count: int, seed: int) -> list[dict]:
+    """定型の名前に、単語帳ごとに異なる語 (まれな語の検索に使う) を加えた単語帳を作る"""
+    rng = random.Random(seed)
+    rare_words = [pseudo_word(rng) for _ in range(max(100, count // 5))]
+    started = datetime(2024, 1, 1)
+    wordbooks = []
+    for i in range(count):
+        created_at = started + timedelta(minutes=rng.randrange(60 * 24 * 600))
+        wordbooks.append({
+            "id": f"wordbook{i:07d}",
+            "name": f"{rng.choice(TOPICS)} {rng.choice(LEVELS)}{rng.choice(NOUNS)} {rng.choice(rare_words)}",
+            "user_name": f"user{rng.randrange(count // 10 + 1)}",
+            "owner_id": f"uid{rng.randrange(count // 10 + 1)}",
+            "is_public": rng.random() < 0.7,
+            "num_words": rng.randrange(300),
+            "description": rng.choice(DESCRIPTIONS),
+            "created_at": created_at,
+            "updated_at": created_at,
+        })
+    return wordbooks
+
+
+def scan(wordbooks: list[dict], q: str, uid: str) -> list[dict]:
+    """以前の検索と同じく、全件の文字列を正規化して部分一致を確かめる"""
+    query = normalize_search_text(q)
+    results = [
+        wordbook for wordbook in wordbooks
+        if (wordbook["owner_id"] == uid or wordbook["is_public"]) and query in searchable_text(wordbook)
+    ]
+    results.sort(key=lambda wordbook: (wordbook["created_at"], wordbook["id"]), reverse=True)
+    return results
+
+
+def percentile(values: list[float], ratio: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * ratio))]
+
+
+def measure(fn, queries: list[str]) -> list[float]:
+    latencies = []
+    for query in queries:
+        started = time.perf_counter()
+        fn(query)
+        latencies.append((time.perf_counter() - started) * 1000)
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description="単語帳検索のベンチマーク")
+    parser.add_argument("--sizes", default="10000,100000", help="単語帳の件数 (カンマ区切り)")
+    parser.add_argument("--rounds", type=int, default=20, help="各クエリを実行する回数")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    queries = {
+        "よく当たる語": ["英単語", "TOEIC", "vocabulary"],
+        "日本語の部分一致": ["ビジネス", "熟語", "試験直前"],
+        "まれな語": [],
+        "当たらない語": ["量子力学", "zzzz"],
+        "1文字": ["英"],
+    }
+    for size in [int(size) for size in args.sizes.split(",")]:
+        wordbooks = synthetic_wordbooks(size, args.seed)
+        uid = wordbooks[0]["owner_id"]
+        queries["まれな語"] = [wordbook["name"].split()[-1] for wordbook in random.Random(args.seed).sample(wordbooks, 3)]
+        tracemalloc.start()
+        index = WordbookSearchIndex(wordbooks)
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        stats = index.stats()
+        print(f"\n単語帳: {size}件 | 作成時間: {stats['build_seconds']:.2f}秒 | バイグラム: {stats['grams']}種類, "
+              f"{stats['postings']}件 | メモリ: 推定 {stats['memory_bytes'] / 1024 / 1024:.1f} MB "
+              f"(tracemalloc 保持 {current / 1024 / 1024:.1f} MB)")
+        for name, group in queries.items():
+            hits = []
+            for query in group:
+                expected = scan(wordbooks, query, uid)
+                found = index.search(query, uid)
+                assert [wordbook["id"] for wordbook in found] == [wordbook["id"] for wordbook in expected], query
+                hits.append(len(found))
+            repeated = group * args.rounds
+            scanned = measure(lambda query: scan(wordbooks, query, uid), group * max(1, args.rounds // 10))
+            indexed = measure(lambda query: index.search(query, uid), repeated)
+            print(f"  {name:<10} (平均 {statistics.mean(hits):>8,.0f}件) 全件走査 p50 {statistics.median(scanned):8.2f} ms | "
+                  f"インデックス p50 {statistics.median(indexed):7.2f} ms, p99 {percentile(indexed, 0.99):7.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,4 @@
+import os
+
+# app.services.words はインポート時にLLMクライアントを作るので、テストではダミーのAPIキーを使う
+os.environ.setdefault("OPENAI_API_KEY", "test")
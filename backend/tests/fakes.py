@@ -0,0 +1,184 @@
+"""テスト用のメモリ上のFirestore (このアプリケーションが使う機能だけを持つ)"""
+from datetime import datetime, timezone
+import operator
+
+from google.cloud.firestore_v1.transforms import ArrayUnion, Increment
+
+OPERATORS = {
+    "==": operator.eq,
+    "!=": operator.ne,
+    "<": operator.lt,
+    "<=": operator.le,
+    ">": operator.gt,
+    ">=": operator.ge,
+}
+
+
+def stored(value):
+    """Firestoreと同じく、タイムゾーンのない日時はUTCとして保存する"""
+    if isinstance(value, datetime) and value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value
+
+
+class FakeSnapshot:
+    def __init__(self, reference, data):
+        self.reference = reference
+        self.id = reference.id
+        self._data = data
+        self.exists = data is not None
+
+    def to_dict(self):
+        return dict(self._data) if self._data is not None else None
+
+
+class FakeAggregation:
+    def __init__(self, value):
+        self.value = value
+
+
+class FakeDocument:
+    def __init__(self, db, collection, document_id):
+        self.db = db
+        self.collection = collection
+        self.id = document_id
+
+    def get(self):
+        self.db.reads += 1
+        return FakeSnapshot(self, self.db.data[self.collection].get(self.id))
+
+    def set(self, data):
+        self.db.writes += 1
+        self.db.data[self.collection][self.id] = {field: stored(value) for field, value in data.items()}
+
+    def update(self, updates):
+        self.db.writes += 1
+        data = self.db.data[self.collection][self.id]
+        for field, value in updates.items():
+            if isinstance(value, Increment):
+                data[field] = data.get(field, 0) + value.value
+            elif isinstance(value, ArrayUnion):
+                current = list(data.get(field) or [])
+                data[field] = current + [item for item in value.values if item not in current]
+            else:
+                data[field] = stored(value)
+
+    def delete(self):
+        self.db.writes += 1
+        self.db.data[self.collection].pop(self.id, None)
+
+
+class FakeQuery:
+    def __init__(self, db, collection, filters=(), orders=(), after=None, limit=None, fields=None):
+        self.db = db
+        self.collection = collection
+        self.filters = list(filters)
+        self.orders = list(orders)
+        self.after = after
+        self._limit = limit
+        self.fields = fields
+
+    def _copy(self, **changes):
+        values = dict(filters=self.filters, orders=self.orders, after=self.after, limit=self._limit, fields=self.fields)
+        values.update(changes)
+        return FakeQuery(self.db, self.collection, **values)
+
+    def document(self, document_id):
+        return FakeDocument(self.db, self.collection, document_id)
+
+    def where(self, field, op, value):
+        return self._copy(filters=self.filters + [(field, op, value)])
+
+    def order_by(self, field, direction="ASCENDING"):
+        return self._copy(orders=self.orders + [(field, direction)])
+
+    def start_after(self, cursor):
+        return self._copy(after=cursor)
+
+    def limit(self, count):
+        return self._copy(limit=count)
+
+    def select(self, fields):
+        return self._copy(fields=list(fields))
+
+    def _value(self, document_id, data, field):
+        return document_id if field == "__name__" else data.get(field)
+
+    def _rows(self):
+        rows = [
+            (document_id, data) for document_id, data in self.db.data[self.collection].items()
+            if all(field in data and OPERATORS[op](data[field], stored(value)) for field, op, value in self.filters)
+        ]
+        # order_by したフィールドがないドキュメントは結果に含まれない
+        rows = [(document_id, data) for document_id, data in rows if all(field == "__name__" or field in data for field, _ in self.orders)]
+        for field, direction in reversed(self.orders):
+            rows.sort(key=lambda row: self._value(row[0], row[1], field), reverse=direction == "DESCENDING")
+        if self.after is not None:
+            def key(row):
+                return tuple(self._value(row[0], row[1], field) for field, _ in self.orders)
+            cursor = tuple(stored(self.after[field]) for field, _ in self.orders)
+            descending = self.orders[0][1] == "DESCENDING"
+            rows = [row for row in rows if (key(row) < cursor if descending else key(row) > cursor)]
+        return rows[:self._limit] if self._limit is not None else rows
+
+    def stream(self):
+        self.db.queries += 1
+        for document_id, data in self._rows():
+            self.db.reads += 1
+            if self.fields is not None:
+                data = {field: data[field] for field in self.fields if field in data}
+            yield FakeSnapshot(FakeDocument(self.db, self.collection, document_id), data)
+
+    def count(self):
+        query = self
+
+        class Count:
+            def get(self):
+                query.db.reads += 1
+                return [[FakeAggregation(len(query._rows()))]]
+
+        return Count()
+
+
+class FakeBatch:
+    def __init__(self, db):
+        self.db = db
+        self.operations = []
+
+    def set(self, reference, data):
+        self.operations.append(lambda: reference.set(data))
+
+    def update(self, reference, data):
+        self.operations.append(lambda: reference.update(data))
+
+    def delete(self, reference):
+        self.operations.append(reference.delete)
+
+    def commit(self):
+        assert len(self.operations) <= 500, "Firestoreのバッチは500件まで"
+        self.db.commits += 1
+        for operation in self.operations:
+            operation()
+
+
+class FakeFirestore:
+    def __init__(self):
+        self.data = {}
+        self.reads = 0
+        self.writes = 0
+        self.queries = 0
+        self.commits = 0
+
+    def collection(self, name):
+        self.data.setdefault(name, {})
+        return FakeQuery(self, name)
+
+    def batch(self):
+        return FakeBatch(self)
+
+    def get_all(self, references, field_paths=None):
+        for reference in references:
+            snapshot = reference.get()
+            if snapshot.exists and field_paths is not None:
+                snapshot = FakeSnapshot(reference, {field: snapshot._data[field] for field in field_paths if field in snapshot._data})
+            yield snapshot
@@ -0,0 +1,74 @@
+from fastapi import HTTPException, status
+
+from app.schemas.words import Definition, WordGenerated
+from app.services import words as word_service
+from app.workers.prewarm import load_checkpoint, prewarm
+
+LEMMAS = {"run": "run", "running": "run", "ran": "run", "walk": "walk", "orphan": "orphan"}
+
+
+class FakeCache:
+    def __init__(self, cached: set[str]):
+        self.cached = cached
+
+    async def get(self, key: str):
+        return "cached" if key in self.cached else None
+
+
+def setup_word_service(monkeypatch, cached=(), failing=()):
+    """見出し語の解決・キャッシュ・生成を差し替え、生成を依頼された単語のリストを返す"""
+    generated = []
+
+    async def resolve_word(word):
+        if word in LEMMAS:
+            return LEMMAS[word], None
+        return word, ["walk"]
+
+    async def get_enhanced_word(word):
+        generated.append(word)
+        if word == "orphan":
+            # 見出し語の一覧にはあるが辞書データがない単語
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="not found")
+        if word in failing:
+            raise HTTPException(status_code=status.HTTP_504_GATEWAY_TIMEOUT, detail="timeout")
+        return WordGenerated(english=word, definitions=[Definition(part_of_speech="verb-動詞", japanese=["走る"])])
+
+    monkeypatch.setattr(word_service, "resolve_word", resolve_word)
+    monkeypatch.setattr(word_service, "get_enhanced_word", get_enhanced_word)
+    monkeypatch.setattr(word_service, "get_word_cache_key", lambda word: f"key:{word}")
+    monkeypatch.setattr(word_service, "word_cache", FakeCache({f"key:{word}" for word in cached}))
+    return generated
+
+
+async def test_inflected_forms_check_the_lemma_cache(monkeypatch, tmp_path):
+    generated = setup_word_service(monkeypatch, cached={"run"})
+    checkpoint = tmp_path / "prewarm.checkpoint"
+
+    counts = await prewarm(["running", "ran", "walk"], str(checkpoint), concurrency=2, rate=0)
+
+    # running / ran は見出し語 run のキャッシュがあるので生成しない
+    assert generated == ["walk"]
+    assert counts == {"warmed": 1, "already_cached": 2, "skipped": 0, "failed": 0}
+    assert load_checkpoint(str(checkpoint)) == {"running", "ran", "walk"}
+
+
+async def test_unknown_words_are_skipped_and_checkpointed(monkeypatch, tmp_path):
+    generated = setup_word_service(monkeypatch)
+    checkpoint = tmp_path / "prewarm.checkpoint"
+
+    counts = await prewarm(["recieve", "orphan", "walk"], str(checkpoint), concurrency=1, rate=0)
+
+    # 辞書にない単語は生成せず、辞書データのない単語は404をスキップとして扱う
+    assert generated == ["orphan", "walk"]
+    assert counts == {"warmed": 1, "already_cached": 0, "skipped": 2, "failed": 0}
+    assert load_checkpoint(str(checkpoint)) == {"recieve", "orphan", "walk"}
+
+
+async def test_failed_words_are_not_checkpointed(monkeypatch, tmp_path):
+    setup_word_service(monkeypatch, failing={"walk"})
+    checkpoint = tmp_path / "prewarm.checkpoint"
+
+    counts = await prewarm(["walk", "run"], str(checkpoint), concurrency=1, rate=0)
+
+    assert counts == {"warmed": 1, "already_cached": 0, "skipped": 0, "failed": 1}
+    assert load_checkpoint(str(checkpoint)) == {"run"}
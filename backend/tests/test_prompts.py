@@ -0,0 +1,15 @@
+from app.services.prompts import PROMPT_VERSION, build_prompt_version, prompt_limits
+
+
+def test_prompt_version_uses_effective_limits(monkeypatch):
+    assert build_prompt_version(prompt_limits()) == PROMPT_VERSION
+    for name in [
+        "PROMPT_MAX_DEFINITIONS_PER_POS",
+        "PROMPT_MAX_EXAMPLES",
+        "PROMPT_MAX_SYNONYMS",
+        "PROMPT_MAX_TRANSLATIONS_PER_POS",
+        "PROMPT_DICTIONARY_TOKEN_BUDGET",
+    ]:
+        with monkeypatch.context() as patch:
+            patch.setenv(name, "1")
+            assert build_prompt_version(prompt_limits()) != PROMPT_VERSION, name
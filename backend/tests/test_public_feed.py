@@ -0,0 +1,125 @@
+from datetime import datetime, timedelta
+import json
+
+import pytest
+
+from app.services import public_feed, wordbook_sync
+from app.services.public_feed import PublicWordbookFeed
+from app.services.wordbook_sync import TOMBSTONE_COLLECTION, TOMBSTONE_RETENTION, WordbookViewSync, tombstone
+
+from .fakes import FakeFirestore
+
+
+def make_wordbook(i: int, updated_at: datetime, **fields) -> dict:
+    return {
+        "id": f"b{i:02d}",
+        "name": f"単語帳 {i}",
+        "user_name": "user",
+        "owner_id": f"uid{i % 3}",
+        "is_public": True,
+        "num_words": i,
+        "description": None,
+        "created_at": datetime(2024, 1, 1) + timedelta(days=i),
+        "updated_at": updated_at,
+        **fields,
+    }
+
+
+@pytest.fixture
+def db(monkeypatch, tmp_path):
+    db = FakeFirestore()
+    monkeypatch.setattr(wordbook_sync.firestore, "client", lambda: db)
+    monkeypatch.setattr(public_feed, "_sync", WordbookViewSync("公開単語帳の一覧", PublicWordbookFeed, filters=[("is_public", "==", True)]))
+    monkeypatch.setattr(public_feed, "_saved_version", None)
+    monkeypatch.setattr(public_feed, "_background_tasks", [])
+    monkeypatch.setenv("PUBLIC_FEED_SNAPSHOT_PATH", str(tmp_path / "feed.json"))
+    monkeypatch.setenv("PUBLIC_FEED_REFRESH_SECONDS", "0")
+    monkeypatch.setenv("PUBLIC_FEED_SAVE_SECONDS", "0")
+    old = datetime.now() - timedelta(days=1)
+    for i in range(10):
+        db.collection("wordbooks").document(f"b{i:02d}").set(make_wordbook(i, old, is_public=i != 9))
+    return db
+
+
+async def start():
+    await public_feed.init_public_feed()
+    await public_feed._background_tasks[-1]
+
+
+def feed_ids() -> list[str]:
+    content, _ = public_feed.get_public_feed().page()
+    return [wordbook["id"] for wordbook in json.loads(content)]
+
+
+def test_snapshot_round_trip():
+    now = datetime.now()
+    feed = PublicWordbookFeed([make_wordbook(i, now) for i in range(3)])
+    content = feed.snapshot(now)
+    snapshot = json.loads(content)
+    assert snapshot["format_version"] == public_feed.FEED_FORMAT_VERSION
+    assert datetime.fromisoformat(snapshot["synced_at"]) == now
+    assert len(snapshot["wordbooks"]) == 3
+    assert json.loads(feed.snapshot())["synced_at"] is None
+
+
+async def test_first_start_loads_all_public_wordbooks(db):
+    await start()
+    assert feed_ids() == [f"b{i:02d}" for i in range(8, -1, -1)]
+    await public_feed.close_public_feed()
+    _, synced_at = PublicWordbookFeed.load(public_feed.snapshot_path())
+    assert synced_at == public_feed._sync.synced_at
+
+
+async def test_restart_reads_only_changes_since_the_snapshot(db):
+    await start()
+    await public_feed.close_public_feed()
+
+    # 停止中の他のインスタンスでの変更
+    now = datetime.now()
+    db.collection("wordbooks").document("b01").update({"is_public": False, "updated_at": now})
+    db.collection("wordbooks").document("b02").update({"num_words": 50, "updated_at": now})
+    db.collection("wordbooks").document("b03").delete()
+    db.collection(TOMBSTONE_COLLECTION).document("b03").set(tombstone("b03", now))
+    db.collection("wordbooks").document("b20").set(make_wordbook(20, now))
+
+    public_feed._sync = WordbookViewSync("公開単語帳の一覧", PublicWordbookFeed, filters=[("is_public", "==", True)])
+    db.reads = 0
+    await start()
+    assert db.reads == 4
+    assert feed_ids() == ["b20", "b08", "b07", "b06", "b05", "b04", "b02", "b00"]
+    content, _ = public_feed.get_public_feed().page()
+    assert {wordbook["id"]: wordbook["num_words"] for wordbook in json.loads(content)}["b02"] == 50
+
+
+async def test_stale_snapshot_is_rebuilt(db):
+    await start()
+    synced_at = datetime.now() - TOMBSTONE_RETENTION - timedelta(hours=1)
+    feed = public_feed.get_public_feed()
+    public_feed.write_snapshot(public_feed.snapshot_path(), feed.snapshot(synced_at))
+
+    # 削除の記録が消えた後に削除された単語帳も、作り直しで一覧から外れる
+    db.collection("wordbooks").document("b05").delete()
+    public_feed._sync = WordbookViewSync("公開単語帳の一覧", PublicWordbookFeed, filters=[("is_public", "==", True)])
+    db.reads = 0
+    await start()
+    assert db.reads == 8
+    assert "b05" not in feed_ids()
+
+
+async def test_saves_only_when_the_feed_changed(db, monkeypatch):
+    saved = []
+    monkeypatch.setattr(public_feed, "write_snapshot", lambda path, content: saved.append(content))
+    await start()
+    await public_feed.save_public_feed()
+    await public_feed.save_public_feed()
+    assert len(saved) == 1
+
+    public_feed.adjust_feed_num_words("b04", 1)
+    await public_feed.save_public_feed()
+    assert len(saved) == 2
+
+    # 差分の読み込みの後は、一覧が変わっていなくても同期した日時を保存し直す
+    await public_feed._sync.refresh()
+    await public_feed.save_public_feed()
+    assert len(saved) == 3
+    assert json.loads(saved[-1])["synced_at"] == public_feed._sync.synced_at.isoformat()
@@ -0,0 +1,120 @@
+import asyncio
+
+import pytest
+
+from app.core.singleflight import SingleFlight
+
+
+class Loader:
+    """呼び出し回数を数え、release() されるまで結果を返さない処理"""
+
+    def __init__(self, result="result", error: Exception = None):
+        self.result = result
+        self.error = error
+        self.calls = 0
+        self.started = asyncio.Event()
+        self.released = asyncio.Event()
+
+    async def __call__(self):
+        self.calls += 1
+        self.started.set()
+        await self.released.wait()
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+    def release(self):
+        self.released.set()
+
+
+async def test_concurrent_callers_share_one_execution():
+    flight = SingleFlight()
+    loader = Loader(result={"word": "run"})
+
+    waiters = [asyncio.create_task(flight.do("run", loader)) for _ in range(5)]
+    await loader.started.wait()
+    assert flight.stats() == {"executions": 1, "coalesced": 4, "in_flight": 1}
+
+    loader.release()
+    results = await asyncio.gather(*waiters)
+    assert loader.calls == 1
+    assert all(result is results[0] for result in results)
+    assert flight.stats()["in_flight"] == 0
+
+
+async def test_different_keys_run_separately():
+    flight = SingleFlight()
+    run, walk = Loader("run"), Loader("walk")
+    run.release()
+    walk.release()
+
+    assert await asyncio.gather(flight.do("run", run), flight.do("walk", walk)) == ["run", "walk"]
+    assert (run.calls, walk.calls) == (1, 1)
+
+
+async def test_keys_are_released_after_completion():
+    flight = SingleFlight()
+    loader = Loader()
+    loader.release()
+
+    await flight.do("run", loader)
+    await flight.do("run", loader)
+    # 結果は保持しないので、完了後の呼び出しは再実行する
+    assert loader.calls == 2
+    assert flight.stats() == {"executions": 2, "coalesced": 0, "in_flight": 0}
+
+
+async def test_errors_reach_every_waiter_and_are_not_kept():
+    flight = SingleFlight()
+    failing = Loader(error=ValueError("boom"))
+
+    waiters = [asyncio.create_task(flight.do("run", failing)) for _ in range(3)]
+    await failing.started.wait()
+    failing.release()
+    results = await asyncio.gather(*waiters, return_exceptions=True)
+
+    assert failing.calls == 1
+    assert all(isinstance(result, ValueError) and str(result) == "boom" for result in results)
+    assert flight.stats()["in_flight"] == 0
+
+    # 失敗した結果は残らず、次の呼び出しは処理をやり直す
+    succeeding = Loader()
+    succeeding.release()
+    assert await flight.do("run", succeeding) == "result"
+    assert succeeding.calls == 1
+
+
+async def test_cancelling_a_waiter_does_not_cancel_the_shared_task():
+    flight = SingleFlight()
+    loader = Loader()
+
+    first = asyncio.create_task(flight.do("run", loader))
+    second = asyncio.create_task(flight.do("run", loader))
+    await loader.started.wait()
+
+    first.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await first
+
+    loader.release()
+    assert await second == "result"
+    assert loader.calls == 1
+
+
+async def test_shared_task_finishes_when_every_waiter_is_cancelled():
+    flight = SingleFlight()
+    loader = Loader()
+
+    waiter = asyncio.create_task(flight.do("run", loader))
+    await loader.started.wait()
+    waiter.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await waiter
+
+    # 実行中の処理は続いているので、後から来た呼び出しはその結果を共有する
+    late = asyncio.create_task(flight.do("run", loader))
+    await asyncio.sleep(0)
+    loader.release()
+    assert await late == "result"
+    assert loader.calls == 1
+    assert flight.stats() == {"executions": 1, "coalesced": 1, "in_flight": 0}
@@ -0,0 +1,227 @@
+import httpx
+import pytest
+
+from app.core.http import set_free_dictionary_client
+from app.schemas.words import Definition, FDAData, PhoneticInfo, WordGenerated
+from app.services import words as word_service
+from app.services.word_cache import (
+    EnhancedWordCache,
+    FreeDictionaryCache,
+    MemoryLRUCache,
+    SQLiteWordStore,
+    build_cache_key,
+)
+
+
+def make_word(english: str = "run", japanese: str = "走る", part_of_speech: str = "verb-動詞") -> WordGenerated:
+    return WordGenerated(english=english, definitions=[Definition(part_of_speech=part_of_speech, japanese=[japanese])])
+
+
+class FailingStore:
+    def get(self, key):
+        raise RuntimeError("store is down")
+
+    def set(self, key, value):
+        raise RuntimeError("store is down")
+
+    def delete(self, key):
+        raise RuntimeError("store is down")
+
+
+def test_cache_key_normalizes_the_word():
+    assert build_cache_key("  Ice   Cream ", "gpt", "v1") == "ice cream|gpt|v1"
+    assert build_cache_key("run", "gpt", "v1") != build_cache_key("run", "gpt", "v2")
+
+
+def test_memory_cache_hits_and_misses():
+    cache = MemoryLRUCache(max_size=10, ttl_seconds=60)
+    assert cache.get("run") is None
+    cache.set("run", "走る")
+    assert cache.get("run") == "走る"
+    cache.delete("run")
+    assert cache.get("run") is None
+
+
+def test_memory_cache_evicts_the_least_recently_used_entry():
+    cache = MemoryLRUCache(max_size=2, ttl_seconds=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    # a を参照すると、最も長く参照されていないのは b になる
+    assert cache.get("a") == 1
+    cache.set("c", 3)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+    assert cache.evictions == 1
+    assert len(cache) == 2
+
+
+def test_memory_cache_expires_entries():
+    cache = MemoryLRUCache(max_size=10, ttl_seconds=60)
+    cache.set("a", 1, ttl_seconds=-1)
+    cache.set("b", 2)
+    assert cache.get("a") is None
+    assert cache.get("b") == 2
+    assert cache.expirations == 1
+    assert len(cache) == 1
+
+
+def test_memory_cache_with_zero_size_stores_nothing():
+    cache = MemoryLRUCache(max_size=0, ttl_seconds=60)
+    cache.set("a", 1)
+    assert cache.get("a") is None
+    assert len(cache) == 0
+
+
+async def test_enhanced_cache_counts_memory_hits_and_misses():
+    cache = EnhancedWordCache(MemoryLRUCache(max_size=10, ttl_seconds=60))
+    assert await cache.get("run") is None
+    await cache.set("run", make_word())
+    assert (await cache.get("run")).definitions[0].japanese == ["走る"]
+
+    stats = cache.stats()
+    assert (stats["memory_hits"], stats["store_hits"], stats["misses"]) == (1, 0, 1)
+    assert stats["hit_rate"] == 0.5
+    assert stats["store"] is None
+
+
+async def test_enhanced_cache_promotes_store_hits_to_memory(tmp_path):
+    store = SQLiteWordStore(str(tmp_path / "cache.sqlite3"))
+    await EnhancedWordCache(MemoryLRUCache(max_size=10, ttl_seconds=60), store).set("run", make_word())
+
+    # 再起動後のようにメモリが空の状態から、永続ストアのエントリを読む
+    cache = EnhancedWordCache(MemoryLRUCache(max_size=10, ttl_seconds=60), store)
+    assert (await cache.get("run")).english == "run"
+    assert (await cache.get("run")).english == "run"
+    assert (cache.memory_hits, cache.store_hits, cache.misses) == (1, 1, 0)
+
+    await cache.delete("run")
+    assert store.get("run") is None
+    assert await cache.get("run") is None
+
+
+async def test_enhanced_cache_ignores_expired_store_entries(tmp_path):
+    store = SQLiteWordStore(str(tmp_path / "cache.sqlite3"))
+    store.set("run", make_word().model_dump(exclude_none=True))
+    store.set("walk", make_word("walk", "歩く").model_dump(exclude_none=True))
+    # run は2日前に保存したことにする
+    store._conn.execute("UPDATE enhanced_words SET stored_at = stored_at - 172800 WHERE key = 'run'")
+
+    cache = EnhancedWordCache(MemoryLRUCache(max_size=10, ttl_seconds=60), store, store_ttl_seconds=86400)
+    assert await cache.get("run") is None
+    assert (await cache.get("walk")).english == "walk"
+    assert (cache.store_hits, cache.misses) == (1, 1)
+    assert len(cache.memory) == 1
+
+
+async def test_enhanced_cache_treats_store_errors_as_misses():
+    cache = EnhancedWordCache(MemoryLRUCache(max_size=10, ttl_seconds=60), FailingStore())
+    await cache.set("run", make_word())
+    # 書き込みに失敗してもメモリには残る
+    assert (await cache.get("run")).english == "run"
+
+    await cache.delete("run")
+    assert await cache.get("run") is None
+    assert cache.store_errors == 3
+    assert cache.misses == 1
+
+
+async def test_enhanced_cache_returns_isolated_copies():
+    cache = EnhancedWordCache(MemoryLRUCache(max_size=10, ttl_seconds=60))
+    word = make_word()
+    await cache.set("run", word)
+    # 保存した後に元のオブジェクトを変更してもキャッシュには影響しない
+    word.definitions[0].japanese.append("変更")
+
+    first = await cache.get("run")
+    first.definitions[0].japanese.append("変更")
+    first.inflected_form = "running"
+
+    second = await cache.get("run")
+    assert second.definitions[0].japanese == ["走る"]
+    assert second.inflected_form is None
+    assert first is not second
+
+
+def test_free_dictionary_cache_hits_and_misses():
+    cache = FreeDictionaryCache(max_size=10, ttl_seconds=60, not_found_ttl_seconds=60)
+    assert cache.get("run") == (False, None)
+
+    data = FDAData(word="run", phonetic="/rʌn/", phonetics=[PhoneticInfo(text="/rʌn/")])
+    cache.set(" Run ", data)
+    found, cached = cache.get("run")
+    assert found and cached == data
+
+    # 返した値を変更してもキャッシュには影響しない
+    cached.phonetics[0].text = "changed"
+    assert cache.get("RUN")[1].phonetics[0].text == "/rʌn/"
+    assert (cache.hits, cache.not_found_hits, cache.misses) == (2, 0, 1)
+
+
+def test_free_dictionary_cache_remembers_not_found_words():
+    cache = FreeDictionaryCache(max_size=10, ttl_seconds=60, not_found_ttl_seconds=60)
+    cache.set_not_found("Qwzx")
+    assert cache.get("qwzx") == (True, None)
+    assert (cache.hits, cache.not_found_hits, cache.misses) == (0, 1, 0)
+
+
+def test_free_dictionary_cache_expires_not_found_words_with_their_own_ttl():
+    cache = FreeDictionaryCache(max_size=10, ttl_seconds=60, not_found_ttl_seconds=-1)
+    cache.set_not_found("qwzx")
+    cache.set("run", FDAData(word="run"))
+    assert cache.get("qwzx") == (False, None)
+    assert cache.get("run")[0]
+
+
+@pytest.fixture
+def free_dictionary_api(monkeypatch):
+    """Free Dictionary APIをスタブに差し替え、リクエストされたURLのリストを返す"""
+    requests = []
+    responses = {"run": httpx.Response(200, json=[{"word": "run"}]), "boom": httpx.Response(500, text="error")}
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(request.url.path)
+        return responses.get(request.url.path.rsplit("/", 1)[-1], httpx.Response(404, json={}))
+
+    monkeypatch.setattr(word_service, "free_dictionary_cache", FreeDictionaryCache(10, 60, 60))
+    set_free_dictionary_client(httpx.AsyncClient(transport=httpx.MockTransport(handler)))
+    yield requests
+    set_free_dictionary_client(None)
+
+
+async def test_free_dictionary_lookups_cache_found_and_not_found_words(free_dictionary_api):
+    for _ in range(2):
+        assert (await word_service.get_word_info_from_free_dictionary("run")).word == "run"
+        assert await word_service.get_word_info_from_free_dictionary("qwzx") is None
+    # 2回目はどちらもキャッシュから返す
+    assert len(free_dictionary_api) == 2
+
+
+async def test_free_dictionary_errors_are_not_cached(free_dictionary_api):
+    assert await word_service.get_word_info_from_free_dictionary("boom") is None
+    assert await word_service.get_word_info_from_free_dictionary("boom") is None
+    assert len(free_dictionary_api) == 2
+
+
+@pytest.mark.parametrize("missing_sources, generated, cached", [
+    ([], make_word(), True),
+    (["free_dictionary"], make_word(), False),
+    ([], make_word(part_of_speech=word_service.FALLBACK_PART_OF_SPEECH), False),
+])
+async def test_only_complete_results_are_cached(monkeypatch, missing_sources, generated, cached):
+    cache = EnhancedWordCache(MemoryLRUCache(max_size=10, ttl_seconds=60))
+
+    async def fetch_word_sources(word):
+        return None, None, list(missing_sources)
+
+    async def generate_enhanced_word_info(dictionary_data, free_dictionary_data):
+        return generated.model_copy(deep=True)
+
+    monkeypatch.setattr(word_service, "word_cache", cache)
+    monkeypatch.setattr(word_service, "fetch_word_sources", fetch_word_sources)
+    monkeypatch.setattr(word_service, "generate_enhanced_word_info", generate_enhanced_word_info)
+
+    result = await word_service._load_enhanced_word("run", "run|model|v1")
+    assert result.missing_sources == (missing_sources or None)
+    assert (await cache.get("run|model|v1") is not None) == cached
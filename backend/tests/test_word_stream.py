@@ -0,0 +1,114 @@
+import json
+
+import pytest
+
+from app.services.word_stream import IncrementalJSONParser, _to_stream_event
+
+RESPONSE = {
+    "english": "example",
+    "definitions": [
+        {"part_of_speech": "noun-名詞", "japanese": ["例", "見本"]},
+        {"part_of_speech": "verb-動詞", "japanese": ["例証する"]},
+    ],
+    "synonyms": ["sample", "instance"],
+    "example_sentences": [
+        {"english": "He said \"hi\" \\ left.", "japanese": "彼は「やあ」と言った\n"},
+        {"english": "{not a brace} [nor a bracket]", "japanese": "éあ"},
+    ],
+}
+
+
+def feed_all(parser: IncrementalJSONParser, chunks) -> list:
+    events = []
+    for chunk in chunks:
+        events.extend(parser.feed(chunk))
+    return events
+
+
+def expected_events() -> list:
+    return (
+        [("item", "definitions", d) for d in RESPONSE["definitions"]]
+        + [("array", "definitions", RESPONSE["definitions"])]
+        + [("array", "synonyms", RESPONSE["synonyms"])]
+        + [("item", "example_sentences", s) for s in RESPONSE["example_sentences"]]
+        + [("array", "example_sentences", RESPONSE["example_sentences"])]
+    )
+
+
+@pytest.mark.parametrize("ensure_ascii", [False, True])
+def test_every_chunk_boundary(ensure_ascii):
+    # ensure_ascii=True では日本語が \uXXXX になるので、エスケープの途中での区切りも含まれる
+    text = json.dumps(RESPONSE, ensure_ascii=ensure_ascii)
+    expected = expected_events()
+    for split in range(1, len(text)):
+        parser = IncrementalJSONParser()
+        assert feed_all(parser, [text[:split], text[split:]]) == expected, split
+        assert parser.text == text
+
+
+def test_one_character_at_a_time():
+    text = json.dumps(RESPONSE, ensure_ascii=True, indent=2)
+    parser = IncrementalJSONParser()
+    assert feed_all(parser, text) == expected_events()
+
+
+def test_events_arrive_as_soon_as_each_element_closes():
+    parser = IncrementalJSONParser()
+    assert parser.feed('{"definitions": [{"part_of_speech": "n", "japanese": ["a"]}') == [
+        ("item", "definitions", {"part_of_speech": "n", "japanese": ["a"]})
+    ]
+    assert parser.feed(', {"part_of_speech": "v", "japanese": ["b"]') == []
+    assert parser.feed("}]") == [
+        ("item", "definitions", {"part_of_speech": "v", "japanese": ["b"]}),
+        ("array", "definitions", [{"part_of_speech": "n", "japanese": ["a"]}, {"part_of_speech": "v", "japanese": ["b"]}]),
+    ]
+
+
+def test_nested_values_inside_items_do_not_emit_events():
+    value = {"a": [{"b": [1, {"c": []}]}], "d": {"e": "]}"}}
+    parser = IncrementalJSONParser()
+    events = parser.feed(json.dumps({"items": [value], "nested": {"x": [{"y": 1}]}}))
+    # トップレベル直下の配列の要素と配列だけを返し、入れ子のオブジェクトの中の配列は返さない
+    assert events == [("item", "items", value), ("array", "items", [value])]
+
+
+def test_leading_code_fence_is_ignored():
+    parser = IncrementalJSONParser()
+    events = feed_all(parser, ["```json\n", '{"synonyms": ', '["a", "b"]}', "\n```"])
+    assert events == [("array", "synonyms", ["a", "b"])]
+
+
+def test_truncated_output_returns_only_completed_values():
+    text = json.dumps(RESPONSE)
+    cut = text.index('"example_sentences"') + 30
+    parser = IncrementalJSONParser()
+    events = feed_all(parser, [text[:cut]])
+    assert events == expected_events()[:4]
+    assert parser.text == text[:cut]
+
+
+def test_mismatched_brackets_emit_no_values():
+    parser = IncrementalJSONParser()
+    text = '{"definitions": [{"part_of_speech": "n", "japanese": ["a"]]}'
+    assert feed_all(parser, [text[:20], text[20:]]) == []
+    assert parser.text == text
+
+
+def test_invalid_element_json_stops_parsing_but_keeps_text():
+    parser = IncrementalJSONParser()
+    assert parser.feed('{"definitions": [{"part_of_speech": n}]}') == []
+    # 解析を諦めた後は、イベントを返さずにテキストだけを蓄積する
+    assert parser.feed('{"synonyms": ["a"]}') == []
+    assert parser.text == '{"definitions": [{"part_of_speech": n}]}{"synonyms": ["a"]}'
+
+
+def test_to_stream_event_validates_elements():
+    assert _to_stream_event("item", "definitions", {"part_of_speech": "n", "japanese": ["a"]}) == {
+        "type": "definition",
+        "data": {"part_of_speech": "n", "japanese": ["a"]},
+    }
+    assert _to_stream_event("item", "definitions", {"japanese": "a"}) is None
+    assert _to_stream_event("array", "synonyms", ["a", 1, "b"]) == {"type": "synonyms", "data": ["a", "b"]}
+    # 要素ごとに送る配列は、配列全体のイベントを送らない
+    assert _to_stream_event("array", "definitions", []) is None
+    assert _to_stream_event("item", "unknown", {}) is None
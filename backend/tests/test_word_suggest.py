@@ -0,0 +1,181 @@
+import random
+
+import pytest
+
+from app.services import word_suggest
+from app.services.word_suggest import SuggestionIndex, damerau_levenshtein
+
+WORDS = [
+    "apple", "apply", "ample", "maple", "applet", "application", "apt", "ape",
+    "receive", "recipe", "relieve", "believe", "deceive", "receiver",
+    "the", "they", "then", "than", "tea", "ten",
+    "information", "informant", "formation", "inform",
+]
+
+
+def osa_distance(a: str, b: str) -> int:
+    """帯を限定しないOSA距離 (比較用の素朴な実装)"""
+    d = [[0] * (len(b) + 1) for _ in range(len(a) + 1)]
+    for i in range(len(a) + 1):
+        d[i][0] = i
+    for j in range(len(b) + 1):
+        d[0][j] = j
+    for i in range(1, len(a) + 1):
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            d[i][j] = min(d[i - 1][j] + 1, d[i][j - 1] + 1, d[i - 1][j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                d[i][j] = min(d[i][j], d[i - 2][j - 2] + 1)
+    return d[len(a)][len(b)]
+
+
+def brute_force_corrections(index: SuggestionIndex, query: str, limit: int) -> list[tuple[str, int]]:
+    max_distance = index._max_distance_for(query)
+    results = [(word, osa_distance(query, word)) for word in index.words]
+    results = [(word, distance) for word, distance in results if distance <= max_distance]
+    results.sort(key=lambda item: (item[1], abs(len(item[0]) - len(query)), item[0]))
+    return results[:limit]
+
+
+@pytest.mark.parametrize("a, b, expected", [
+    ("receive", "receive", 0),
+    ("recieve", "receive", 1),  # 隣接文字の入れ替え
+    ("recive", "receive", 1),   # 挿入
+    ("receeive", "receive", 1), # 削除
+    ("receave", "receive", 1),  # 置換
+    ("ca", "abc", 3),           # OSA距離では入れ替えた文字の間に挿入できない
+    ("kitten", "sitting", 3),
+    ("", "abc", 3),
+    ("abc", "", 3),
+])
+def test_damerau_levenshtein_known_distances(a, b, expected):
+    assert damerau_levenshtein(a, b, 5) == expected
+    assert damerau_levenshtein(b, a, 5) == expected
+
+
+def test_damerau_levenshtein_stops_at_max_distance():
+    assert damerau_levenshtein("kitten", "sitting", 2) == 3
+    assert damerau_levenshtein("kitten", "sitting", 3) == 3
+    # 長さの差だけで上限を超える場合
+    assert damerau_levenshtein("a", "abcdef", 2) == 3
+
+
+def test_damerau_levenshtein_matches_unbanded_reference():
+    rng = random.Random(0)
+    for _ in range(2000):
+        a = "".join(rng.choice("abc") for _ in range(rng.randrange(8)))
+        b = "".join(rng.choice("abc") for _ in range(rng.randrange(8)))
+        for max_distance in range(4):
+            expected = osa_distance(a, b)
+            assert damerau_levenshtein(a, b, max_distance) == min(expected, max_distance + 1), (a, b, max_distance)
+
+
+def test_prefix_returns_words_in_dictionary_order():
+    index = SuggestionIndex(WORDS)
+    assert index.prefix("app") == ["apple", "applet", "application", "apply"]
+    assert index.prefix("app", limit=2) == ["apple", "applet"]
+    assert index.prefix(" APP ") == ["apple", "applet", "application", "apply"]
+    assert index.prefix("xyz") == []
+    assert index.prefix("") == []
+
+
+def test_contains():
+    index = SuggestionIndex(WORDS + ["Apple", "  "])
+    assert index.contains("APPLE")
+    assert not index.contains("appl")
+    assert len(index.words) == len(WORDS)
+
+
+def test_corrections_are_ranked_by_distance_then_length_then_word():
+    index = SuggestionIndex(WORDS)
+    # 同じ距離では入力との長さの差が小さい順、さらに辞書順
+    assert index.corrections("recieve") == [
+        ("receive", 1), ("relieve", 1), ("believe", 2), ("deceive", 2), ("receiver", 2), ("recipe", 2)
+    ]
+    assert index.corrections("recieve", limit=3) == [("receive", 1), ("relieve", 1), ("believe", 2)]
+
+
+def test_short_queries_are_limited_to_distance_one():
+    index = SuggestionIndex(WORDS)
+    # 4文字以下では距離2の "tea" などは返さない
+    assert index.corrections("thn") == [("ten", 1), ("the", 1), ("than", 1), ("then", 1)]
+    assert index.corrections("aple") == [("ample", 1), ("ape", 1), ("apple", 1), ("maple", 1)]
+    # 5文字以上では距離2まで
+    assert index.corrections("apqlx") == [("apple", 2), ("apply", 2)]
+    assert SuggestionIndex(WORDS, max_edit_distance=1).corrections("apqlx") == []
+
+
+@pytest.mark.parametrize("prefix_length", [3, 7])
+def test_corrections_match_brute_force(prefix_length):
+    rng = random.Random(1)
+    index = SuggestionIndex(WORDS, max_edit_distance=2, prefix_length=prefix_length)
+    for _ in range(300):
+        word = rng.choice(WORDS)
+        chars = list(word)
+        for _ in range(rng.randrange(4)):
+            i = rng.randrange(len(chars))
+            operation = rng.choice(["insert", "delete", "replace", "transpose"])
+            if operation == "insert":
+                chars.insert(i, rng.choice("aeiourst"))
+            elif operation == "delete" and len(chars) > 1:
+                del chars[i]
+            elif operation == "replace":
+                chars[i] = rng.choice("aeiourst")
+            elif operation == "transpose" and i + 1 < len(chars):
+                chars[i], chars[i + 1] = chars[i + 1], chars[i]
+        query = "".join(chars)
+        assert index.corrections(query, limit=50) == brute_force_corrections(index, query, 50), query
+
+
+def test_hash_collisions_do_not_produce_wrong_candidates(monkeypatch):
+    # すべての削除文字列を同じハッシュ値にして、削除インデックスの衝突を最大にする
+    monkeypatch.setattr(word_suggest, "_hash_key", lambda text: 1 << word_suggest.WORD_ID_BITS)
+    index = SuggestionIndex(WORDS)
+    for query in ["recieve", "aple", "informaton", "zzzzzzz"]:
+        assert index.corrections(query, limit=50) == brute_force_corrections(index, query, 50), query
+
+
+def test_word_id_overflow_is_rejected(monkeypatch):
+    monkeypatch.setattr(word_suggest, "WORD_ID_MASK", 3)
+    with pytest.raises(ValueError):
+        SuggestionIndex(["a", "b", "c", "d"])
+
+
+def test_limited_corrections_are_the_top_of_the_full_ranking():
+    index = SuggestionIndex(WORDS)
+    for query in ["recieve", "aple", "thn", "informaton", "aplly"]:
+        full = index.corrections(query, limit=50)
+        for limit in range(1, len(full) + 1):
+            assert index.corrections(query, limit=limit) == full[:limit], (query, limit)
+
+
+@pytest.fixture
+def word_service_with_index(monkeypatch):
+    from app.services import words as word_service
+
+    index = SuggestionIndex(WORDS)
+    monkeypatch.setattr(word_service, "get_suggestion_index", lambda: index)
+    monkeypatch.setattr(word_service, "unknown_word_suggestions", True)
+    return word_service
+
+
+async def test_resolve_word_returns_known_lemmas(monkeypatch, word_service_with_index):
+    async def get_lemmas_for_form(word):
+        return {"receives": ["receive"], "informed": ["informed", "inform"]}.get(word, [])
+
+    monkeypatch.setattr(word_service_with_index, "get_lemmas_for_form", get_lemmas_for_form)
+    assert await word_service_with_index.resolve_word("Apple") == ("apple", None)
+    assert await word_service_with_index.resolve_word("receives") == ("receive", None)
+    # 見出し語の一覧にない見出し語は飛ばす
+    assert await word_service_with_index.resolve_word("informed") == ("inform", None)
+
+
+async def test_resolve_word_does_not_guess_lemmas_missing_from_the_index(monkeypatch, word_service_with_index):
+    async def get_lemmas_for_form(word):
+        return ["recieve"] if word == "recieves" else []
+
+    monkeypatch.setattr(word_service_with_index, "get_lemmas_for_form", get_lemmas_for_form)
+    # 対応表の見出し語が一覧にない場合は、その見出し語ではなく綴りの候補を返す
+    lemma, suggestions = await word_service_with_index.resolve_word("recieves")
+    assert lemma == "recieves"
+    assert suggestions == [candidate for candidate, _ in SuggestionIndex(WORDS).corrections("recieves", 5)]
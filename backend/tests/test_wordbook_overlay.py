@@ -0,0 +1,213 @@
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi import HTTPException
+
+from app.api.endpoints import wordbooks as wordbook_endpoints
+from app.api.endpoints import words as word_endpoints
+from app.schemas.wordbooks import WordBook
+from app.schemas.words import WordRequest
+from app.services.wordbook_overlay import RETAINED_COLLECTION, VERSION_COLLECTION, get_word, resolve_words
+
+from .fakes import FakeFirestore
+
+OWNER = "alice"
+READER = "bob"
+
+
+def word_request(english: str, wordbook_id: str) -> WordRequest:
+    return WordRequest(english=english, definitions=[{"part_of_speech": "noun-名詞", "japanese": [english]}], wordbook_id=wordbook_id)
+
+
+@pytest.fixture
+def db():
+    db = FakeFirestore()
+    created_at = datetime.now() - timedelta(days=1)
+    db.collection("wordbooks").document("source").set({
+        "id": "source", "name": "元の単語帳", "user_name": OWNER, "owner_id": OWNER, "is_public": True,
+        "num_words": 3, "description": None, "created_at": created_at, "updated_at": created_at, "num_copies": 0,
+    })
+    for english in ("apple", "banana", "cherry"):
+        db.collection("words").document(english).set({
+            "id": english, "english": english, "definitions": [{"part_of_speech": "noun-名詞", "japanese": [english]}],
+            "owner_id": OWNER, "wordbook_id": "source", "created_at": created_at, "updated_at": created_at,
+        })
+    return db
+
+
+async def duplicate(db, wordbook_id: str = "source", uid: str = READER) -> str:
+    request = WordBook(name="複製", is_public=True, num_words=0)
+    response = await wordbook_endpoints.duplicate_wordbook(wordbook_id, request, db=db, uid=uid)
+    return response.id
+
+
+def contents(db, wordbook_id: str) -> dict[str, str]:
+    """単語帳の単語のID → 訳語"""
+    wordbook_data = db.collection("wordbooks").document(wordbook_id).get().to_dict()
+    return {word["id"]: word["definitions"][0]["japanese"][0] for word in resolve_words(db, wordbook_data)}
+
+
+async def test_copy_inherits_words_under_copy_key_ids(db):
+    db.writes = 0
+    copy_id = await duplicate(db)
+    # 単語はコピーせず、複製した単語帳と複製元の num_copies だけを書き込む
+    assert db.writes == 2
+    assert db.data["wordbooks"]["source"]["num_copies"] == 1
+    assert contents(db, copy_id) == {f"{copy_id}:apple": "apple", f"{copy_id}:banana": "banana", f"{copy_id}:cherry": "cherry"}
+
+    word, wordbook_data = get_word(db, f"{copy_id}:apple")
+    assert word["owner_id"] == READER and word["wordbook_id"] == copy_id and wordbook_data["id"] == copy_id
+    assert get_word(db, f"{copy_id}:missing") is None
+
+
+async def test_words_added_to_the_source_after_the_cutoff_are_not_inherited(db):
+    copy_id = await duplicate(db)
+    added = await word_endpoints.create_word(word_request("date", "source"), db=db, uid=OWNER)
+    assert added.id in contents(db, "source")
+    assert f"{copy_id}:{added.id}" not in contents(db, copy_id)
+    assert get_word(db, f"{copy_id}:{added.id}") is None
+
+
+async def test_source_changes_do_not_write_to_copies(db):
+    copy_ids = [await duplicate(db) for _ in range(5)]
+    db.writes = 0
+    await word_endpoints.update_word("apple", word_request("APPLE", "source"), db=db, uid=OWNER)
+    # 単語の更新と変更前の内容の1件だけで、複製の数によらない
+    assert db.writes == 2
+    db.writes = 0
+    await word_endpoints.delete_word("banana", db=db, uid=OWNER)
+    assert db.writes == 3
+
+    assert contents(db, "source") == {"apple": "APPLE", "cherry": "cherry"}
+    for copy_id in copy_ids:
+        assert contents(db, copy_id) == {f"{copy_id}:apple": "apple", f"{copy_id}:banana": "banana", f"{copy_id}:cherry": "cherry"}
+        word, _ = get_word(db, f"{copy_id}:banana")
+        assert word["english"] == "banana"
+
+    # 変更の後に複製した単語帳は、変更後の内容を引き継ぐ
+    later_id = await duplicate(db)
+    assert contents(db, later_id) == {f"{later_id}:apple": "APPLE", f"{later_id}:cherry": "cherry"}
+    assert get_word(db, f"{later_id}:banana") is None
+
+
+async def test_each_copy_sees_the_version_at_its_cutoff(db):
+    first_id = await duplicate(db)
+    await word_endpoints.update_word("apple", word_request("APPLE", "source"), db=db, uid=OWNER)
+    second_id = await duplicate(db)
+    await word_endpoints.update_word("apple", word_request("Apple!", "source"), db=db, uid=OWNER)
+    assert contents(db, first_id)[f"{first_id}:apple"] == "apple"
+    assert contents(db, second_id)[f"{second_id}:apple"] == "APPLE"
+    assert contents(db, "source")["apple"] == "Apple!"
+    assert get_word(db, f"{second_id}:apple")[0]["english"] == "APPLE"
+
+
+async def test_wordbooks_without_copies_keep_no_versions(db):
+    db.reads = db.writes = 0
+    await word_endpoints.update_word("apple", word_request("APPLE", "source"), db=db, uid=OWNER)
+    await word_endpoints.delete_word("banana", db=db, uid=OWNER)
+    assert not db.data.get(VERSION_COLLECTION)
+    # num_copies が0なので、複製を探すクエリも使わない
+    assert db.queries == 0
+
+
+async def test_copies_created_before_the_counter_are_still_preserved(db):
+    copy_id = await duplicate(db)
+    # num_copies を記録する前に作られた複製元
+    del db.data["wordbooks"]["source"]["num_copies"]
+    await word_endpoints.update_word("apple", word_request("APPLE", "source"), db=db, uid=OWNER)
+    assert contents(db, copy_id)[f"{copy_id}:apple"] == "apple"
+    # 次の複製で、今ある複製の数から記録を始める
+    await duplicate(db)
+    assert db.data["wordbooks"]["source"]["num_copies"] == 2
+
+
+async def test_editing_an_inherited_word_materializes_it(db):
+    copy_id = await duplicate(db)
+    updated = await word_endpoints.update_word(f"{copy_id}:apple", word_request("りんご", copy_id), db=db, uid=READER)
+    assert ":" not in updated.id
+    assert db.data["words"][updated.id]["base_word_id"] == "apple"
+    assert contents(db, copy_id) == {updated.id: "りんご", f"{copy_id}:banana": "banana", f"{copy_id}:cherry": "cherry"}
+    # 実体化した単語があるので、引き継いだ単語のIDでは見つからない
+    assert get_word(db, f"{copy_id}:apple") is None
+    assert contents(db, "source")["apple"] == "apple"
+
+    # 実体化した単語を削除しても、複製元の単語が再び見えるようにはならない
+    await word_endpoints.delete_word(updated.id, db=db, uid=READER)
+    assert db.data["wordbooks"][copy_id]["hidden_word_ids"] == ["apple"]
+    assert contents(db, copy_id) == {f"{copy_id}:banana": "banana", f"{copy_id}:cherry": "cherry"}
+
+
+async def test_deleting_an_inherited_word_hides_it(db):
+    copy_id = await duplicate(db)
+    with pytest.raises(HTTPException) as error:
+        await word_endpoints.delete_word(f"{copy_id}:banana", db=db, uid=OWNER)
+    assert error.value.status_code == 403
+
+    await word_endpoints.delete_word(f"{copy_id}:banana", db=db, uid=READER)
+    assert db.data["wordbooks"][copy_id]["hidden_word_ids"] == ["banana"]
+    assert f"{copy_id}:banana" not in contents(db, copy_id)
+    assert get_word(db, f"{copy_id}:banana") is None
+    assert "banana" in contents(db, "source")
+
+
+async def test_copy_of_a_copy_keeps_the_intermediate_version(db):
+    copy_id = await duplicate(db)
+    # 複製の後に複製元に加えた単語は、複製の複製にも引き継がれない
+    await word_endpoints.create_word(word_request("date", "source"), db=db, uid=OWNER)
+    nested_id = await duplicate(db, copy_id, uid="carol")
+    assert contents(db, nested_id) == {
+        f"{nested_id}:{copy_id}:apple": "apple", f"{nested_id}:{copy_id}:banana": "banana", f"{nested_id}:{copy_id}:cherry": "cherry",
+    }
+    # 複製した単語帳で引き継いだ単語を編集・削除しても、その複製は複製した時点の内容を引き継ぐ
+    await word_endpoints.update_word(f"{copy_id}:apple", word_request("りんご", copy_id), db=db, uid=READER)
+    await word_endpoints.delete_word(f"{copy_id}:banana", db=db, uid=READER)
+    await word_endpoints.update_word("cherry", word_request("CHERRY", "source"), db=db, uid=OWNER)
+    assert contents(db, nested_id) == {
+        f"{nested_id}:{copy_id}:apple": "apple", f"{nested_id}:{copy_id}:banana": "banana", f"{nested_id}:{copy_id}:cherry": "cherry",
+    }
+    word, _ = get_word(db, f"{nested_id}:{copy_id}:banana")
+    assert word["english"] == "banana" and word["owner_id"] == "carol"
+
+
+async def test_deleting_a_source_with_copies_freezes_its_words(db):
+    copy_id = await duplicate(db)
+    await word_endpoints.update_word("apple", word_request("APPLE", "source"), db=db, uid=OWNER)
+    db.writes = 0
+    await wordbook_endpoints.delete_wordbook("source", db=db, uid=OWNER)
+    # 単語は削除せず、記録を残すだけ (単語・複製の数によらない)
+    assert db.writes == 3
+    assert "source" not in db.data["wordbooks"]
+    assert db.data[RETAINED_COLLECTION]["source"]["num_copies"] == 1
+
+    assert contents(db, copy_id) == {f"{copy_id}:apple": "apple", f"{copy_id}:banana": "banana", f"{copy_id}:cherry": "cherry"}
+    assert get_word(db, f"{copy_id}:cherry")[0]["english"] == "cherry"
+    # 削除した単語帳に残している単語は、元の所有者でも変更できない
+    with pytest.raises(HTTPException) as error:
+        await word_endpoints.update_word("cherry", word_request("CHERRY", "source"), db=db, uid=OWNER)
+    assert error.value.status_code == 404
+
+    # 最後の複製を削除したら、残していた単語と記録も削除する
+    await wordbook_endpoints.delete_wordbook(copy_id, db=db, uid=READER)
+    assert db.data["words"] == {}
+    assert db.data[VERSION_COLLECTION] == {}
+    assert db.data[RETAINED_COLLECTION] == {}
+
+
+async def test_deleting_one_of_several_copies_keeps_the_retained_source(db):
+    first_id = await duplicate(db)
+    second_id = await duplicate(db)
+    await wordbook_endpoints.delete_wordbook("source", db=db, uid=OWNER)
+    await wordbook_endpoints.delete_wordbook(first_id, db=db, uid=READER)
+    assert db.data[RETAINED_COLLECTION]["source"]["num_copies"] == 1
+    assert len(contents(db, second_id)) == 3
+
+
+async def test_deleting_a_copy_releases_the_source(db):
+    copy_id = await duplicate(db)
+    await wordbook_endpoints.delete_wordbook(copy_id, db=db, uid=READER)
+    assert db.data["wordbooks"]["source"]["num_copies"] == 0
+    assert len(db.data["words"]) == 3
+
+    await wordbook_endpoints.delete_wordbook("source", db=db, uid=OWNER)
+    assert db.data["words"] == {}
+    assert not db.data.get(RETAINED_COLLECTION)
@@ -0,0 +1,189 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from fastapi import HTTPException
+
+from app.api.endpoints import wordbooks as wordbook_endpoints
+from app.core.pagination import encode_cursor
+from app.services.wordbook_query import count_wordbooks, plan_wordbook_search, stream_wordbooks
+
+from .fakes import FakeFirestore
+
+UID = "alice"
+
+
+@pytest.fixture
+def db():
+    db = FakeFirestore()
+    # Firestoreから読み込んだ日時と同じく、タイムゾーン付きにする
+    started = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    for i in range(30):
+        owner_id = (UID, "bob", "carol")[i % 3]
+        db.collection("wordbooks").document(f"b{i:02d}").set({
+            "id": f"b{i:02d}",
+            "name": f"単語帳 {(i * 7) % 30:02d}",
+            "user_name": owner_id,
+            "owner_id": owner_id,
+            "is_public": i % 2 == 0,
+            "num_words": (i * 11) % 40,
+            # 同じ作成日時の単語帳はIDの順に並ぶ
+            "created_at": started + timedelta(days=i // 2),
+            "updated_at": started + timedelta(days=i),
+            "description": None,
+        })
+    return db
+
+
+def visible(db, is_public=None, is_owned=None, min_words=None) -> list[dict]:
+    """条件に合う単語帳 (他人の非公開単語帳を除く) を全件から選ぶ"""
+    results = []
+    for wordbook in db.data["wordbooks"].values():
+        is_owner = wordbook["owner_id"] == UID
+        if not is_owner and not wordbook["is_public"]:
+            continue
+        if is_public is not None and wordbook["is_public"] != is_public:
+            continue
+        if is_owned is not None and is_owner != is_owned:
+            continue
+        if min_words is not None and wordbook["num_words"] < min_words:
+            continue
+        results.append(wordbook)
+    return results
+
+
+def ordered(wordbooks: list[dict], sort_by: str, sort_order: str) -> list[str]:
+    wordbooks = sorted(wordbooks, key=lambda wordbook: (wordbook[sort_by], wordbook["id"]), reverse=sort_order == "desc")
+    return [wordbook["id"] for wordbook in wordbooks]
+
+
+CONDITIONS = [
+    dict(),
+    dict(is_public=True),
+    dict(is_public=False),
+    dict(is_owned=True),
+    dict(is_owned=False),
+    dict(is_owned=True, is_public=False),
+    dict(is_owned=False, is_public=False),
+    dict(min_words=20),
+    dict(is_owned=False, min_words=10),
+]
+
+
+def test_plan_reads_only_own_and_public_wordbooks():
+    plan = plan_wordbook_search(UID, None, None, None, "created_at")
+    assert [query.filters for query in plan.queries] == [[("owner_id", "==", UID)], [("is_public", "==", True)]]
+    assert [query.exclude_owner_id for query in plan.queries] == [None, UID]
+
+    plan = plan_wordbook_search(UID, True, True, None, "created_at")
+    assert [query.filters for query in plan.queries] == [[("owner_id", "==", UID), ("is_public", "==", True)]]
+
+    assert plan_wordbook_search(UID, False, False, None, "created_at").queries == []
+
+
+def test_plan_filters_min_words_on_the_server_only_when_sorting_by_it():
+    plan = plan_wordbook_search(UID, True, None, 10, "num_words")
+    assert plan.queries[0].filters == [("is_public", "==", True), ("num_words", ">=", 10)]
+    assert plan.min_words is None
+
+    plan = plan_wordbook_search(UID, True, None, 10, "name")
+    assert plan.queries[0].filters == [("is_public", "==", True)]
+    assert plan.min_words == 10
+
+
+@pytest.mark.parametrize("conditions", CONDITIONS)
+@pytest.mark.parametrize("sort_by,sort_order", [("created_at", "desc"), ("name", "asc"), ("num_words", "desc"), ("updated_at", "asc")])
+def test_stream_merges_queries_in_sort_order(db, conditions, sort_by, sort_order):
+    plan = plan_wordbook_search(UID, conditions.get("is_public"), conditions.get("is_owned"), conditions.get("min_words"), sort_by)
+    streamed = [wordbook["id"] for wordbook in stream_wordbooks(db, plan, sort_by, sort_order)]
+    # 自分の公開単語帳は2つのクエリの両方に含まれるが、1回だけ返す
+    assert streamed == ordered(visible(db, **conditions), sort_by, sort_order)
+
+
+@pytest.mark.parametrize("conditions", CONDITIONS)
+def test_stream_continues_after_cursor(db, conditions):
+    plan = plan_wordbook_search(UID, conditions.get("is_public"), conditions.get("is_owned"), conditions.get("min_words"), "created_at")
+    expected = ordered(visible(db, **conditions), "created_at", "desc")
+    pages, after = [], None
+    while True:
+        page = []
+        for wordbook in stream_wordbooks(db, plan, "created_at", "desc", after):
+            page.append(wordbook)
+            if len(page) == 4:
+                break
+        if not page:
+            break
+        pages.extend(wordbook["id"] for wordbook in page)
+        after = (page[-1]["created_at"], page[-1]["id"])
+    assert pages == expected
+
+
+def test_stream_stops_reading_when_the_caller_stops(db):
+    plan = plan_wordbook_search(UID, None, None, None, "created_at")
+    stream = stream_wordbooks(db, plan, "created_at", "desc")
+    [next(stream) for _ in range(3)]
+    assert db.reads < 10
+
+
+@pytest.mark.parametrize("conditions", [conditions for conditions in CONDITIONS if "min_words" not in conditions])
+def test_count_matches_the_stream(db, conditions):
+    plan = plan_wordbook_search(UID, conditions.get("is_public"), conditions.get("is_owned"), None, "created_at")
+    db.reads = 0
+    assert count_wordbooks(db, plan) == len(visible(db, **conditions))
+    # ドキュメントは読み込まず、集計クエリ (自分の単語帳を差し引く分を含む) だけを使う
+    assert db.reads <= 3
+
+
+def test_count_is_unknown_when_filtering_in_the_application(db):
+    plan = plan_wordbook_search(UID, None, None, 10, "created_at")
+    assert count_wordbooks(db, plan) is None
+    plan = plan_wordbook_search(UID, None, None, 10, "num_words")
+    assert count_wordbooks(db, plan) == len(visible(db, min_words=10))
+
+
+async def search(db, **params):
+    defaults = dict(
+        q=None, is_public=None, is_owned=None, min_words=None, sort_by="created_at", sort_order="desc",
+        page=1, limit=5, cursor=None,
+    )
+    return await wordbook_endpoints.search_wordbooks(**{**defaults, **params}, db=db, uid=UID)
+
+
+async def test_search_without_index_pages_by_offset_and_cursor(db, monkeypatch):
+    monkeypatch.setattr(wordbook_endpoints.wordbook_search, "get_wordbook_search_index", lambda: None)
+    expected = ordered(visible(db), "created_at", "desc")
+
+    first = await search(db)
+    assert [wordbook.id for wordbook in first.wordbooks] == expected[:5]
+    assert first.total == len(expected)
+    assert first.total_pages == 4
+    assert first.has_next and not first.has_prev
+
+    by_offset = await search(db, page=2)
+    by_cursor = await search(db, cursor=first.next_cursor)
+    assert [wordbook.id for wordbook in by_offset.wordbooks] == expected[5:10]
+    assert [wordbook.id for wordbook in by_cursor.wordbooks] == expected[5:10]
+    assert by_cursor.next_cursor == by_offset.next_cursor
+    # カーソルで続きを読むときは総数を数えない
+    assert by_cursor.total is None and by_cursor.total_pages is None
+    assert by_cursor.has_prev
+
+    last = await search(db, page=4)
+    assert [wordbook.id for wordbook in last.wordbooks] == expected[15:]
+    assert not last.has_next and last.next_cursor is None
+
+
+async def test_search_without_index_does_not_count_text_queries(db, monkeypatch):
+    monkeypatch.setattr(wordbook_endpoints.wordbook_search, "get_wordbook_search_index", lambda: None)
+    result = await search(db, q="単語帳 0")
+    assert result.wordbooks
+    assert {wordbook.id for wordbook in result.wordbooks} <= {wordbook["id"] for wordbook in visible(db)}
+    assert all("単語帳0" in wordbook.name.replace(" ", "") for wordbook in result.wordbooks)
+    assert result.total is None and result.total_pages is None
+
+
+async def test_search_rejects_cursor_for_another_sort(db, monkeypatch):
+    monkeypatch.setattr(wordbook_endpoints.wordbook_search, "get_wordbook_search_index", lambda: None)
+    cursor = encode_cursor("name", "asc", "単語帳 01", "b01")
+    with pytest.raises(HTTPException) as error:
+        await search(db, cursor=cursor)
+    assert error.value.status_code == 400
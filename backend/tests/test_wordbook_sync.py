@@ -0,0 +1,145 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.services import wordbook_sync
+from app.services.wordbook_search import WORDBOOK_FIELDS, WordbookSearchIndex
+from app.services.wordbook_sync import TOMBSTONE_COLLECTION, WordbookViewSync, tombstone
+
+from .fakes import FakeFirestore
+
+
+def make_wordbook(i: int, updated_at: datetime, **fields) -> dict:
+    return {
+        "id": f"b{i:02d}",
+        "name": f"単語帳 {i}",
+        "user_name": "user",
+        "owner_id": "alice",
+        "is_public": True,
+        "num_words": i,
+        "description": None,
+        "created_at": updated_at,
+        "updated_at": updated_at,
+        **fields,
+    }
+
+
+@pytest.fixture
+def db(monkeypatch):
+    db = FakeFirestore()
+    monkeypatch.setattr(wordbook_sync.firestore, "client", lambda: db)
+    old = datetime.now() - timedelta(days=1)
+    for i in range(20):
+        db.collection("wordbooks").document(f"b{i:02d}").set(make_wordbook(i, old))
+    return db
+
+
+def num_words(sync: WordbookViewSync, wordbook_id: str) -> int:
+    return sync.view.get(wordbook_id)["num_words"]
+
+
+async def test_change_during_rebuild_is_not_applied_twice(db):
+    sync = WordbookViewSync("検索インデックス", WordbookSearchIndex, field_paths=WORDBOOK_FIELDS)
+    await sync.rebuild()
+    load_all = sync.load_all
+
+    def load_all_with_concurrent_change():
+        # 読み込みの時点で単語の追加はコミット済み (読み込んだ内容に含まれている) だが、
+        # 追加したリクエストがビューに反映するのは読み込みの後になる
+        db.data["wordbooks"]["b03"]["num_words"] += 1
+        rows = load_all()
+        sync.adjust_num_words("b03", 1)
+        return rows
+
+    sync.load_all = load_all_with_concurrent_change
+    await sync.rebuild()
+    assert num_words(sync, "b03") == 4
+
+
+async def test_change_during_refresh_uses_the_current_value(db):
+    sync = WordbookViewSync("検索インデックス", WordbookSearchIndex, field_paths=WORDBOOK_FIELDS)
+    await sync.rebuild()
+    load_changes = sync.load_changes
+
+    def load_changes_with_concurrent_change(since):
+        changed = load_changes(since)
+        # 差分を読み込んだ後に、このインスタンスで単語が削除された
+        db.data["wordbooks"]["b05"]["num_words"] -= 1
+        sync.adjust_num_words("b05", -1)
+        return changed
+
+    sync.load_changes = load_changes_with_concurrent_change
+    await sync.refresh()
+    assert num_words(sync, "b05") == 4
+
+
+async def test_refresh_reads_only_changed_and_deleted_wordbooks(db):
+    sync = WordbookViewSync("検索インデックス", WordbookSearchIndex, field_paths=WORDBOOK_FIELDS)
+    await sync.rebuild()
+    assert len(sync.view) == 20
+
+    # 他のインスタンスでの変更
+    now = datetime.now()
+    db.collection("wordbooks").document("b01").update({"name": "ビジネス英語", "updated_at": now})
+    db.collection("wordbooks").document("b02").delete()
+    db.collection(TOMBSTONE_COLLECTION).document("b02").set(tombstone("b02", now))
+    db.collection("wordbooks").document("b30").set(make_wordbook(30, now))
+
+    db.reads = 0
+    await sync.refresh()
+    assert db.reads == 3
+    assert sync.view.get("b01")["name"] == "ビジネス英語"
+    assert sync.view.get("b02") is None
+    assert sync.view.get("b30") is not None
+    assert len(sync.view) == 20
+
+    db.reads = 0
+    version = sync.version
+    await sync.refresh()
+    # 前回の同期の直前 (時計のずれの分) に更新された単語帳だけを読み直す
+    assert db.reads == 3
+    assert sync.version == version + 1
+
+
+async def test_refresh_removes_wordbooks_leaving_the_filter(db):
+    # 公開単語帳だけを持つビューでも、非公開になった単語帳を外せるように、差分は全単語帳から読む
+    class PublicOnly(WordbookSearchIndex):
+        def upsert(self, wordbook):
+            if wordbook.get("is_public"):
+                super().upsert(wordbook)
+            else:
+                self.remove(wordbook["id"])
+
+    db.collection("wordbooks").document("b07").update({"is_public": False})
+    sync = WordbookViewSync("公開単語帳", PublicOnly, filters=[("is_public", "==", True)])
+    await sync.rebuild()
+    assert sync.view.get("b07") is None
+    db.collection("wordbooks").document("b08").update({"is_public": False, "updated_at": datetime.now()})
+    await sync.refresh()
+    assert sync.view.get("b08") is None
+
+
+async def test_local_changes_apply_immediately(db):
+    sync = WordbookViewSync("検索インデックス", WordbookSearchIndex, field_paths=WORDBOOK_FIELDS)
+    sync.adjust_num_words("b01", 1)  # ビューがないうちは何もしない
+    await sync.rebuild()
+    version = sync.version
+    sync.adjust_num_words("b01", 2)
+    sync.upsert(make_wordbook(40, datetime.now()))
+    sync.remove("b04")
+    assert num_words(sync, "b01") == 3
+    assert sync.view.get("b40") is not None and sync.view.get("b04") is None
+    assert sync.version == version + 3
+
+
+async def test_failed_rebuild_keeps_the_current_view(db):
+    sync = WordbookViewSync("検索インデックス", WordbookSearchIndex, field_paths=WORDBOOK_FIELDS)
+    await sync.rebuild()
+    view = sync.view
+
+    def fail():
+        raise RuntimeError("Firestoreに接続できません")
+
+    sync.load_all = fail
+    await sync.rebuild()
+    assert sync.view is view
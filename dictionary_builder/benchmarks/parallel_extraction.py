@@ -0,0 +1,53 @@
+"""
+WordNet抽出の並列化ベンチマーク。
+
+同じ単語リストについて、ワーカープロセス数を変えながら統合済みドキュメントの作成
+(補足データの整形 + WordNetの抽出 + 統合) を行い、処理速度と1プロセスに対する倍率を比較する。
+Firestoreへの書き込みは行わない。
+
+単語は `--supplement` に補足データのTSVを指定した場合はその見出し語、
+指定しない場合はWordNetの見出し語から `--words` 語を使う。
+
+実行方法 (dictionary_builder ディレクトリで):
+    python -m benchmarks.parallel_extraction --words 20000 --workers 1,2,4,8
+    python -m benchmarks.parallel_extraction --supplement data/raw/supplement.tsv
+"""
+import argparse
+import os
+import time
+
+from nltk.corpus import wordnet as wn
+
+from parsers.supplement_parser import load_supplement_data
+from pipeline.extraction import extract_records
+
+
+def main():
+    parser = argparse.ArgumentParser(description="WordNet抽出の並列化ベンチマーク")
+    parser.add_argument("--supplement", help="補足データのTSVファイル")
+    parser.add_argument("--words", type=int, default=20000, help="WordNetから使う見出し語の数")
+    parser.add_argument("--workers", default=",".join(str(n) for n in sorted({1, 2, 4, os.cpu_count() or 1})),
+                        help="計測するプロセス数 (カンマ区切り)")
+    parser.add_argument("--chunk-size", type=int, default=200)
+    args = parser.parse_args()
+
+    if args.supplement:
+        supplement_data = load_supplement_data(args.supplement)
+    else:
+        lemma_names = sorted({name.replace('_', ' ') for name in wn.all_lemma_names()})[:args.words]
+        supplement_data = {word: [] for word in lemma_names}
+    word_keys = sorted(supplement_data)
+    print(f"単語数: {len(word_keys)} | CPUコア数: {os.cpu_count()}")
+
+    baseline = None
+    for workers in [int(n) for n in args.workers.split(",")]:
+        started = time.perf_counter()
+        count = sum(1 for _ in extract_records(((word, supplement_data[word]) for word in word_keys), {}, workers, args.chunk_size))
+        elapsed = time.perf_counter() - started
+        rate = count / elapsed
+        baseline = baseline or rate
+        print(f"workers={workers:<3} {elapsed:8.2f}秒 | {rate:8,.0f} 語/秒 | x{rate / baseline:.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+"""
+辞書ビルド全体のベンチマーク。
+
+指定した行数の合成の補足データを作り、Firestoreに書き込まない書き込み先 (`--sink null`) で
+build_database.py と同じ処理 (読み込み・WordNetの抽出・統合・差分の計算・変化形の対応表) を
+実行する。段階ごとの経過時間・CPU時間・処理速度・ピークRSSをログに出力し、`--output` を
+指定すればJSONで保存するので、ビルド処理の変更前後を同じ条件で比較できる。
+`--` より後ろの引数はそのまま build_database.py に渡す。
+
+実行方法 (dictionary_builder ディレクトリで):
+    python -m benchmarks.pipeline --lines 200000 --output before.json
+    python -m benchmarks.pipeline --lines 200000 --output after.json -- --workers 4 --profile build.prof
+"""
+import argparse
+import json
+import os
+import tempfile
+
+import build_database
+from benchmarks.supplement_parser import write_synthetic_supplement
+
+
+def main():
+    parser = argparse.ArgumentParser(description="辞書ビルド全体のベンチマーク")
+    parser.add_argument("--lines", type=int, default=100000, help="合成の補足データの行数")
+    parser.add_argument("--shuffled", action="store_true", help="補足データを単語順に並べない (外部ソートを含めて計測する)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="計測結果のJSONの保存先")
+    parser.add_argument("build_args", nargs=argparse.REMAINDER, help="build_database.py に渡す引数 (-- の後ろに書く)")
+    args = parser.parse_args()
+    build_args = [arg for arg in args.build_args if arg != "--"]
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        supplement_path = os.path.join(tmp_dir, "supplement.tsv")
+        write_synthetic_supplement(supplement_path, args.lines, args.seed, args.shuffled)
+        timings_path = args.output or os.path.join(tmp_dir, "timings.json")
+        # 辞書ファイルとマニフェストは書き出さない (前回のビルド結果との差分にならないよう、毎回すべて追加として扱う)
+        os.environ.setdefault("DICTIONARY_ARTIFACT_PATH", "")
+        build_database.main([
+            "--supplement", supplement_path,
+            "--sink", "null",
+            "--manifest", "",
+            "--timings-json", timings_path,
+            *build_args,
+        ])
+        with open(timings_path, encoding='utf-8') as f:
+            summary = json.load(f)
+
+    print(f"補足データ: {args.lines:,}行 | 合計 {summary['total_seconds']:.2f}秒 | ピークRSS {summary['peak_rss_mb']:,.0f} MB")
+    for name, stage in summary["stages"].items():
+        rate = f"{stage['per_second']:10,.0f} 件/秒" if stage["per_second"] else " " * 15
+        print(f"  {name:<20} {stage['seconds']:8.2f}秒 | CPU {stage['cpu_seconds']:8.2f}秒 | {rate}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""
+補足データのパーサーのベンチマーク。
+
+同じ補足データについて、ファイル全体を辞書に読み込む従来のパーサー (`load_supplement_data`
++ 単語の並べ替え) と、単語順に1語ずつ返すストリーミングパーサー (`iter_supplement_groups`) の
+処理速度 (行/秒) と最大メモリ使用量 (ピークRSS) を比較する。ピークRSSはプロセス単位の値なので、
+パーサーごとに別のプロセスで計測する。ストリーミングパーサーは単語順に並んだファイルと、
+外部ソートが必要な並んでいないファイルの両方で計測する。
+
+`--supplement` に補足データのTSVを指定しない場合は、`--lines` 行の合成データを作って使う。
+
+実行方法 (dictionary_builder ディレクトリで):
+    python -m benchmarks.supplement_parser --lines 2000000
+    python -m benchmarks.supplement_parser --supplement data/raw/supplement.tsv
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import resource
+import string
+import sys
+import tempfile
+import time
+
+from parsers.supplement_parser import iter_supplement_groups, load_supplement_data
+
+
+def write_synthetic_supplement(path: str, lines: int, seed: int, shuffled: bool) -> None:
+    """1語あたり平均2行の合成データを書き出す (shuffled なら行の順序をばらばらにする)"""
+    rng = random.Random(seed)
+    entries = []
+    word = ""
+    for i in range(lines):
+        if i % 2 == 0:
+            word = f"{''.join(rng.choices(string.ascii_lowercase, k=rng.randint(3, 10)))}{i // 2}"
+        entries.append(
+            f'word={word} noun="{rng.choice(["本", "机", "道具"])}，{rng.choice(["物", "人"])}" '
+            f'definition="a synthetic entry number {i}" example="This is example {i}."\n'
+        )
+    if shuffled:
+        rng.shuffle(entries)
+    else:
+        entries.sort(key=lambda line: line[5:].split(' ', 1)[0].lower())
+    with open(path, 'w', encoding='utf-8') as f:
+        f.writelines(entries)
+
+
+def _peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux は KB、macOS はバイト単位
+    return peak / 1024 / 1024 if sys.platform == "darwin" else peak / 1024
+
+
+def _run(mode: str, path: str, buffer_lines: int, results) -> None:
+    started = time.perf_counter()
+    words = 0
+    if mode == "load":
+        supplement_data = load_supplement_data(path)
+        for word in sorted(supplement_data):
+            words += 1
+    else:
+        for _ in iter_supplement_groups(path, buffer_lines=buffer_lines):
+            words += 1
+    results.put((time.perf_counter() - started, words, _peak_rss_mb()))
+
+
+def measure(mode: str, path: str, buffer_lines: int) -> tuple[float, int, float]:
+    """別プロセスでパーサーを実行し、(経過秒数, 語数, ピークRSS MB) を返す"""
+    results = multiprocessing.Queue()
+    process = multiprocessing.Process(target=_run, args=(mode, path, buffer_lines, results))
+    process.start()
+    result = results.get()
+    process.join()
+    return result
+
+
+def count_lines(path: str) -> int:
+    with open(path, 'r', encoding='utf-8-sig') as f:
+        return sum(1 for line in f if line.strip())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="補足データのパーサーのベンチマーク")
+    parser.add_argument("--supplement", help="補足データのTSVファイル")
+    parser.add_argument("--lines", type=int, default=1000000, help="合成データの行数")
+    parser.add_argument("--buffer-lines", type=int, default=200000, help="外部ソートで一度にメモリに載せる行数")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        if args.supplement:
+            cases = [("入力ファイル", args.supplement)]
+        else:
+            cases = []
+            for name, shuffled in [("単語順", False), ("順不同", True)]:
+                path = os.path.join(tmp_dir, f"supplement_{'shuffled' if shuffled else 'sorted'}.tsv")
+                write_synthetic_supplement(path, args.lines, args.seed, shuffled)
+                cases.append((name, path))
+
+        for name, path in cases:
+            lines = count_lines(path)
+            print(f"[{name}] {lines:,}行 | {os.path.getsize(path) / 1024 / 1024:.1f} MB")
+            for mode in ["load", "stream"]:
+                seconds, words, peak_mb = measure(mode, path, args.buffer_lines)
+                print(f"  {mode:<7} {seconds:8.2f}秒 | {lines / seconds:10,.0f} 行/秒 | {words:,}語 | ピークRSS {peak_mb:8.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""
+Firestoreへの書き込み速度のベンチマーク。
+
+Firestoreエミュレーターに合成ドキュメントを書き込み、BulkWriterによる並列書き込み
+(`BulkUploader`) と、以前の「500件ずつバッチをコミットして1秒待つ」方式の書き込み速度
+(件/秒) を比較する。本番のFirestoreに書き込まないよう、FIRESTORE_EMULATOR_HOST が
+設定されていない場合は実行しない。
+
+実行方法 (dictionary_builder ディレクトリで):
+    firebase emulators:start --only firestore   # 別のターミナルで
+    FIRESTORE_EMULATOR_HOST=localhost:8080 python -m benchmarks.upload --docs 20000
+"""
+import argparse
+import os
+import sys
+import time
+
+from google.cloud import firestore
+
+from pipeline.timing import StageTimer
+from pipeline.upload import BulkUploader
+
+
+def synthetic_document(i: int) -> dict:
+    """dictionary コレクションのドキュメントに近い大きさの合成データ"""
+    return {
+        "word": f"word{i}",
+        "part_of_speech": ["noun", "verb"],
+        "definitions": [{"pos": "noun", "def": f"a synthetic definition number {i} " * 3}] * 3,
+        "translations": {"noun": ["単語", "言葉"]},
+        "raw_examples": [f"This is example sentence {i}."] * 2,
+        "synonyms": [f"synonym{i}", f"alternative{i}"],
+        "phonetics": None,
+    }
+
+
+def upload_with_batches(db, collection: str, docs: int) -> None:
+    """以前の方式: 500件ずつバッチをコミットし、コミットごとに1秒待つ"""
+    batch = db.batch()
+    for i in range(docs):
+        batch.set(db.collection(collection).document(f"word{i}"), synthetic_document(i))
+        if (i + 1) % 500 == 0:
+            batch.commit()
+            batch = db.batch()
+            time.sleep(1)
+    batch.commit()
+
+
+def upload_with_bulk_writer(db, collection: str, docs: int, max_ops_per_second: int) -> None:
+    uploader = BulkUploader(db, StageTimer(), max_ops_per_second=max_ops_per_second)
+    for i in range(docs):
+        uploader.set(collection, f"word{i}", synthetic_document(i))
+    uploader.flush()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Firestoreへの書き込み速度のベンチマーク")
+    parser.add_argument("--docs", type=int, default=20000, help="書き込むドキュメント数")
+    parser.add_argument("--modes", default="batch,bulk", help="計測する方式 (batch: 以前の方式, bulk: BulkWriter)")
+    parser.add_argument("--max-ops-per-second", type=int, default=10000)
+    args = parser.parse_args()
+
+    if not os.getenv("FIRESTORE_EMULATOR_HOST"):
+        sys.exit("FIRESTORE_EMULATOR_HOST を設定して、Firestoreエミュレーターに対して実行してください。")
+    db = firestore.Client(project=os.getenv("GOOGLE_CLOUD_PROJECT", "demo-dictionary"))
+
+    print(f"ドキュメント数: {args.docs}")
+    for mode in args.modes.split(","):
+        collection = f"benchmark_{mode}_{int(time.time())}"
+        started = time.perf_counter()
+        if mode == "batch":
+            upload_with_batches(db, collection, args.docs)
+        else:
+            upload_with_bulk_writer(db, collection, args.docs, args.max_ops_per_second)
+        elapsed = time.perf_counter() - started
+        print(f"{mode:<6} {elapsed:8.2f}秒 | {args.docs / elapsed:8,.0f} 件/秒")
+
+
+if __name__ == "__main__":
+    main()
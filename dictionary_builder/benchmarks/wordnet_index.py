@@ -0,0 +1,73 @@
+"""
+WordNetの索引と単語ごとの問い合わせの比較ベンチマーク。
+
+同じ単語リストについて、単語ごとに `wn.synsets` を呼ぶ従来の抽出
+(`get_wordnet_data_structured`) と、WordNet全体を1回だけ走査して作る索引
+(`WordNetIndex`) の作成・検索にかかる時間を比較する。あわせて索引の保存・読み込み時間と
+ファイルサイズを計測し、両者の抽出結果が一致することを確認する。
+
+単語は `--supplement` に補足データのTSVを指定した場合はその見出し語、
+指定しない場合はWordNetの見出し語から `--words` 語を使う。
+
+実行方法 (dictionary_builder ディレクトリで):
+    python -m benchmarks.wordnet_index --words 20000
+    python -m benchmarks.wordnet_index --supplement data/raw/supplement.tsv
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from nltk.corpus import wordnet as wn
+
+from parsers.supplement_parser import load_supplement_data
+from parsers.wordnet_index import WordNetIndex, load_or_build_wordnet_index
+from parsers.wordnet_parser import get_wordnet_data_structured
+
+
+def main():
+    parser = argparse.ArgumentParser(description="WordNetの索引と単語ごとの問い合わせの比較ベンチマーク")
+    parser.add_argument("--supplement", help="補足データのTSVファイル")
+    parser.add_argument("--words", type=int, default=20000, help="WordNetから使う見出し語の数")
+    args = parser.parse_args()
+
+    if args.supplement:
+        words = sorted(load_supplement_data(args.supplement))
+    else:
+        words = sorted({name.replace('_', ' ') for name in wn.all_lemma_names()})[:args.words]
+    # WordNetの読み込み時間を計測に含めないよう、先に読み込んでおく
+    wn.ensure_loaded()
+    print(f"単語数: {len(words)}")
+
+    started = time.perf_counter()
+    per_word = [get_wordnet_data_structured(word) for word in words]
+    per_word_seconds = time.perf_counter() - started
+    print(f"単語ごとの問い合わせ {per_word_seconds:8.2f}秒 | {len(words) / per_word_seconds:10,.0f} 語/秒")
+
+    started = time.perf_counter()
+    index = WordNetIndex.build()
+    build_seconds = time.perf_counter() - started
+    started = time.perf_counter()
+    indexed = [index.lookup(word) for word in words]
+    lookup_seconds = time.perf_counter() - started
+    print(f"索引の作成           {build_seconds:8.2f}秒 | {len(index.lemma_synsets):,}語, {len(index.synsets):,} synsets")
+    print(f"索引からの検索       {lookup_seconds:8.2f}秒 | {len(words) / lookup_seconds:10,.0f} 語/秒")
+    print(f"速度比 (作成を含む): x{per_word_seconds / (build_seconds + lookup_seconds):.2f} | "
+          f"(保存済みの索引を使う場合): x{per_word_seconds / lookup_seconds:.2f}")
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "wordnet_index.pickle")
+        started = time.perf_counter()
+        index.save(path)
+        save_seconds = time.perf_counter() - started
+        started = time.perf_counter()
+        load_or_build_wordnet_index(path)
+        load_seconds = time.perf_counter() - started
+        print(f"保存 {save_seconds:.2f}秒 | 読み込み {load_seconds:.2f}秒 | {os.path.getsize(path) / 1024 / 1024:.1f} MB")
+
+    mismatches = [word for word, a, b in zip(words, per_word, indexed) if a != b]
+    print(f"結果の不一致: {len(mismatches)}語" + (f" (例: {', '.join(mismatches[:10])})" if mismatches else ""))
+
+
+if __name__ == "__main__":
+    main()
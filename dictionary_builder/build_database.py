@@ -1,86 +1,259 @@
+import argparse
+import cProfile
+import json
 import logging
 import os
-import time
+import pstats
+from typing import Optional
 
 # Firestoreライブラリをインポート
 import firebase_admin
 from firebase_admin import credentials, firestore
+from google.cloud import firestore as cloud_firestore
 
-from parsers.supplement_parser import load_supplement_data, format_from_supplement
-from parsers.wordnet_parser import get_wordnet_data_structured
+from parsers.supplement_parser import iter_supplement_groups
+from parsers.pronunciation_parser import load_pronunciations
+from parsers.inflection_parser import build_inflection_map
+from parsers.wordnet_index import load_or_build_wordnet_index
+from exporters.sqlite_exporter import SQLiteArtifactWriter, can_resume
+from pipeline.checkpoint import BuildCheckpoint, build_fingerprint
+from pipeline.extraction import extract_records
+from pipeline.manifest import CollectionDiff, PublishManifest
+from pipeline.timing import StageTimer
+from pipeline.upload import BulkUploader, NullUploader
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
-def main():
-    # 1. Firebaseの初期化
-    try:
-        creds_json_str = os.getenv("FIREBASE_CREDENTIALS_JSON")
-        if not creds_json_str:
-            raise ValueError("環境変数 'FIREBASE_CREDENTIALS_JSON' が設定されていません。")
-
-        service_account_info = json.loads(creds_json_str)
-        cred = credentials.Certificate(service_account_info)
-        firebase_admin.initialize_app(cred)
-        db = firestore.client()
-        logging.info("Firebaseの初期化に成功しました。")
-    except Exception as e:
-        logging.error(f"Firebaseの初期化に失敗: {e}")
+def parse_args(argv: Optional[list[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="補足データ・WordNet・発音データから辞書を構築してFirestoreに登録する")
+    parser.add_argument("--supplement", default=os.getenv("SUPPLEMENT_FILE", os.path.join("data", "raw", "supplement.tsv")),
+                        help="補足データのTSVファイル")
+    parser.add_argument("--workers", type=int, default=int(os.getenv("BUILD_WORKERS", "0")),
+                        help="WordNet抽出のプロセス数 (0ならCPUコア数、1なら並列化しない)")
+    parser.add_argument("--chunk-size", type=int, default=int(os.getenv("BUILD_CHUNK_SIZE", "200")),
+                        help="1つの作業単位にまとめる単語数")
+    parser.add_argument("--wordnet-index", default=os.getenv("WORDNET_INDEX_PATH", os.path.join("data", "wordnet_index.pickle")),
+                        help="WordNetの索引の保存先 (あれば読み込んで再利用する。空文字なら保存しない)")
+    parser.add_argument("--per-word-wordnet", action="store_true",
+                        help="索引を使わず、単語ごとにWordNetを問い合わせる (比較用)")
+    parser.add_argument("--sort-buffer-lines", type=int, default=int(os.getenv("SUPPLEMENT_SORT_BUFFER_LINES", "200000")),
+                        help="補足データが単語順に並んでいない場合に、外部ソートで一度にメモリに載せる行数")
+    parser.add_argument("--supplement-sorted", action="store_true",
+                        help="補足データが単語順に並んでいるものとして、並び順の確認を省く (並んでいなければエラー)")
+    parser.add_argument("--manifest", default=os.getenv("PUBLISH_MANIFEST_PATH", os.path.join("data", "publish_manifest.json")),
+                        help="前回Firestoreに登録した内容のマニフェスト (追加・変更・削除されたドキュメントだけを書き込む)")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="Firestoreには書き込まず、前回の登録内容との差分の件数だけを表示する")
+    parser.add_argument("--max-ops-per-second", type=int, default=int(os.getenv("UPLOAD_MAX_OPS_PER_SECOND", "10000")),
+                        help="Firestoreへの書き込み速度の上限 (毎秒500件から5分ごとに50%%ずつ上げ、この値で止める)")
+    parser.add_argument("--full", action="store_true",
+                        help="変更のないドキュメントも含めてすべて書き込む (マニフェストは更新する)")
+    parser.add_argument("--resume", action="store_true",
+                        help="前回途中で止まったビルドを、チェックポイントから再開する (書き込み済みの単語は抽出もやり直さない)")
+    parser.add_argument("--checkpoint", default=os.getenv("BUILD_CHECKPOINT_PATH", os.path.join("data", "build_checkpoint.jsonl")),
+                        help="チェックポイントの保存先")
+    parser.add_argument("--checkpoint-every", type=int, default=int(os.getenv("BUILD_CHECKPOINT_EVERY", "5000")),
+                        help="書き込みの完了を待ってチェックポイントを保存する間隔 (語数)")
+    parser.add_argument("--sink", choices=["firestore", "null"], default="firestore",
+                        help="書き込み先 (null なら書き込まずに件数だけを数え、マニフェストも更新しない。処理時間の計測用)")
+    parser.add_argument("--profile", help="cProfileの結果をこのパスに保存する (メインプロセスのみ。snakeviz などで表示できる)")
+    parser.add_argument("--timings-json", help="段階ごとの計測結果をJSONで保存するパス")
+    return parser.parse_args(argv)
+
+def init_firestore():
+    """
+    Firestoreのクライアントを作る。FIRESTORE_EMULATOR_HOST が設定されている場合は、
+    認証情報なしでエミュレーター (プロジェクトIDは GOOGLE_CLOUD_PROJECT) に接続する。
+    """
+    if os.getenv("FIRESTORE_EMULATOR_HOST"):
+        db = cloud_firestore.Client(project=os.getenv("GOOGLE_CLOUD_PROJECT", "demo-dictionary"))
+        logging.info(f"Firestoreエミュレーター ({os.getenv('FIRESTORE_EMULATOR_HOST')}) に接続します。")
+        return db
+
+    creds_json_str = os.getenv("FIREBASE_CREDENTIALS_JSON")
+    if not creds_json_str:
+        raise ValueError("環境変数 'FIREBASE_CREDENTIALS_JSON' が設定されていません。")
+
+    service_account_info = json.loads(creds_json_str)
+    cred = credentials.Certificate(service_account_info)
+    firebase_admin.initialize_app(cred)
+    db = firestore.client()
+    logging.info("Firebaseの初期化に成功しました。")
+    return db
+
+def main(argv: Optional[list[str]] = None):
+    args = parse_args(argv)
+    if not args.profile:
+        build(args)
         return
 
-    # 2. supplement.tsvからデータを読み込み
-    supplement_file = os.path.join("data", "raw", "supplement.tsv")
-    supplement_data = load_supplement_data(supplement_file)
-    
-    if not supplement_data:
-        logging.error("補足データが読み込めませんでした。処理を終了します。")
+    profiler = cProfile.Profile()
+    try:
+        profiler.runcall(build, args)
+    finally:
+        profiler.dump_stats(args.profile)
+        logging.info(f"cProfileの結果を保存しました: {args.profile}")
+        pstats.Stats(profiler).sort_stats("cumulative").print_stats(20)
+
+def build(args: argparse.Namespace):
+    timer = StageTimer()
+
+    # 1. Firebaseの初期化 (dry-run や書き込み先が null の場合は書き込まないので初期化しない)
+    db = None
+    if not args.dry_run and args.sink == "firestore":
+        try:
+            db = init_firestore()
+        except Exception as e:
+            logging.error(f"Firebaseの初期化に失敗: {e}")
+            return
+
+    # 2. supplement.tsvを単語順に1語ずつ読み込む (ファイル全体はメモリに載せない)
+    supplement_file = args.supplement
+    if not os.path.exists(supplement_file):
+        logging.error(f"補足ファイルが見つかりません: {supplement_file}。処理を終了します。")
         return
 
+    # Firestoreに書き込む場合は、書き込みの完了した単語をチェックポイントに記録して再開できるようにする
+    checkpoint = None
+    if db is not None:
+        fingerprint = build_fingerprint(supplement_file, args.per_word_wordnet, args.full)
+        checkpoint = BuildCheckpoint.open(args.checkpoint, fingerprint, args.resume)
+    resuming = checkpoint is not None and checkpoint.last_word is not None
+
+    # 並び順の確認 (必要なら外部ソート) は最初の1語を読み込む時点で行われる
+    supplement_groups = iter_supplement_groups(
+        supplement_file, presorted=True if args.supplement_sorted else None, buffer_lines=args.sort_buffer_lines)
+    if resuming:
+        # 書き込み済みの単語は、WordNetの抽出・統合の前に読み飛ばす
+        supplement_groups = (group for group in supplement_groups if not checkpoint.is_done(group[0]))
+    supplement_groups = timer.iterate("load_supplement", supplement_groups)
+
+    # 発音データ (CMUdict形式 または IPAのTSV) を読み込み
+    # 保存した発音があれば、バックエンドはリクエスト時にFree Dictionary APIを呼ばずに済む
+    pronunciation_file = os.getenv("PRONUNCIATION_FILE", os.path.join("data", "raw", "cmudict.dict"))
+    with timer.stage("load_pronunciations"):
+        pronunciations = load_pronunciations(pronunciation_file)
+
+    # WordNetを1回だけ走査した索引 (単語ごとの問い合わせの代わりに使う)
+    wordnet_index = None
+    if not args.per_word_wordnet:
+        with timer.stage("wordnet_index"):
+            wordnet_index = load_or_build_wordnet_index(args.wordnet_index or None)
+
+    # バックエンドに同梱する読み込み専用の辞書ファイル (空文字なら書き出さない。dry-run では書き出さない)
+    artifact_path = os.getenv("DICTIONARY_ARTIFACT_PATH", os.path.join("data", "dictionary.sqlite3"))
+    if artifact_path and resuming and not can_resume(artifact_path):
+        logging.warning("前回のビルドの辞書ファイルの一時ファイルがないか壊れているため、今回は辞書ファイルを書き出しません。")
+        artifact_path = ""
+    artifact = None
+    if artifact_path and not args.dry_run:
+        artifact = SQLiteArtifactWriter(artifact_path, resume=resuming, checkpointed=checkpoint is not None)
+
+    # 前回の登録内容と比べて、追加・変更されたドキュメントだけを書き込む
+    manifest = PublishManifest.load(args.manifest or None)
+    uploader = None
+    if db is not None:
+        uploader = BulkUploader(db, timer, max_ops_per_second=args.max_ops_per_second)
+    elif args.sink == "null" and not args.dry_run:
+        uploader = NullUploader(timer)
+
     # 3. Firestoreへのアップロード処理を開始
     logging.info("Firestoreへのデータ登録を開始します...")
     
-    # バッチ処理の準備
-    batch = db.batch()
-    
-    word_keys = sorted(list(supplement_data.keys()))
-    total_words = len(word_keys)
-
-    for i, word in enumerate(word_keys):
-        # データを整形・統合
-        final_data = format_from_supplement(supplement_data[word])
-        final_data['word'] = word
-        
-        wordnet_data = get_wordnet_data_structured(word)
-        
-        pos_from_supplement = set(final_data["part_of_speech"])
-        pos_from_wordnet = set(wordnet_data["part_of_speech"])
-        final_data["part_of_speech"] = sorted(list(pos_from_supplement.union(pos_from_wordnet)))
-
-        examples_from_supplement = set(final_data["raw_examples"])
-        examples_from_wordnet = set(wordnet_data["examples"])
-        final_data["raw_examples"] = sorted(list(examples_from_supplement.union(examples_from_wordnet)))
-        
-        final_data["definitions"].extend(wordnet_data["definitions"])
-        final_data["synonyms"] = sorted(list(wordnet_data["synonyms"]))
-
-        # 4. バッチに書き込み操作を追加
+    total_words = 0
+    # 変化形の対応表を作るために、見出し語ごとの品詞を記録しておく
+    headword_pos = {}
+    dictionary_diff = CollectionDiff("dictionary", manifest.published("dictionary"), args.full)
+    if resuming:
+        checkpoint.restore(dictionary_diff, headword_pos)
+        uploader.failed["dictionary"].update(checkpoint.failed)
+        total_words = len(headword_pos)
+    # 前回のチェックポイント以降に処理した {単語: (品詞, ハッシュ)}
+    pending_words = {}
+
+    def save_checkpoint(extraction_complete: bool = False):
+        """
+        書き込みの完了を待ってから、ここまでの結果をチェックポイントに記録する。
+        成功を確認できなかった単語は失敗として記録し、マニフェストに登録済みとして残さない (次回のビルドでやり直す)
+        """
+        with timer.stage("checkpoint"):
+            uploader.flush()
+            if artifact:
+                artifact.commit()
+            checkpoint.append(pending_words, dictionary_diff, uploader.failed["dictionary"], extraction_complete)
+        pending_words.clear()
+
+    # データを整形・統合 (統合はプロセスプールで並列に行い、統合済みのものから順に受け取る)
+    records = extract_records(supplement_groups, pronunciations, args.workers, args.chunk_size, wordnet_index)
+    for i, final_data in enumerate(timer.iterate("extract", records)):
+        word = final_data["word"]
+        headword_pos[word] = final_data["part_of_speech"]
+        total_words += 1
+
+        # 4. 内容が変わったドキュメントだけを書き込む (BulkWriterが速度を調整しながら並列に送信する)
         # ドキュメントIDは英単語そのもの（小文字）
-        doc_ref = db.collection("dictionary").document(word)
-        batch.set(doc_ref, final_data)
-        
-        # 5. 500件ごとに一度コミット（Firestoreのバッチ上限対策）
-        if (i + 1) % 500 == 0:
-            logging.info(f"進捗: {i + 1}/{total_words} | バッチをコミット中...")
-            batch.commit()
-            # バッチをリセット
-            batch = db.batch()
-            # レート制限を避けるために少し待機
-            time.sleep(1)
-
-    # 6. 最後に残ったバッチをコミット
-    logging.info("最後のバッチをコミット中...")
-    batch.commit()
-
-    logging.info(f"すべての処理が完了しました。合計 {total_words} 件のデータをFirestoreに登録しました。")
+        with timer.stage("diff", 1):
+            changed = dictionary_diff.check(word, final_data)
+        if changed and uploader:
+            uploader.set("dictionary", word, final_data)
+        if artifact:
+            with timer.stage("artifact", 1):
+                artifact.add(word, final_data)
+
+        if checkpoint:
+            pending_words[word] = (final_data["part_of_speech"], dictionary_diff.hashes[word])
+            if len(pending_words) >= args.checkpoint_every:
+                save_checkpoint()
+
+        if (i + 1) % 5000 == 0:
+            logging.info(f"進捗: {total_words}語")
+
+    if not total_words:
+        logging.error("補足データが読み込めませんでした。処理を終了します。")
+        return
+    if checkpoint and (pending_words or not checkpoint.extraction_complete):
+        save_checkpoint(extraction_complete=True)
+
+    # 5. 今回のビルド結果からなくなった単語を削除
+    if uploader:
+        for word in dictionary_diff.removed():
+            uploader.delete("dictionary", word)
+
+    # 6. 変化形 → 見出し語の対応表を作成して登録 (running → run, geese → goose など)
+    with timer.stage("inflections"):
+        inflection_map = build_inflection_map(headword_pos, wordnet_index)
+    inflection_diff = CollectionDiff("dictionary_inflections", manifest.published("dictionary_inflections"), args.full)
+    for form, lemmas in sorted(inflection_map.items()):
+        if inflection_diff.check(form, {"lemmas": lemmas}) and uploader:
+            uploader.set("dictionary_inflections", form, {"lemmas": lemmas})
+    if uploader:
+        for form in inflection_diff.removed():
+            uploader.delete("dictionary_inflections", form)
+
+    logging.info(f"前回の登録内容との差分: {dictionary_diff.summary()}")
+    logging.info(f"前回の登録内容との差分: {inflection_diff.summary()}")
+    if args.dry_run:
+        logging.info("dry-run のため、Firestoreには書き込まずに終了します。")
+        timer.report(args.timings_json)
+        return
+
+    # 7. すべての書き込みが完了するのを待ってからマニフェストを更新 (失敗した・成功を確認できなかったドキュメントは次回やり直す)
+    logging.info("残りの書き込みの完了を待っています...")
+    uploader.flush()
+    manifest.replace("dictionary", dictionary_diff.committed_hashes(uploader.failed["dictionary"]))
+    manifest.replace("dictionary_inflections", inflection_diff.committed_hashes(uploader.failed["dictionary_inflections"]))
+    if args.sink == "firestore":
+        manifest.save()
+    if checkpoint:
+        checkpoint.remove()
+
+    if artifact:
+        with timer.stage("artifact"):
+            artifact.add_inflections(inflection_map)
+            artifact.close()
+
+    logging.info(f"すべての処理が完了しました。合計 {total_words} 語のうち、{uploader.written} 件の書き込み・削除をFirestoreに反映しました。")
+    timer.report(args.timings_json)
 
 if __name__ == "__main__":
     main()
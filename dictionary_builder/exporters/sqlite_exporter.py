@@ -0,0 +1,122 @@
+import json
+import logging
+import os
+import sqlite3
+import time
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# バックエンドの読み込み処理と互換性のない変更をしたら上げる
+ARTIFACT_FORMAT_VERSION = "2"
+
+
+def temporary_path(path: str) -> str:
+    return f"{path}.tmp"
+
+
+def remove_temporary_files(path: str) -> None:
+    """一時ファイルと、そのWAL・共有メモリのファイルを削除する (古いWALが新しい一時ファイルに適用されないように)"""
+    tmp_path = temporary_path(path)
+    for file_path in (tmp_path, f"{tmp_path}-wal", f"{tmp_path}-shm", f"{tmp_path}-journal"):
+        if os.path.exists(file_path):
+            os.remove(file_path)
+
+
+def can_resume(path: str) -> bool:
+    """
+    前回のビルドの一時ファイルから再開できるかを確かめる。
+    一時ファイルがなければ False、あっても PRAGMA integrity_check に失敗すれば削除して False を返す。
+    """
+    tmp_path = temporary_path(path)
+    if not os.path.exists(tmp_path):
+        return False
+    try:
+        conn = sqlite3.connect(tmp_path)
+        try:
+            result = conn.execute("PRAGMA integrity_check").fetchall()
+            conn.execute("SELECT COUNT(*) FROM entries").fetchone()
+        finally:
+            conn.close()
+    except sqlite3.DatabaseError as e:
+        result = [(str(e),)]
+    if result == [("ok",)]:
+        return True
+    logging.warning(f"辞書ファイルの一時ファイルが壊れているため削除します: {tmp_path} ({result[0][0]})")
+    remove_temporary_files(path)
+    return False
+
+
+class SQLiteArtifactWriter:
+    """
+    辞書データを読み込み専用のSQLiteファイルとして書き出す。
+    一時ファイルに書き込み、close() の時点で本来のパスへ置き換えるため、
+    書き出し中のファイルをバックエンドが読むことはない。
+
+    checkpointed=True (ビルドを再開できるようにする場合) は、commit() した内容が途中で止まっても
+    壊れずに残るように、一時ファイルをWALモード・synchronous=FULL で書き込む。
+    そうでなければジャーナルを使わずに速く書き込む (途中で止まった一時ファイルは使わない)。
+    """
+
+    def __init__(self, path: str, resume: bool = False, checkpointed: bool = False):
+        self.path = path
+        self._tmp_path = temporary_path(path)
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # 再開する場合は、前回のビルドが途中まで書き込んだ一時ファイルを引き継ぐ
+        resume = resume and os.path.exists(self._tmp_path)
+        if not resume:
+            remove_temporary_files(path)
+        self._conn = sqlite3.connect(self._tmp_path)
+        if checkpointed or resume:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=FULL")
+        else:
+            self._conn.execute("PRAGMA journal_mode=OFF")
+            self._conn.execute("PRAGMA synchronous=OFF")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS entries (word TEXT PRIMARY KEY, data TEXT NOT NULL) WITHOUT ROWID")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS inflections (form TEXT PRIMARY KEY, lemmas TEXT NOT NULL) WITHOUT ROWID")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        self.count = self._conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0] if resume else 0
+        self.inflection_count = 0
+
+    def add(self, word: str, data: dict) -> None:
+        """1単語分のドキュメントを追加する (同じ単語は後から追加したもので上書き)"""
+        self._conn.execute(
+            "INSERT OR REPLACE INTO entries (word, data) VALUES (?, ?)",
+            (word, json.dumps(data, ensure_ascii=False, separators=(',', ':'))),
+        )
+        self.count += 1
+
+    def commit(self) -> None:
+        """ここまでに追加したドキュメントを一時ファイルに確定する (チェックポイント用)"""
+        self._conn.commit()
+
+    def add_inflections(self, inflection_map: dict[str, list[str]]) -> None:
+        """変化形 → 見出し語のリストの対応表を書き込む"""
+        self._conn.executemany(
+            "INSERT OR REPLACE INTO inflections (form, lemmas) VALUES (?, ?)",
+            ((form, json.dumps(lemmas, ensure_ascii=False)) for form, lemmas in inflection_map.items()),
+        )
+        self.inflection_count = len(inflection_map)
+
+    def close(self) -> None:
+        """メタ情報を書き込み、ファイルを最適化して本来のパスに置き換える"""
+        # 再開した場合、チェックポイント以降に書き込んだ単語を上書きしていることがあるので数え直す
+        self.count = self._conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+        self._conn.executemany(
+            "INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)",
+            [
+                ("format_version", ARTIFACT_FORMAT_VERSION),
+                ("built_at", str(int(time.time()))),
+                ("entry_count", str(self.count)),
+                ("inflection_count", str(self.inflection_count)),
+            ],
+        )
+        self._conn.commit()
+        self._conn.execute("VACUUM")
+        # バックエンドは読み込み専用で開くので、WALの内容を書き戻してから通常のジャーナルモードに戻す
+        self._conn.execute("PRAGMA journal_mode=DELETE")
+        self._conn.close()
+        os.replace(self._tmp_path, self.path)
+        logging.info(f"辞書アーティファクトを書き出しました: {self.path} ({self.count}語, {os.path.getsize(self.path) / 1024 / 1024:.1f} MB)")
@@ -0,0 +1,110 @@
+import logging
+import re
+from collections import defaultdict
+from typing import Optional
+from nltk.corpus import wordnet as wn
+
+from parsers.wordnet_index import WordNetIndex
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+WN_POS_MAP = {'noun': 'n', 'verb': 'v', 'adjective': 'a', 'adverb': 'r'}
+VOWELS = set('aeiou')
+# 末尾の子音を重ねる単語 (例: run → running, big → bigger)。w/x/y で終わる単語は重ねない
+DOUBLING_PATTERN = re.compile(r'(?:^|[^aeiou])[aeiou]([^aeiouwxy])$')
+VOWEL_GROUP_PATTERN = re.compile(r'[aeiouy]+')
+
+
+def _double_final(lemma: str) -> bool:
+    """1音節で「子音+短母音+子音」で終わる単語かどうか (簡易判定。open や visit は重ねない)"""
+    return len(VOWEL_GROUP_PATTERN.findall(lemma)) == 1 and bool(DOUBLING_PATTERN.search(lemma))
+
+
+def _plural(lemma: str) -> str:
+    if lemma.endswith(('s', 'x', 'z', 'ch', 'sh')):
+        return lemma + 'es'
+    if lemma.endswith('y') and len(lemma) > 1 and lemma[-2] not in VOWELS:
+        return lemma[:-1] + 'ies'
+    return lemma + 's'
+
+
+def _with_suffix(lemma: str, suffix: str) -> str:
+    """-ed / -er / -est を付ける (e で終わる語・子音+y・子音の重複を考慮)"""
+    if lemma.endswith('e'):
+        return lemma + suffix[1:]
+    if lemma.endswith('y') and len(lemma) > 1 and lemma[-2] not in VOWELS:
+        return lemma[:-1] + 'i' + suffix
+    if _double_final(lemma):
+        return lemma + lemma[-1] + suffix
+    return lemma + suffix
+
+
+def _present_participle(lemma: str) -> str:
+    if lemma.endswith('ie'):
+        return lemma[:-2] + 'ying'
+    if lemma.endswith('e') and not lemma.endswith(('ee', 'ye', 'oe')) and len(lemma) > 2:
+        return lemma[:-1] + 'ing'
+    if _double_final(lemma):
+        return lemma + lemma[-1] + 'ing'
+    return lemma + 'ing'
+
+
+def regular_inflections(lemma: str, pos: str) -> set[str]:
+    """品詞に応じた規則変化形を作る (名詞の複数形、動詞の三単現・過去形・現在分詞、形容詞の比較級・最上級)"""
+    if ' ' in lemma or not lemma.isalpha():
+        return set()
+    if pos == 'noun':
+        return {_plural(lemma)}
+    if pos == 'verb':
+        return {_plural(lemma), _with_suffix(lemma, 'ed'), _present_participle(lemma)}
+    if pos == 'adjective':
+        return {_with_suffix(lemma, 'er'), _with_suffix(lemma, 'est')}
+    return set()
+
+
+def _is_valid_wordnet_form(form: str, lemma: str, pos: str, wordnet_index: Optional[WordNetIndex]) -> bool:
+    """
+    WordNetに載っている見出し語の変化形は、WordNetの形態素解析で元の見出し語に戻る場合だけ採用する。
+    WordNetにない見出し語 (補足データのみの単語) は規則変化形をそのまま採用する。
+    """
+    wn_pos = WN_POS_MAP.get(pos)
+    if wn_pos is None:
+        return True
+    morphy = wordnet_index.morphy if wordnet_index is not None else wn._morphy
+    if not morphy(lemma, wn_pos):
+        return True
+    return lemma in morphy(form, wn_pos)
+
+
+def build_inflection_map(headwords: dict[str, list[str]], wordnet_index: Optional[WordNetIndex] = None) -> dict[str, list[str]]:
+    """
+    見出し語とその品詞から「変化形 → 見出し語のリスト」の対応表を作る。
+    WordNetの不規則変化の例外リスト (geese → goose など) と、補足データを含む各見出し語の規則変化形を使う。
+    それ自体が見出し語である語 (building など) は対応表に含めない。
+    WordNetの索引を渡した場合は、WordNet本体ではなく索引の例外リストと形態素解析を使う。
+    """
+    lemmas_by_form = defaultdict(set)
+
+    # WordNetの例外リスト: 品詞ごとの {変化形: [見出し語, ...]}
+    exception_map = wordnet_index.exceptions if wordnet_index is not None else wn._exception_map
+    for wn_pos, exceptions in exception_map.items():
+        for form, lemmas in exceptions.items():
+            form = form.replace('_', ' ')
+            for lemma in lemmas:
+                lemma = lemma.replace('_', ' ')
+                if lemma in headwords and form != lemma:
+                    lemmas_by_form[form].add(lemma)
+
+    for lemma, pos_list in headwords.items():
+        for pos in pos_list:
+            for form in regular_inflections(lemma, pos):
+                if form != lemma and _is_valid_wordnet_form(form, lemma, pos, wordnet_index):
+                    lemmas_by_form[form].add(lemma)
+
+    inflection_map = {
+        form: sorted(lemmas)
+        for form, lemmas in lemmas_by_form.items()
+        if form not in headwords
+    }
+    logging.info(f"{len(inflection_map)}件の変化形 → 見出し語の対応表を作成しました。")
+    return inflection_map
@@ -0,0 +1,109 @@
+import logging
+import re
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# ARPAbet (CMUdict) の音素からIPAへの対応表
+ARPABET_TO_IPA = {
+    'AA': 'ɑ', 'AE': 'æ', 'AH': 'ʌ', 'AO': 'ɔ', 'AW': 'aʊ', 'AY': 'aɪ',
+    'B': 'b', 'CH': 'tʃ', 'D': 'd', 'DH': 'ð', 'EH': 'ɛ', 'ER': 'ɝ',
+    'EY': 'eɪ', 'F': 'f', 'G': 'ɡ', 'HH': 'h', 'IH': 'ɪ', 'IY': 'i',
+    'JH': 'dʒ', 'K': 'k', 'L': 'l', 'M': 'm', 'N': 'n', 'NG': 'ŋ',
+    'OW': 'oʊ', 'OY': 'ɔɪ', 'P': 'p', 'R': 'r', 'S': 's', 'SH': 'ʃ',
+    'T': 't', 'TH': 'θ', 'UH': 'ʊ', 'UW': 'u', 'V': 'v', 'W': 'w',
+    'Y': 'j', 'Z': 'z', 'ZH': 'ʒ',
+}
+# 強勢のない母音は弱形で表記する
+UNSTRESSED_VOWELS = {'AH': 'ə', 'ER': 'ɚ'}
+# CMUdictの異音バリアント表記 (例: "READ(2)")
+VARIANT_PATTERN = re.compile(r'\(\d+\)$')
+
+
+def arpabet_to_ipa(phonemes: list[str]) -> str:
+    """
+    ARPAbetの音素列をIPA表記に変換する。
+    第一強勢 (1) と第二強勢 (2) の記号は、直前の子音1つの前に置く簡易的な音節区切りで付与する。
+    """
+    symbols = []
+    for phoneme in phonemes:
+        base = phoneme.rstrip('012')
+        stress = phoneme[len(base):]
+        if base not in ARPABET_TO_IPA:
+            raise ValueError(f"不明な音素です: {phoneme}")
+
+        symbol = UNSTRESSED_VOWELS.get(base, ARPABET_TO_IPA[base]) if stress == '0' else ARPABET_TO_IPA[base]
+        if stress in ('1', '2'):
+            mark = 'ˈ' if stress == '1' else 'ˌ'
+            # 直前が子音なら、その子音を音節の頭として強勢記号を前に置く
+            if symbols and not symbols[-1][1]:
+                symbols.insert(len(symbols) - 1, (mark, True))
+            else:
+                symbols.append((mark, True))
+        symbols.append((symbol, bool(stress)))
+    return ''.join(symbol for symbol, _ in symbols)
+
+
+def load_cmudict(file_path: str) -> dict[str, dict]:
+    """
+    CMUdict形式 (`WORD  PH1 PH2 ...`) の発音辞書を読み込み、単語ごとの発音情報を返す。
+    複数の発音がある単語は最初のものを使う。`;;;` で始まる行はコメントとして無視する。
+    """
+    pronunciations = {}
+    with open(file_path, 'r', encoding='latin-1') as f:
+        for i, line in enumerate(f, 1):
+            line = line.strip()
+            if not line or line.startswith(';;;'):
+                continue
+            parts = line.split()
+            if len(parts) < 2:
+                logging.warning(f"ファイル {file_path} の {i}行目: 発音がありません。スキップします: {line}")
+                continue
+            word = VARIANT_PATTERN.sub('', parts[0]).lower()
+            if word in pronunciations:
+                continue
+            try:
+                pronunciations[word] = {"text": f"/{arpabet_to_ipa(parts[1:])}/", "audio": None}
+            except ValueError as e:
+                logging.warning(f"ファイル {file_path} の {i}行目: {e}。スキップします。")
+    return pronunciations
+
+
+def load_ipa_tsv(file_path: str) -> dict[str, dict]:
+    """
+    IPAを書き出したTSV (`word<TAB>ipa[<TAB>audio_url]`) を読み込み、単語ごとの発音情報を返す。
+    """
+    pronunciations = {}
+    with open(file_path, 'r', encoding='utf-8-sig') as f:
+        for i, line in enumerate(f, 1):
+            parts = line.rstrip('\n').split('\t')
+            if len(parts) < 2 or not parts[0].strip() or not parts[1].strip():
+                if line.strip():
+                    logging.warning(f"ファイル {file_path} の {i}行目: 形式が不正です。スキップします: {line.strip()}")
+                continue
+            word = parts[0].strip().lower()
+            if word in pronunciations:
+                continue
+            text = parts[1].strip()
+            if not text.startswith('/'):
+                text = f"/{text.strip('/')}/"
+            audio = parts[2].strip() if len(parts) > 2 and parts[2].strip() else None
+            pronunciations[word] = {"text": text, "audio": audio}
+    return pronunciations
+
+
+def load_pronunciations(file_path: str) -> dict[str, dict]:
+    """
+    オフラインの発音データを読み込む。拡張子が .tsv ならIPAのTSV、それ以外はCMUdict形式として扱う。
+    ファイルがない場合は空の辞書を返す (発音情報なしでビルドを続ける)。
+    """
+    logging.info(f"発音ファイル {file_path} を読み込みます...")
+    try:
+        if file_path.endswith('.tsv'):
+            pronunciations = load_ipa_tsv(file_path)
+        else:
+            pronunciations = load_cmudict(file_path)
+    except FileNotFoundError:
+        logging.warning(f"発音ファイルが見つかりません。発音情報なしで続行します: {file_path}")
+        return {}
+    logging.info(f"{len(pronunciations)}語の発音データを読み込みました。")
+    return pronunciations
@@ -1,6 +1,10 @@
+import heapq
 import logging
-from collections import defaultdict
+import os
 import re
+import tempfile
+from collections import defaultdict
+from typing import Iterator, Optional
 
 # --- 設定 ---
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -66,6 +70,158 @@ def load_supplement_data(file_path: str) -> dict[str, list[dict]]:
     return dict(supplement_data)
 
 
+# --- ストリーミングパーサー ---
+
+# key="value..." または key=value の形式にマッチする正規表現 (word以外のキー用)
+OTHER_KEYS_PATTERN = re.compile(r'\b(\w+)=("[^"]*"|\S+)')
+# 外部ソートの一時ファイルで、単語のキーと元の行を区切る文字
+SORT_KEY_SEPARATOR = '\x1f'
+
+
+def _word_key(content: str, word_end: int) -> Optional[str]:
+    word = content[:word_end].strip().strip('"')
+    return word.lower() if word else None
+
+
+def parse_supplement_line(line: str) -> Optional[tuple[str, dict]]:
+    """
+    補足データの1行を (単語のキー, {キー: 値}) に分解する。`load_supplement_data` と同じ規則で、
+    正規表現の走査は1回だけ行う (最初の key=value より前が word の値)。
+    'word=' で始まらない行と word の値が空の行は None を返す。
+    """
+    if not line.startswith('word='):
+        return None
+    content = line[5:]
+    line_data = {}
+    word_end = len(content)
+    for match in OTHER_KEYS_PATTERN.finditer(content):
+        if word_end == len(content):
+            word_end = match.start()
+        line_data[match.group(1)] = match.group(2).strip('"')
+
+    word_key = _word_key(content, word_end)
+    if word_key is None:
+        return None
+    return word_key, line_data
+
+
+def supplement_line_key(line: str) -> Optional[str]:
+    """行の単語のキーだけを取り出す (最初の key=value までしか走査しないので、並べ替え用に軽い)"""
+    if not line.startswith('word='):
+        return None
+    content = line[5:]
+    match = OTHER_KEYS_PATTERN.search(content)
+    return _word_key(content, match.start() if match else len(content))
+
+
+def _iter_lines(file_path: str) -> Iterator[tuple[int, str]]:
+    """空行を除いた (行番号, 行) を返す"""
+    with open(file_path, 'r', encoding='utf-8-sig') as f:
+        for i, line in enumerate(f, 1):
+            line = line.strip()
+            if line:
+                yield i, line
+
+
+def _warn_skipped(file_path: str, i: int, line: str) -> None:
+    logging.warning(f"ファイル {file_path} の {i}行目: 'word=' で始まらないか、'word' の値が空です。スキップします: {line}")
+
+
+def is_supplement_sorted(file_path: str) -> bool:
+    """単語のキーの順に並んでいるか (同じ単語の行が連続しているか) を、ファイルを1回読んで確認する"""
+    previous = None
+    for _, line in _iter_lines(file_path):
+        word_key = supplement_line_key(line)
+        if word_key is None:
+            continue
+        if previous is not None and word_key < previous:
+            return False
+        previous = word_key
+    return True
+
+
+def sort_supplement_file(file_path: str, output_path: str, buffer_lines: int = 200000) -> None:
+    """
+    補足データを単語のキーの順に並べ替えて output_path に書き出す (外部ソート)。
+    buffer_lines 行ずつ並べ替えた一時ファイルを作り、それらをマージするため、
+    メモリに載るのは buffer_lines 行分だけで済む。同じ単語の行は元のファイルの順序を保つ。
+    """
+    with tempfile.TemporaryDirectory(dir=os.path.dirname(os.path.abspath(output_path))) as tmp_dir:
+        run_paths = []
+        buffer = []
+
+        def flush_buffer():
+            buffer.sort(key=lambda item: item[0])
+            run_path = os.path.join(tmp_dir, f"run_{len(run_paths)}.txt")
+            with open(run_path, 'w', encoding='utf-8') as run_file:
+                run_file.writelines(f"{word_key}{SORT_KEY_SEPARATOR}{line}\n" for word_key, line in buffer)
+            run_paths.append(run_path)
+            buffer.clear()
+
+        for i, line in _iter_lines(file_path):
+            word_key = supplement_line_key(line)
+            if word_key is None:
+                _warn_skipped(file_path, i, line)
+                continue
+            buffer.append((word_key, line))
+            if len(buffer) >= buffer_lines:
+                flush_buffer()
+        if buffer:
+            flush_buffer()
+
+        run_files = [open(run_path, 'r', encoding='utf-8') for run_path in run_paths]
+        try:
+            merged = heapq.merge(*run_files, key=lambda entry: entry.split(SORT_KEY_SEPARATOR, 1)[0])
+            with open(output_path, 'w', encoding='utf-8') as output:
+                output.writelines(entry.split(SORT_KEY_SEPARATOR, 1)[1] for entry in merged)
+        finally:
+            for run_file in run_files:
+                run_file.close()
+    logging.info(f"補足データを単語順に並べ替えました: {output_path} (一時ファイル {len(run_paths)}個)")
+
+
+def iter_supplement_groups(file_path: str, presorted: Optional[bool] = None, buffer_lines: int = 200000) -> Iterator[tuple[str, list[dict]]]:
+    """
+    補足データを単語のキーの順に (単語のキー, 行のデータのリスト) として1語ずつ返すジェネレーター。
+    `load_supplement_data` と違いファイル全体をメモリに読み込まないため、ファイルの大きさによらず
+    メモリ使用量は1語分 (並べ替えが必要な場合は buffer_lines 行分) に収まる。
+    presorted=None の場合は並び順を確認し、並んでいなければ外部ソートした一時ファイルから読む。
+    presorted=True なのに並んでいない行があれば ValueError を送出する。
+    """
+    if presorted is None:
+        presorted = is_supplement_sorted(file_path)
+    if not presorted:
+        logging.info(f"補足ファイル {file_path} が単語順に並んでいないため、並べ替えてから読み込みます。")
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            sorted_path = os.path.join(tmp_dir, "supplement.sorted.tsv")
+            sort_supplement_file(file_path, sorted_path, buffer_lines)
+            yield from iter_supplement_groups(sorted_path, presorted=True)
+        return
+
+    current_key = None
+    rows = []
+    count = 0
+    for i, line in _iter_lines(file_path):
+        parsed = parse_supplement_line(line)
+        if parsed is None:
+            _warn_skipped(file_path, i, line)
+            continue
+        word_key, line_data = parsed
+        if word_key != current_key:
+            if current_key is not None:
+                if word_key < current_key:
+                    raise ValueError(f"ファイル {file_path} の {i}行目: 単語順に並んでいません ({current_key} → {word_key})")
+                yield current_key, rows
+                count += 1
+            current_key = word_key
+            rows = []
+        rows.append(line_data)
+    if current_key is not None:
+        yield current_key, rows
+        count += 1
+    logging.info(f"{count}語の補足データを読み込みました。")
+
+
 # --- フォーマッター（★★★ この関数を修正しました ★★★） ---
 
 def format_from_supplement(rows: list[dict]) -> dict:
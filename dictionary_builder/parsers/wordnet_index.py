@@ -0,0 +1,144 @@
+import logging
+import os
+import pickle
+import time
+from typing import Optional
+
+from nltk.corpus import wordnet as wn
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+WN_POS_MAP = {'n': 'noun', 'v': 'verb', 'a': 'adjective', 'r': 'adverb'}
+# 保存形式を変えたら上げる (古いファイルは読み込まずに作り直す)
+INDEX_FORMAT_VERSION = 1
+
+
+class WordNetIndex:
+    """
+    WordNet全体を1回だけ走査して作る、単語 → 品詞・定義・例文・類義語の索引。
+    synset ごとの定義・例文・見出し語は1回だけ取り出して番号で参照し、単語ごとの検索は
+    辞書の参照だけで済ませる。活用形 (geese など) の解決には WordNet の例外リストと
+    語尾の置換規則を索引に含めておき、`wn.synsets` と同じ結果を返す。
+    """
+
+    def __init__(self, synsets: list[tuple], lemma_synsets: dict, exceptions: dict, substitutions: dict, wordnet_version: str):
+        # synsets[i] = (定義, 例文のタプル, 見出し語名のタプル)
+        self.synsets = synsets
+        # lemma_synsets[見出し語][品詞] = [synset番号, ...] (WordNetの索引ファイルと同じ順序)
+        self.lemma_synsets = lemma_synsets
+        self.exceptions = exceptions
+        self.substitutions = substitutions
+        self.wordnet_version = wordnet_version
+
+    @classmethod
+    def build(cls) -> "WordNetIndex":
+        started = time.perf_counter()
+        synset_ids: dict[tuple[str, int], int] = {}
+        synsets = []
+        lemma_synsets = {}
+        for lemma, offsets_by_pos in wn._lemma_pos_offset_map.items():
+            entry = {}
+            for pos in WN_POS_MAP:
+                ids = []
+                for offset in offsets_by_pos.get(pos, []):
+                    key = (pos, offset)
+                    if key not in synset_ids:
+                        synset = wn.synset_from_pos_and_offset(pos, offset)
+                        synset_ids[key] = len(synsets)
+                        synsets.append((
+                            synset.definition(),
+                            tuple(synset.examples()),
+                            tuple(synset_lemma.name() for synset_lemma in synset.lemmas()),
+                        ))
+                    ids.append(synset_ids[key])
+                if ids:
+                    entry[pos] = ids
+            if entry:
+                lemma_synsets[lemma] = entry
+
+        index = cls(
+            synsets=synsets,
+            lemma_synsets=lemma_synsets,
+            exceptions={pos: dict(wn._exception_map[pos]) for pos in WN_POS_MAP},
+            substitutions={pos: list(wn.MORPHOLOGICAL_SUBSTITUTIONS[pos]) for pos in WN_POS_MAP},
+            wordnet_version=wn.get_version(),
+        )
+        logging.info(
+            f"WordNetの索引を作成しました: {len(lemma_synsets)}語, {len(synsets)} synsets "
+            f"({time.perf_counter() - started:.1f}秒)"
+        )
+        return index
+
+    def morphy(self, form: str, pos: str) -> list[str]:
+        """WordNetの形態素解析 (nltk の `_morphy`) と同じ規則で、索引にある基本形を返す"""
+        exceptions = self.exceptions[pos]
+        if form in exceptions:
+            forms = exceptions[form]
+        else:
+            forms = [form[:-len(old)] + new for old, new in self.substitutions[pos] if form.endswith(old)]
+
+        results = []
+        for candidate in [form] + forms:
+            if pos in self.lemma_synsets.get(candidate, {}) and candidate not in results:
+                results.append(candidate)
+        return results
+
+    def lookup(self, word: str) -> dict:
+        """`get_wordnet_data_structured` と同じ形式で単語のデータを返す"""
+        data = {
+            "part_of_speech": set(),
+            "definitions": [],
+            "examples": set(),
+            "synonyms": set()
+        }
+        word_lower = word.lower()
+        for pos, pos_name in WN_POS_MAP.items():
+            synset_ids = [
+                synset_id
+                for form in self.morphy(word_lower, pos)
+                for synset_id in self.lemma_synsets[form][pos]
+            ]
+            if synset_ids:
+                data["part_of_speech"].add(pos_name)
+            for synset_id in synset_ids:
+                definition, examples, lemma_names = self.synsets[synset_id]
+                data["definitions"].append({"pos": pos_name, "def": definition})
+                data["examples"].update(examples)
+                for name in lemma_names:
+                    synonym = name.replace('_', ' ')
+                    if synonym.lower() != word_lower:
+                        data["synonyms"].add(synonym)
+        return data
+
+    def save(self, path: str) -> None:
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            pickle.dump({"format_version": INDEX_FORMAT_VERSION, "index": self}, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+        logging.info(f"WordNetの索引を保存しました: {path} ({os.path.getsize(path) / 1024 / 1024:.1f} MB)")
+
+
+def load_or_build_wordnet_index(path: Optional[str]) -> WordNetIndex:
+    """
+    保存済みの索引があれば読み込み、なければ (または形式やWordNetのバージョンが異なれば) 作成する。
+    path を指定した場合は作成した索引を保存し、次回以降のビルドで再利用する。
+    """
+    if path and os.path.exists(path):
+        try:
+            with open(path, 'rb') as f:
+                saved = pickle.load(f)
+            index = saved["index"]
+            if saved.get("format_version") == INDEX_FORMAT_VERSION and index.wordnet_version == wn.get_version():
+                logging.info(f"保存済みのWordNetの索引を読み込みました: {path}")
+                return index
+            logging.info("保存済みのWordNetの索引の形式またはバージョンが異なるため、作り直します。")
+        except Exception as e:
+            logging.warning(f"保存済みのWordNetの索引を読み込めませんでした。作り直します: {e}")
+
+    index = WordNetIndex.build()
+    if path:
+        index.save(path)
+    return index
@@ -0,0 +1,123 @@
+import json
+import logging
+import os
+from typing import Optional
+
+from pipeline.manifest import CollectionDiff
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# 保存形式を変えたら上げる (古いチェックポイントからは再開しない)
+CHECKPOINT_FORMAT_VERSION = 1
+
+
+def build_fingerprint(supplement_file: str, per_word_wordnet: bool, full: bool) -> dict:
+    """再開してよいビルドかどうかを判断するための、入力と設定の情報"""
+    stat = os.stat(supplement_file)
+    return {
+        "format_version": CHECKPOINT_FORMAT_VERSION,
+        "supplement_file": os.path.abspath(supplement_file),
+        "supplement_size": stat.st_size,
+        "supplement_mtime": int(stat.st_mtime),
+        "per_word_wordnet": per_word_wordnet,
+        "full": full,
+    }
+
+
+class BuildCheckpoint:
+    """
+    長時間のビルドを途中から再開するためのチェックポイント (JSON Lines 形式)。
+    1行目にビルドの入力と設定、2行目以降に書き込みの完了した作業単位ごとの
+    「最後の単語・各単語の品詞と内容のハッシュ・差分の件数・失敗したドキュメント」を追記する。
+    作業単位ごとに追記するだけなので、保存にかかる時間はビルド全体の語数によらない。
+    """
+
+    def __init__(self, path: str, fingerprint: dict):
+        self.path = path
+        self.fingerprint = fingerprint
+        self.last_word: Optional[str] = None
+        self.extraction_complete = False
+        self.headword_pos: dict[str, list[str]] = {}
+        self.hashes: dict[str, str] = {}
+        self.counts = {"added": 0, "changed": 0, "unchanged": 0}
+        self.failed: set[str] = set()
+
+    @classmethod
+    def open(cls, path: str, fingerprint: dict, resume: bool) -> "BuildCheckpoint":
+        """
+        resume なら既存のチェックポイントを読み込む。入力や設定が異なる場合、読み込めない場合は最初からやり直す。
+        resume でなければ既存のチェックポイントを破棄する。
+        """
+        checkpoint = cls(path, fingerprint)
+        if resume and os.path.exists(path):
+            try:
+                checkpoint._load()
+                if checkpoint.last_word is not None:
+                    logging.info(f"チェックポイントから再開します: {len(checkpoint.hashes)}語 ('{checkpoint.last_word}' まで) 完了済み")
+                return checkpoint
+            except ValueError as e:
+                logging.warning(f"チェックポイントから再開できないため、最初からやり直します: {e}")
+                checkpoint = cls(path, fingerprint)
+        elif resume:
+            logging.info("チェックポイントがないため、最初から実行します。")
+        checkpoint._start()
+        return checkpoint
+
+    def _load(self) -> None:
+        with open(self.path, 'r', encoding='utf-8') as f:
+            lines = f.readlines()
+        if not lines or json.loads(lines[0]) != self.fingerprint:
+            raise ValueError("補足データまたはビルドの設定が前回と異なります")
+        for line in lines[1:]:
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                # 書き込み途中で止まった最後の行は無視する (その作業単位はやり直す)
+                logging.warning("チェックポイントの最後の行が壊れているため、その作業単位をやり直します。")
+                break
+            self.last_word = entry["last_word"]
+            self.extraction_complete = entry.get("extraction_complete", False)
+            for word, (pos, digest) in entry["words"].items():
+                self.headword_pos[word] = pos
+                self.hashes[word] = digest
+            self.counts = entry["counts"]
+            self.failed = set(entry["failed"])
+
+    def _start(self) -> None:
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(self.path, 'w', encoding='utf-8') as f:
+            f.write(json.dumps(self.fingerprint, ensure_ascii=False) + "\n")
+
+    def restore(self, diff: CollectionDiff, headword_pos: dict[str, list[str]]) -> None:
+        """完了済みの単語の差分の集計と品詞を、今回のビルドの状態に戻す"""
+        diff.hashes.update(self.hashes)
+        diff.added = self.counts["added"]
+        diff.changed = self.counts["changed"]
+        diff.unchanged = self.counts["unchanged"]
+        headword_pos.update(self.headword_pos)
+
+    def is_done(self, word: str) -> bool:
+        return self.last_word is not None and (self.extraction_complete or word <= self.last_word)
+
+    def append(self, words: dict[str, tuple[list[str], str]], diff: CollectionDiff, failed: set[str], extraction_complete: bool = False) -> None:
+        """書き込みの完了した作業単位 ({単語: (品詞, ハッシュ)}) を追記して、ディスクに書き出す"""
+        if words:
+            self.last_word = max(words)
+        entry = {
+            "last_word": self.last_word,
+            "words": words,
+            "counts": {"added": diff.added, "changed": diff.changed, "unchanged": diff.unchanged},
+            "failed": sorted(failed),
+            "extraction_complete": extraction_complete,
+        }
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def remove(self) -> None:
+        """ビルドが最後まで完了したらチェックポイントを削除する"""
+        if os.path.exists(self.path):
+            os.remove(self.path)
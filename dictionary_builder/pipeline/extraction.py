@@ -0,0 +1,98 @@
+import logging
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from typing import Callable, Iterable, Iterator, Optional
+
+from parsers.supplement_parser import format_from_supplement
+from parsers.wordnet_index import WordNetIndex
+from parsers.wordnet_parser import get_wordnet_data_structured
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# ワーカープロセスごとに1回だけ受け取る発音データとWordNetの索引
+_worker_pronunciations: dict[str, dict] = {}
+_worker_wordnet_lookup: Callable[[str], dict] = get_wordnet_data_structured
+
+
+def merge_word(
+    word: str,
+    rows: list[dict],
+    pronunciations: dict[str, dict],
+    wordnet_lookup: Callable[[str], dict] = get_wordnet_data_structured,
+) -> dict:
+    """
+    補足データ・WordNet・発音データを統合して、1単語分の dictionary ドキュメントを作る。
+    wordnet_lookup には単語ごとにWordNetを問い合わせる関数か、WordNetIndex.lookup を渡す。
+    """
+    final_data = format_from_supplement(rows)
+    final_data['word'] = word
+
+    wordnet_data = wordnet_lookup(word)
+
+    pos_from_supplement = set(final_data["part_of_speech"])
+    pos_from_wordnet = set(wordnet_data["part_of_speech"])
+    final_data["part_of_speech"] = sorted(list(pos_from_supplement.union(pos_from_wordnet)))
+
+    examples_from_supplement = set(final_data["raw_examples"])
+    examples_from_wordnet = set(wordnet_data["examples"])
+    final_data["raw_examples"] = sorted(list(examples_from_supplement.union(examples_from_wordnet)))
+
+    final_data["definitions"].extend(wordnet_data["definitions"])
+    final_data["synonyms"] = sorted(list(wordnet_data["synonyms"]))
+    final_data["phonetics"] = pronunciations.get(word)
+    return final_data
+
+
+def _init_worker(pronunciations: dict[str, dict], wordnet_index: Optional[WordNetIndex]) -> None:
+    """ワーカープロセスの初期化。発音データと索引を受け取り、索引がなければWordNetを先に読み込んでおく"""
+    global _worker_pronunciations, _worker_wordnet_lookup
+    _worker_pronunciations = pronunciations
+    if wordnet_index is not None:
+        _worker_wordnet_lookup = wordnet_index.lookup
+    else:
+        from nltk.corpus import wordnet as wn
+        wn.ensure_loaded()
+
+
+def _extract_chunk(chunk: list[tuple[str, list[dict]]]) -> list[dict]:
+    return [merge_word(word, rows, _worker_pronunciations, _worker_wordnet_lookup) for word, rows in chunk]
+
+
+def _chunked(groups: Iterable[tuple[str, list[dict]]], chunk_size: int) -> Iterator[list[tuple[str, list[dict]]]]:
+    iterator = iter(groups)
+    while chunk := list(islice(iterator, chunk_size)):
+        yield chunk
+
+
+def extract_records(
+    groups: Iterable[tuple[str, list[dict]]],
+    pronunciations: dict[str, dict],
+    workers: Optional[int] = None,
+    chunk_size: int = 200,
+    wordnet_index: Optional[WordNetIndex] = None,
+) -> Iterator[dict]:
+    """
+    (単語, 補足データの行のリスト) の順に統合済みのドキュメントを返すジェネレーター。
+    groups は `iter_supplement_groups` のようなジェネレーターでもよく、先読みした分だけを読み進める。
+    wordnet_index を渡した場合はWordNetを単語ごとに問い合わせず、索引から引く。
+    workers が2以上なら、chunk_size 語ずつの作業単位をプロセスプールで並列に処理する。
+    先読みする作業単位はワーカー数の2倍までに抑え、書き込み側が遅くてもメモリに結果をため込まない。
+    """
+    workers = workers or os.cpu_count() or 1
+    wordnet_lookup = wordnet_index.lookup if wordnet_index is not None else get_wordnet_data_structured
+    if workers <= 1:
+        for word, rows in groups:
+            yield merge_word(word, rows, pronunciations, wordnet_lookup)
+        return
+
+    logging.info(f"{workers}プロセスでWordNetの抽出を行います (作業単位: {chunk_size}語)")
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(pronunciations, wordnet_index)) as pool:
+        pending = deque()
+        for chunk in _chunked(groups, chunk_size):
+            pending.append(pool.submit(_extract_chunk, chunk))
+            if len(pending) >= workers * 2:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
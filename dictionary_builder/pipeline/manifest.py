@@ -0,0 +1,117 @@
+import hashlib
+import json
+import logging
+import os
+from typing import Optional
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# 保存形式やハッシュの計算方法を変えたら上げる (古いマニフェストは無視して全件を登録し直す)
+MANIFEST_FORMAT_VERSION = 1
+
+
+def document_hash(data: dict) -> str:
+    """ドキュメントの内容から決まるハッシュ (キーの順序や空白に左右されないよう正規化したJSONから計算する)"""
+    canonical = json.dumps(data, ensure_ascii=False, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+class PublishManifest:
+    """
+    コレクションごとに「ドキュメントID → 内容のハッシュ」を記録した、前回Firestoreに登録した内容の一覧。
+    今回のビルド結果と比べて、追加・変更されたドキュメントだけを書き込み、なくなったドキュメントを削除する。
+    """
+
+    def __init__(self, path: Optional[str], collections: Optional[dict[str, dict[str, str]]] = None):
+        self.path = path
+        self.collections = collections or {}
+
+    @classmethod
+    def load(cls, path: Optional[str]) -> "PublishManifest":
+        """マニフェストを読み込む。ファイルがない・形式が異なる場合は空のマニフェストを返す (全件が追加扱いになる)"""
+        if not path or not os.path.exists(path):
+            logging.info("前回の登録内容のマニフェストがないため、すべてのドキュメントを登録します。")
+            return cls(path)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                saved = json.load(f)
+            if saved.get("format_version") != MANIFEST_FORMAT_VERSION:
+                logging.info("マニフェストの形式が異なるため、すべてのドキュメントを登録し直します。")
+                return cls(path)
+            manifest = cls(path, saved["collections"])
+            counts = ", ".join(f"{name}: {len(hashes)}件" for name, hashes in manifest.collections.items())
+            logging.info(f"前回の登録内容のマニフェストを読み込みました: {path} ({counts})")
+            return manifest
+        except Exception as e:
+            logging.warning(f"マニフェストを読み込めませんでした。すべてのドキュメントを登録します: {e}")
+            return cls(path)
+
+    def published(self, collection: str) -> dict[str, str]:
+        return self.collections.get(collection, {})
+
+    def replace(self, collection: str, hashes: dict[str, str]) -> None:
+        """コレクションの登録内容を、書き込みがすべて完了した今回のビルド結果で置き換える"""
+        self.collections[collection] = hashes
+
+    def save(self) -> None:
+        if not self.path:
+            return
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({"format_version": MANIFEST_FORMAT_VERSION, "collections": self.collections}, f, ensure_ascii=False, sort_keys=True)
+        os.replace(tmp_path, self.path)
+        logging.info(f"登録内容のマニフェストを保存しました: {self.path}")
+
+
+class CollectionDiff:
+    """
+    1つのコレクションについて、前回の登録内容と今回のビルド結果の差分を集計する。
+    ドキュメントを1件ずつ check() に渡すと、書き込みが必要かどうかを返す。
+    force=True の場合は変更のないドキュメントも書き込み対象にする (Firestore側を直接編集した場合の復旧用)。
+    """
+
+    def __init__(self, collection: str, published: dict[str, str], force: bool = False):
+        self.collection = collection
+        self.published = published
+        self.force = force
+        self.hashes: dict[str, str] = {}
+        self.added = 0
+        self.changed = 0
+        self.unchanged = 0
+
+    def check(self, doc_id: str, data: dict) -> bool:
+        digest = document_hash(data)
+        self.hashes[doc_id] = digest
+        previous = self.published.get(doc_id)
+        if previous is None:
+            self.added += 1
+            return True
+        if previous != digest:
+            self.changed += 1
+            return True
+        self.unchanged += 1
+        return self.force
+
+    def removed(self) -> list[str]:
+        """前回は登録したが、今回のビルド結果にないドキュメントID"""
+        return sorted(doc_id for doc_id in self.published if doc_id not in self.hashes)
+
+    def committed_hashes(self, failed: set[str]) -> dict[str, str]:
+        """
+        マニフェストに記録する登録内容。書き込みに失敗したドキュメントは前回の状態のままにして、
+        次回のビルドで書き込み (または削除) し直されるようにする。
+        """
+        hashes = {doc_id: digest for doc_id, digest in self.hashes.items() if doc_id not in failed}
+        for doc_id in failed:
+            if doc_id in self.published:
+                hashes[doc_id] = self.published[doc_id]
+        return hashes
+
+    def summary(self) -> str:
+        return (
+            f"{self.collection}: 追加 {self.added}件, 変更 {self.changed}件, "
+            f"削除 {len(self.removed())}件, 変更なし {self.unchanged}件"
+        )
@@ -0,0 +1,117 @@
+import json
+import logging
+import resource
+import sys
+import time
+from contextlib import contextmanager
+from typing import Iterable, Iterator, Optional
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+
+def peak_rss_mb(who: int = resource.RUSAGE_SELF) -> float:
+    """プロセスの最大メモリ使用量 (ピークRSS, MB)"""
+    peak = resource.getrusage(who).ru_maxrss
+    # Linux は KB、macOS はバイト単位
+    return peak / 1024 / 1024 if sys.platform == "darwin" else peak / 1024
+
+
+class StageTimer:
+    """
+    ビルドの処理段階 (読み込み・抽出・アップロードなど) ごとの経過時間・CPU時間・処理件数と、
+    その段階を終えた時点のピークRSSを集計する。同じ段階を何度計測しても合計される。
+    段階の中で別の段階を計測した場合 (抽出の待ち時間の中で補足データを読み込む場合など)、
+    内側の段階の時間は外側の段階から差し引き、合計が二重に数えられないようにする。
+    """
+
+    def __init__(self):
+        self.seconds: dict[str, float] = {}
+        self.cpu_seconds: dict[str, float] = {}
+        self.counts: dict[str, int] = {}
+        self.peak_rss: dict[str, float] = {}
+        # 計測中の段階ごとの [内側の段階の経過時間, 内側の段階のCPU時間]
+        self._nested: list[list[float]] = []
+        self._started = time.perf_counter()
+        self._started_cpu = time.process_time()
+
+    @contextmanager
+    def stage(self, name: str, count: int = 0):
+        self._nested.append([0.0, 0.0])
+        started = time.perf_counter()
+        started_cpu = time.process_time()
+        try:
+            yield
+        finally:
+            self._finish(name, started, started_cpu, count)
+
+    def _finish(self, name: str, started: float, started_cpu: float, count: int) -> None:
+        seconds = time.perf_counter() - started
+        cpu_seconds = time.process_time() - started_cpu
+        nested_seconds, nested_cpu_seconds = self._nested.pop()
+        if self._nested:
+            self._nested[-1][0] += seconds
+            self._nested[-1][1] += cpu_seconds
+        self.add(name, seconds - nested_seconds, count, cpu_seconds - nested_cpu_seconds)
+
+    def add(self, name: str, seconds: float, count: int = 0, cpu_seconds: float = 0.0) -> None:
+        self.seconds[name] = self.seconds.get(name, 0.0) + seconds
+        self.cpu_seconds[name] = self.cpu_seconds.get(name, 0.0) + cpu_seconds
+        self.counts[name] = self.counts.get(name, 0) + count
+        self.peak_rss[name] = peak_rss_mb()
+
+    def iterate(self, name: str, iterable: Iterable) -> Iterator:
+        """イテレータから次の要素を受け取るまでの待ち時間を name の段階として計測する"""
+        iterator = iter(iterable)
+        while True:
+            self._nested.append([0.0, 0.0])
+            started = time.perf_counter()
+            started_cpu = time.process_time()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                self._finish(name, started, started_cpu, 0)
+                return
+            self._finish(name, started, started_cpu, 1)
+            yield item
+
+    def summary(self) -> dict:
+        """段階ごとの計測結果と全体の合計 (ワーカープロセスのCPU時間を含む) を返す"""
+        children = resource.getrusage(resource.RUSAGE_CHILDREN)
+        return {
+            "stages": {
+                name: {
+                    "seconds": seconds,
+                    "cpu_seconds": self.cpu_seconds.get(name, 0.0),
+                    "count": self.counts.get(name, 0),
+                    "per_second": self.counts.get(name, 0) / seconds if seconds > 0 else None,
+                    "peak_rss_mb": self.peak_rss.get(name),
+                }
+                for name, seconds in self.seconds.items()
+            },
+            "total_seconds": time.perf_counter() - self._started,
+            "total_cpu_seconds": time.process_time() - self._started_cpu,
+            "worker_cpu_seconds": children.ru_utime + children.ru_stime,
+            "peak_rss_mb": peak_rss_mb(),
+            "worker_peak_rss_mb": peak_rss_mb(resource.RUSAGE_CHILDREN),
+        }
+
+    def report(self, json_path: Optional[str] = None) -> None:
+        """段階ごとの経過時間・CPU時間・処理速度・ピークRSSをログに出力する (json_path を指定すれば保存もする)"""
+        summary = self.summary()
+        total = sum(stage["seconds"] for stage in summary["stages"].values())
+        for name, stage in summary["stages"].items():
+            rate = f" | {stage['per_second']:,.0f} 件/秒" if stage["count"] and stage["per_second"] else ""
+            share = stage["seconds"] / total if total > 0 else 0
+            logging.info(
+                f"[計測] {name:<20} {stage['seconds']:8.2f}秒 ({share:5.1%}) | CPU {stage['cpu_seconds']:8.2f}秒 | "
+                f"{stage['count']:,}件{rate} | ピークRSS {stage['peak_rss_mb']:,.0f} MB"
+            )
+        logging.info(
+            f"[計測] 合計 {summary['total_seconds']:.2f}秒 | CPU {summary['total_cpu_seconds']:.2f}秒 "
+            f"(ワーカープロセス {summary['worker_cpu_seconds']:.2f}秒) | ピークRSS {summary['peak_rss_mb']:,.0f} MB "
+            f"(ワーカープロセス {summary['worker_peak_rss_mb']:,.0f} MB)"
+        )
+        if json_path:
+            with open(json_path, 'w', encoding='utf-8') as f:
+                json.dump(summary, f, ensure_ascii=False, indent=2)
+            logging.info(f"計測結果を保存しました: {json_path}")
@@ -0,0 +1,225 @@
+import logging
+import threading
+import time
+from collections import defaultdict
+from typing import Optional
+
+from google.cloud.firestore_v1.bulk_writer import BulkRetry, BulkWriteFailure, BulkWriterOptions, SendMode
+
+from pipeline.timing import StageTimer
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# 混雑・一時的な障害を表すgRPCのステータスコード (これらの失敗だけを再試行する)
+# ABORTED(10): 競合, RESOURCE_EXHAUSTED(8): 書き込みが多すぎる, UNAVAILABLE(14), DEADLINE_EXCEEDED(4), INTERNAL(13)
+RETRYABLE_CODES = {4, 8, 10, 13, 14}
+# この中でも書き込み速度を落とすべきもの
+CONTENTION_CODES = {8, 10}
+# 同時に送ったコミットがまとめて失敗したときに何度も下げないよう、引き下げはこの間隔 (秒) に1回までにする
+BACKOFF_INTERVAL = 1.0
+# 引き下げた上限速度は、混雑が起きないままこの間隔 (秒) が経つごとに RAMP_UP_FACTOR 倍に戻していく (500/50/5 ルールと同じ)
+RAMP_UP_INTERVAL = 300.0
+RAMP_UP_FACTOR = 1.5
+
+
+class WriteRateLimiter:
+    """
+    BulkWriter に渡す前の書き込みに適用する、上限速度 (件/秒) のトークンバケット。
+    BulkWriter 自身の速度調整 (500/50/5 ルール) はそのまま働き、これは混雑時に下げた上限を守るためだけに使う。
+    初期値は max_ops_per_second (BulkWriter の上限と同じなので、混雑するまでは制限にならない)。
+    lower() で半分に下げ、その後は RAMP_UP_INTERVAL ごとに RAMP_UP_FACTOR 倍ずつ戻す。
+    """
+
+    def __init__(self, max_ops_per_second: float, min_ops_per_second: float, clock=time.monotonic, sleep=time.sleep):
+        self.max_ops_per_second = max_ops_per_second
+        self.min_ops_per_second = min_ops_per_second
+        self.ops_per_second = max_ops_per_second
+        self._clock = clock
+        self._sleep = sleep
+        self._lock = threading.Lock()
+        self._tokens = float(max_ops_per_second)
+        self._updated = clock()
+        self._changed = self._updated
+
+    def _refill(self, now: float) -> None:
+        if self.ops_per_second < self.max_ops_per_second and now - self._changed >= RAMP_UP_INTERVAL:
+            self.ops_per_second = min(self.max_ops_per_second, self.ops_per_second * RAMP_UP_FACTOR)
+            self._changed = now
+        # バケットには最大1秒分のトークンをためる
+        self._tokens = min(self.ops_per_second, self._tokens + (now - self._updated) * self.ops_per_second)
+        self._updated = now
+
+    def acquire(self) -> float:
+        """書き込み1件分のトークンを取る。足りなければたまるまで待ち、待った秒数を返す"""
+        with self._lock:
+            self._refill(self._clock())
+            # 先にトークンを予約してから待つ (同時に呼ばれても上限速度を超えない)
+            self._tokens -= 1
+            wait = -self._tokens / self.ops_per_second if self._tokens < 0 else 0.0
+        if wait > 0:
+            self._sleep(wait)
+        return wait
+
+    def lower(self, observed_ops_per_second: float) -> Optional[float]:
+        """
+        上限速度を、現在の上限と実際の書き込み速度の小さいほうの半分に下げる (最低は min_ops_per_second)。
+        下げた場合は新しい上限速度を、すでに最低値なら None を返す。
+        """
+        with self._lock:
+            now = self._clock()
+            self._refill(now)
+            current = min(self.ops_per_second, observed_ops_per_second) if observed_ops_per_second > 0 else self.ops_per_second
+            lowered = max(self.min_ops_per_second, current / 2)
+            if lowered >= self.ops_per_second:
+                return None
+            self.ops_per_second = lowered
+            self._tokens = min(self._tokens, lowered)
+            self._changed = now
+            return lowered
+
+
+class BulkUploader:
+    """
+    Firestoreの BulkWriter を使って書き込み (set / delete) を並列に送る。
+    書き込み速度は 500/50/5 ルール (毎秒500件から始め、5分ごとに50%ずつ上げる) に従って
+    BulkWriter が自動で調整し、複数のコミットを同時に送る。
+    混雑を示すエラーを受け取ったら上限速度を半分に下げ (WriteRateLimiter)、失敗したドキュメントは1件ずつ
+    指数バックオフで max_attempts 回まで再試行する。再試行しても失敗したドキュメントと、flush() の後も
+    成功を確認できなかったドキュメントは failed に記録し、マニフェストに登録済みとして残さないようにする。
+
+    BulkWriter の flush() は1回目の後は何もせずに戻る (20件に満たない書き込みが送られない) ため、
+    flush() のたびに BulkWriter を作り直す。
+    """
+
+    def __init__(self, db, timer: StageTimer, stage: str = "upload",
+                 initial_ops_per_second: int = 500, max_ops_per_second: int = 10000, max_attempts: int = 10):
+        self.db = db
+        self.timer = timer
+        self.stage = stage
+        self.initial_ops_per_second = initial_ops_per_second
+        self.max_ops_per_second = max_ops_per_second
+        self.max_attempts = max_attempts
+        self.writer = self._new_writer(initial_ops_per_second)
+        self.limiter = WriteRateLimiter(max_ops_per_second, max(1, initial_ops_per_second // 10))
+        self._lock = threading.Lock()
+        self.queued = 0
+        self.written = 0
+        self.retried = 0
+        self.backoffs = 0
+        self._last_backoff = 0.0
+        self._reported = 0
+        # コレクション → 再試行しても書き込めなかったドキュメントIDの集合
+        self.failed: dict[str, set[str]] = defaultdict(set)
+        # コレクション → 送ったがまだ成功を確認していないドキュメントIDの集合
+        self.pending: dict[str, set[str]] = defaultdict(set)
+        self._started = None
+
+    def _new_writer(self, initial_ops_per_second: int):
+        writer = self.db.bulk_writer(BulkWriterOptions(
+            initial_ops_per_second=initial_ops_per_second,
+            max_ops_per_second=self.max_ops_per_second,
+            mode=SendMode.parallel,
+            retry=BulkRetry.exponential,
+        ))
+        writer.on_write_result(self._on_success)
+        writer.on_write_error(self._on_error)
+        return writer
+
+    def set(self, collection: str, doc_id: str, data: dict) -> None:
+        self._enqueue("set", self.db.collection(collection).document(doc_id), data)
+
+    def delete(self, collection: str, doc_id: str) -> None:
+        self._enqueue("delete", self.db.collection(collection).document(doc_id))
+
+    def _enqueue(self, operation: str, reference, *args) -> None:
+        # 速度の上限に達している間、WriteRateLimiter と BulkWriter は呼び出し元を待たせるので、その時間を計測する
+        started = time.perf_counter()
+        self._started = self._started or started
+        self.limiter.acquire()
+        with self._lock:
+            self.pending[reference.parent.id].add(reference.id)
+        getattr(self.writer, operation)(reference, *args)
+        self.queued += 1
+        self.timer.add(self.stage, time.perf_counter() - started)
+
+    def _on_success(self, reference, result, bulk_writer) -> None:
+        with self._lock:
+            self.pending[reference.parent.id].discard(reference.id)
+            self.written += 1
+            if self.written % 5000 == 0:
+                logging.info(f"書き込み進捗: {self.written}/{self.queued}件 ({self._rate():,.0f} 件/秒)")
+
+    def _on_error(self, failure: BulkWriteFailure, bulk_writer) -> bool:
+        reference = failure.operation.reference
+        with self._lock:
+            if failure.code in CONTENTION_CODES:
+                self._back_off()
+            if failure.code in RETRYABLE_CODES and failure.attempts < self.max_attempts:
+                self.retried += 1
+                return True
+            self.pending[reference.parent.id].discard(reference.id)
+            self.failed[reference.parent.id].add(reference.id)
+        logging.error(f"書き込みに失敗しました: {reference.path} (code={failure.code}, {failure.attempts + 1}回目): {failure.message}")
+        return False
+
+    def _back_off(self) -> None:
+        """上限速度を半分に下げる (最低は初期速度の1/10)。その後は5分ごとに50%ずつ戻していく"""
+        now = time.monotonic()
+        if now - self._last_backoff < BACKOFF_INTERVAL:
+            return
+        lowered = self.limiter.lower(self._rate())
+        if lowered is not None:
+            self._last_backoff = now
+            self.backoffs += 1
+            logging.warning(f"Firestoreが混雑しているため、書き込み速度の上限を毎秒{lowered:,.0f}件に下げます。")
+
+    def _rate(self) -> float:
+        elapsed = time.perf_counter() - self._started if self._started else 0
+        return self.written / elapsed if elapsed > 0 else 0.0
+
+    def flush(self) -> None:
+        """
+        ここまでの書き込みをすべて送り、再試行待ちの書き込みまで終わるのを待って、結果をログに出力する (何度呼んでもよい)。
+        成功を確認できなかった書き込みは failed に記録する。
+        """
+        started = time.perf_counter()
+        self.writer.flush()
+        with self._lock:
+            for collection, doc_ids in self.pending.items():
+                if doc_ids:
+                    logging.error(f"書き込みの結果を確認できませんでした: {collection} {len(doc_ids)}件 (次回のビルドでやり直します)")
+                    self.failed[collection].update(doc_ids)
+            self.pending.clear()
+        # 次の書き込みは新しい BulkWriter で送る (速度はここまでの書き込み速度から始める)
+        self.writer = self._new_writer(max(self.initial_ops_per_second, min(self.max_ops_per_second, int(self._rate()))))
+        self.timer.add(self.stage, time.perf_counter() - started, self.written - self._reported)
+        self._reported = self.written
+        failed = sum(len(ids) for ids in self.failed.values())
+        logging.info(
+            f"書き込みが完了しました: 成功 {self.written}件, 失敗 {failed}件, 再試行 {self.retried}回, "
+            f"速度の引き下げ {self.backoffs}回 | {self._rate():,.0f} 件/秒"
+        )
+
+
+class NullUploader:
+    """
+    何も書き込まずに件数だけを数える書き込み先 (ベンチマークやFirestoreを除いた処理時間の計測用)。
+    BulkUploader と同じメソッドを持つ。
+    """
+
+    def __init__(self, timer: StageTimer, stage: str = "upload"):
+        self.timer = timer
+        self.stage = stage
+        self.written = 0
+        self._reported = 0
+        self.failed: dict[str, set[str]] = defaultdict(set)
+
+    def set(self, collection: str, doc_id: str, data: dict) -> None:
+        self.written += 1
+
+    def delete(self, collection: str, doc_id: str) -> None:
+        self.written += 1
+
+    def flush(self) -> None:
+        self.timer.add(self.stage, 0.0, self.written - self._reported)
+        self._reported = self.written
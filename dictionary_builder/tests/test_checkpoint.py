@@ -0,0 +1,140 @@
+import json
+import os
+import sqlite3
+
+from exporters.sqlite_exporter import SQLiteArtifactWriter, can_resume, temporary_path
+from pipeline.checkpoint import BuildCheckpoint
+from pipeline.manifest import CollectionDiff
+
+FINGERPRINT = {"format_version": 1, "supplement_file": "/data/supplement.tsv", "supplement_size": 10,
+               "supplement_mtime": 0, "per_word_wordnet": False, "full": False}
+
+
+def make_diff(added=0, changed=0, unchanged=0) -> CollectionDiff:
+    diff = CollectionDiff("dictionary", {}, False)
+    diff.added, diff.changed, diff.unchanged = added, changed, unchanged
+    return diff
+
+
+def test_checkpoint_save_and_load(tmp_path):
+    path = str(tmp_path / "checkpoint.jsonl")
+    checkpoint = BuildCheckpoint.open(path, FINGERPRINT, resume=False)
+    checkpoint.append({"apple": (["noun"], "h1"), "bake": (["verb"], "h2")}, make_diff(added=2), {"bake"})
+    checkpoint.append({"cat": (["noun"], "h3")}, make_diff(added=2, changed=1), set(), extraction_complete=True)
+
+    loaded = BuildCheckpoint.open(path, FINGERPRINT, resume=True)
+    assert loaded.last_word == "cat"
+    assert loaded.extraction_complete
+    assert loaded.hashes == {"apple": "h1", "bake": "h2", "cat": "h3"}
+    assert loaded.headword_pos == {"apple": ["noun"], "bake": ["verb"], "cat": ["noun"]}
+    assert loaded.counts == {"added": 2, "changed": 1, "unchanged": 0}
+    assert loaded.failed == set()
+
+    diff, headword_pos = make_diff(), {}
+    loaded.restore(diff, headword_pos)
+    assert (diff.added, diff.changed, diff.hashes["bake"]) == (2, 1, "h2")
+    assert headword_pos["cat"] == ["noun"]
+
+
+def test_resume_skips_words_up_to_the_last_checkpoint(tmp_path):
+    path = str(tmp_path / "checkpoint.jsonl")
+    checkpoint = BuildCheckpoint.open(path, FINGERPRINT, resume=False)
+    checkpoint.append({"apple": (["noun"], "h1"), "bake": (["verb"], "h2")}, make_diff(added=2), set())
+    loaded = BuildCheckpoint.open(path, FINGERPRINT, resume=True)
+    assert [word for word in ["apple", "bake", "baker", "cat"] if not loaded.is_done(word)] == ["baker", "cat"]
+
+
+def test_truncated_last_line_is_redone(tmp_path):
+    path = str(tmp_path / "checkpoint.jsonl")
+    checkpoint = BuildCheckpoint.open(path, FINGERPRINT, resume=False)
+    checkpoint.append({"apple": (["noun"], "h1")}, make_diff(added=1), set())
+    with open(path, "a", encoding="utf-8") as f:
+        f.write('{"last_word": "zebra", "words": {"ze')
+    loaded = BuildCheckpoint.open(path, FINGERPRINT, resume=True)
+    assert loaded.last_word == "apple"
+    assert not loaded.is_done("bake")
+
+
+def test_changed_input_starts_over(tmp_path):
+    path = str(tmp_path / "checkpoint.jsonl")
+    BuildCheckpoint.open(path, FINGERPRINT, resume=False).append({"apple": (["noun"], "h1")}, make_diff(), set())
+    changed = {**FINGERPRINT, "supplement_size": 11}
+    loaded = BuildCheckpoint.open(path, changed, resume=True)
+    assert loaded.last_word is None
+    with open(path, encoding="utf-8") as f:
+        assert [json.loads(line) for line in f] == [changed]
+
+
+def test_without_resume_the_checkpoint_is_discarded(tmp_path):
+    path = str(tmp_path / "checkpoint.jsonl")
+    BuildCheckpoint.open(path, FINGERPRINT, resume=False).append({"apple": (["noun"], "h1")}, make_diff(), set())
+    assert BuildCheckpoint.open(path, FINGERPRINT, resume=False).last_word is None
+
+
+def read_entries(path: str) -> dict:
+    conn = sqlite3.connect(path)
+    try:
+        return {word: json.loads(data) for word, data in conn.execute("SELECT word, data FROM entries")}
+    finally:
+        conn.close()
+
+
+def test_artifact_resumes_from_committed_entries(tmp_path):
+    path = str(tmp_path / "dictionary.sqlite3")
+    writer = SQLiteArtifactWriter(path, checkpointed=True)
+    writer.add("apple", {"word": "apple"})
+    writer.commit()
+    writer.add("bake", {"word": "bake"})
+    # commit() せずに止まったビルド: チェックポイント以降の書き込みは残らない
+    writer._conn.close()
+
+    assert can_resume(path)
+    resumed = SQLiteArtifactWriter(path, resume=True, checkpointed=True)
+    assert resumed.count == 1
+    resumed.add("bake", {"word": "bake", "v": 2})
+    resumed.close()
+
+    assert read_entries(path) == {"apple": {"word": "apple"}, "bake": {"word": "bake", "v": 2}}
+    conn = sqlite3.connect(path)
+    try:
+        # バックエンドが読み込み専用で開けるように、WALモードのままにしない
+        assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "delete"
+        assert dict(conn.execute("SELECT key, value FROM meta"))["entry_count"] == "2"
+    finally:
+        conn.close()
+    assert not os.path.exists(temporary_path(path))
+    assert not os.path.exists(temporary_path(path) + "-wal")
+
+
+def test_corrupt_temporary_file_is_discarded(tmp_path):
+    path = str(tmp_path / "dictionary.sqlite3")
+    writer = SQLiteArtifactWriter(path, checkpointed=True)
+    for i in range(2000):
+        writer.add(f"word{i:04d}", {"word": f"word{i:04d}", "padding": "x" * 200})
+    writer.commit()
+    writer._conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    writer._conn.close()
+    # B木のページ (ヘッダーを含む) を壊す
+    with open(temporary_path(path), "r+b") as f:
+        f.seek(4096 * 3)
+        f.write(b"\xff" * 4096)
+
+    assert not can_resume(path)
+    assert not os.path.exists(temporary_path(path))
+
+
+def test_missing_temporary_file_cannot_resume(tmp_path):
+    assert not can_resume(str(tmp_path / "dictionary.sqlite3"))
+
+
+def test_new_build_removes_stale_wal(tmp_path):
+    path = str(tmp_path / "dictionary.sqlite3")
+    writer = SQLiteArtifactWriter(path, checkpointed=True)
+    writer.add("stale", {"word": "stale"})
+    writer.commit()
+    writer._conn.close()
+    fresh = SQLiteArtifactWriter(path, checkpointed=True)
+    assert fresh.count == 0
+    fresh.add("apple", {"word": "apple"})
+    fresh.close()
+    assert read_entries(path) == {"apple": {"word": "apple"}}
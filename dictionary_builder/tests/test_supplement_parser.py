@@ -0,0 +1,101 @@
+import logging
+import random
+import re
+
+import pytest
+
+from parsers import supplement_parser
+from parsers.supplement_parser import iter_supplement_groups, load_supplement_data, sort_supplement_file
+
+
+def write_lines(path, lines):
+    path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+    return str(path)
+
+
+def make_lines(words, rows_per_word, seed=0):
+    """単語ごとに rows_per_word 行 (行番号 n を含む) を作り、シャッフルした行のリストを返す"""
+    lines = [f'word={word} noun="{word}{n}" example="{word} example {n}"' for word in words for n in range(rows_per_word)]
+    random.Random(seed).shuffle(lines)
+    return lines
+
+
+def spilled_runs(caplog) -> int:
+    for record in caplog.records:
+        match = re.search(r"一時ファイル (\d+)個", record.getMessage())
+        if match:
+            return int(match.group(1))
+    return 0
+
+
+def test_unsorted_input_spanning_several_spill_files(tmp_path, caplog):
+    words = [f"w{i:02d}" for i in range(30)]
+    path = write_lines(tmp_path / "supplement.tsv", make_lines(words, 3))
+    with caplog.at_level(logging.INFO):
+        groups = list(iter_supplement_groups(path, buffer_lines=7))
+    assert spilled_runs(caplog) == 13  # 90行を7行ずつ
+    expected = load_supplement_data(path)
+    assert [key for key, _ in groups] == sorted(expected)
+    assert dict(groups) == expected
+
+
+def test_duplicate_headwords_across_chunk_boundaries_keep_file_order(tmp_path):
+    # 同じ単語の行が複数の一時ファイルにまたがっても、1語にまとまり、元のファイルの順序を保つ
+    lines = []
+    for n in range(10):
+        lines.append(f'word=Run noun="run{n}"')
+        lines.append(f'word=apple noun="apple{n}"')
+        lines.append(f'word="ice cream" noun="ice{n}"')
+    path = write_lines(tmp_path / "supplement.tsv", lines)
+    groups = list(iter_supplement_groups(path, buffer_lines=4))
+    assert [key for key, _ in groups] == ["apple", "ice cream", "run"]
+    for key, rows in groups:
+        prefix = {"apple": "apple", "ice cream": "ice", "run": "run"}[key]
+        assert rows == [{"noun": f"{prefix}{n}"} for n in range(10)]
+
+
+def test_skipped_lines_are_not_grouped(tmp_path):
+    path = write_lines(tmp_path / "supplement.tsv", ["word=b noun=x", "", "not a word line", 'word="" noun=y', "word=a noun=z"])
+    assert list(iter_supplement_groups(path, buffer_lines=2)) == [("a", [{"noun": "z"}]), ("b", [{"noun": "x"}])]
+
+
+def test_sorted_fast_path_does_not_sort(tmp_path, monkeypatch):
+    lines = sorted(make_lines(["alpha", "beta", "gamma"], 2), key=lambda line: line.split()[0])
+    path = write_lines(tmp_path / "supplement.tsv", lines)
+
+    def fail(*args, **kwargs):
+        raise AssertionError("並べ替え済みのファイルを並べ替えた")
+
+    monkeypatch.setattr(supplement_parser, "sort_supplement_file", fail)
+    # --supplement-sorted (presorted=True) では並び順の確認もしない
+    monkeypatch.setattr(supplement_parser, "is_supplement_sorted", fail)
+    assert [key for key, _ in iter_supplement_groups(path, presorted=True)] == ["alpha", "beta", "gamma"]
+
+
+def test_sorted_input_is_detected_without_sorting(tmp_path, monkeypatch):
+    path = write_lines(tmp_path / "supplement.tsv", ["word=a noun=1", "word=a noun=2", "word=b noun=3"])
+    monkeypatch.setattr(supplement_parser, "sort_supplement_file", lambda *args: pytest.fail("並べ替えた"))
+    assert list(iter_supplement_groups(path)) == [("a", [{"noun": "1"}, {"noun": "2"}]), ("b", [{"noun": "3"}])]
+
+
+def test_sorted_flag_with_unsorted_input_raises(tmp_path):
+    path = write_lines(tmp_path / "supplement.tsv", ["word=b noun=1", "word=a noun=2"])
+    groups = iter_supplement_groups(path, presorted=True)
+    with pytest.raises(ValueError, match="単語順に並んでいません"):
+        list(groups)
+
+
+@pytest.mark.parametrize("line_count, buffer_lines, runs", [
+    (6, 6, 1),   # ちょうど buffer_lines 行なら一時ファイルは1個 (空の一時ファイルを作らない)
+    (7, 6, 2),
+    (5, 6, 1),
+    (6, 1, 6),
+])
+def test_sort_buffer_lines_boundary(tmp_path, caplog, line_count, buffer_lines, runs):
+    lines = [f"word=w{i} noun=n{i}" for i in reversed(range(line_count))]
+    source = write_lines(tmp_path / "supplement.tsv", lines)
+    output = tmp_path / "sorted.tsv"
+    with caplog.at_level(logging.INFO):
+        sort_supplement_file(source, str(output), buffer_lines)
+    assert spilled_runs(caplog) == runs
+    assert output.read_text(encoding="utf-8").splitlines() == sorted(lines)
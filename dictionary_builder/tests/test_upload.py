@@ -0,0 +1,179 @@
+import threading
+
+import pytest
+from google.auth.credentials import AnonymousCredentials
+from google.cloud import firestore
+from google.cloud.firestore_v1.types import BatchWriteResponse, write as write_pb2
+from google.rpc import status_pb2
+
+from pipeline.timing import StageTimer
+from pipeline.upload import RAMP_UP_INTERVAL, BulkUploader, WriteRateLimiter
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+        self.slept = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+    def sleep(self, seconds: float) -> None:
+        self.slept += seconds
+        self.now += seconds
+
+
+def make_limiter(max_ops=1000, min_ops=50):
+    clock = FakeClock()
+    return WriteRateLimiter(max_ops, min_ops, clock=clock, sleep=clock.sleep), clock
+
+
+def test_does_not_wait_below_the_ceiling():
+    limiter, clock = make_limiter()
+    for _ in range(1000):
+        assert limiter.acquire() == 0.0
+    assert clock.slept == 0.0
+
+
+def test_enforces_the_ceiling():
+    limiter, clock = make_limiter(max_ops=100)
+    for _ in range(100 + 300):
+        limiter.acquire()
+    # 1秒分のトークンを使い切った後は、毎秒100件の速度で待つ
+    assert clock.slept == pytest.approx(3.0)
+
+
+def test_lower_halves_the_smaller_of_ceiling_and_observed_rate():
+    limiter, _ = make_limiter(max_ops=10000, min_ops=50)
+    assert limiter.lower(observed_ops_per_second=800) == 400
+    assert limiter.lower(observed_ops_per_second=0) == 200
+    assert limiter.lower(observed_ops_per_second=5000) == 100
+    assert limiter.lower(observed_ops_per_second=100) == 50
+    # 最低値からは下げない
+    assert limiter.lower(observed_ops_per_second=100) is None
+    assert limiter.ops_per_second == 50
+
+
+def test_lowered_ceiling_is_enforced_immediately():
+    limiter, clock = make_limiter(max_ops=1000, min_ops=10)
+    limiter.lower(observed_ops_per_second=200)
+    for _ in range(100 + 200):
+        limiter.acquire()
+    assert clock.slept == pytest.approx(2.0)
+
+
+def test_ceiling_ramps_back_up_without_contention():
+    limiter, clock = make_limiter(max_ops=1000, min_ops=10)
+    limiter.lower(observed_ops_per_second=400)
+    assert limiter.ops_per_second == 200
+    clock.now += RAMP_UP_INTERVAL
+    limiter.acquire()
+    assert limiter.ops_per_second == 300
+    for _ in range(5):
+        clock.now += RAMP_UP_INTERVAL
+        limiter.acquire()
+    assert limiter.ops_per_second == 1000
+
+
+class StubFirestoreAPI:
+    """batch_write だけを持つFirestore APIの代わり。failures に {ドキュメントID: [失敗のコード, ...]} を指定すると、その順に失敗させる"""
+
+    def __init__(self, failures=None):
+        self.failures = {doc_id: list(codes) for doc_id, codes in (failures or {}).items()}
+        self.committed: list[tuple[str, str]] = []
+        self.requests = 0
+        self._lock = threading.Lock()
+
+    def batch_write(self, request, metadata=None, **kwargs):
+        statuses, results = [], []
+        with self._lock:
+            self.requests += 1
+            for write in request["writes"]:
+                name = write.update.name if write.update.name else write.delete
+                doc_id = name.rsplit("/", 1)[1]
+                codes = self.failures.get(doc_id)
+                code = codes.pop(0) if codes else 0
+                statuses.append(status_pb2.Status(code=code, message="" if code == 0 else "stub failure"))
+                results.append(write_pb2.WriteResult())
+                if code == 0:
+                    self.committed.append(("set" if write.update.name else "delete", doc_id))
+        return BatchWriteResponse(write_results=results, status=statuses)
+
+
+def make_uploader(failures=None, max_attempts=10):
+    db = firestore.Client(project="test-project", credentials=AnonymousCredentials())
+    api = StubFirestoreAPI(failures)
+    db._firestore_api_internal = api
+    return BulkUploader(db, StageTimer(), max_attempts=max_attempts), api
+
+
+def test_uploader_records_successful_writes():
+    uploader, api = make_uploader()
+    for i in range(45):
+        uploader.set("dictionary", f"word{i:02d}", {"word": f"word{i:02d}"})
+    uploader.delete("dictionary_inflections", "geese")
+    uploader.flush()
+    assert len(api.committed) == 46
+    assert ("delete", "geese") in api.committed
+    assert uploader.written == 46
+    assert not any(uploader.failed.values())
+
+
+def test_uploader_sends_small_batches_after_every_flush():
+    uploader, api = make_uploader()
+    for i in range(45):
+        uploader.set("dictionary", f"word{i:02d}", {"word": f"word{i:02d}"})
+    uploader.flush()
+    # 1バッチ (20件) に満たない書き込みも、2回目以降の flush() で送られる
+    for i in range(5):
+        uploader.set("dictionary", f"tail{i}", {"word": f"tail{i}"})
+    uploader.delete("dictionary", "removed")
+    uploader.flush()
+    assert len(api.committed) == 51
+    assert uploader.written == 51
+    uploader.set("dictionary_inflections", "running", {"lemmas": ["run"]})
+    uploader.flush()
+    assert api.committed[-1] == ("set", "running")
+    assert not any(uploader.failed.values())
+
+
+def test_uploader_records_permanent_failures():
+    # INVALID_ARGUMENT(3) は再試行しない
+    uploader, api = make_uploader({"bad": [3]})
+    uploader.set("dictionary", "good", {"word": "good"})
+    uploader.set("dictionary", "bad", {"word": "bad"})
+    uploader.flush()
+    assert uploader.failed["dictionary"] == {"bad"}
+    assert uploader.written == 1
+    assert uploader.retried == 0
+
+
+def test_uploader_retries_resource_exhausted_and_backs_off():
+    # RESOURCE_EXHAUSTED(8) は再試行し、上限速度を下げる
+    uploader, api = make_uploader({"busy": [8]})
+    uploader.set("dictionary", "busy", {"word": "busy"})
+    uploader.flush()
+    assert ("set", "busy") in api.committed
+    assert uploader.retried == 1
+    assert uploader.backoffs == 1
+    assert not any(uploader.failed.values())
+
+
+def test_uploader_gives_up_after_max_attempts():
+    uploader, api = make_uploader({"busy": [14, 14]}, max_attempts=1)
+    uploader.set("dictionary", "busy", {"word": "busy"})
+    uploader.flush()
+    assert uploader.failed["dictionary"] == {"busy"}
+    assert uploader.retried == 1
+    assert api.committed == []
+
+
+def test_unconfirmed_writes_are_recorded_as_failed(monkeypatch):
+    uploader, api = make_uploader()
+    uploader.set("dictionary", "apple", {"word": "apple"})
+    uploader.delete("dictionary_inflections", "geese")
+    # 送られないまま flush() が戻っても、登録済みとして扱わない
+    monkeypatch.setattr(uploader.writer, "flush", lambda: None)
+    uploader.flush()
+    assert uploader.failed == {"dictionary": {"apple"}, "dictionary_inflections": {"geese"}}
+    assert uploader.written == 0
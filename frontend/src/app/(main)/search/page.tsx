@@ -119,8 +119,10 @@ export default function SearchPage() {
         </h1>
         {searchResults && (
           <p className="text-gray-600 dark:text-gray-400">
-            {searchResults.total}件中 {(currentPage - 1) * 20 + 1}-
-            {Math.min(currentPage * 20, searchResults.total)}件を表示
+            {/* 総数はサーバーで数えられないとき null になるので、表示中の範囲だけを出す */}
+            {searchResults.total !== null && `${searchResults.total}件中 `}
+            {(currentPage - 1) * 20 + 1}-
+            {(currentPage - 1) * 20 + searchResults.wordbooks.length}件を表示
           </p>
         )}
       </div>
@@ -280,7 +282,7 @@ export default function SearchPage() {
               <WordBookList wordbooks={searchResults.wordbooks} />
 
               {/* ページネーション */}
-              {searchResults.total_pages > 1 && (
+              {(searchResults.has_prev || searchResults.has_next) && (
                 <div className="mt-8 flex justify-center">
                   <nav className="flex items-center gap-2">
                     <button
@@ -292,7 +294,9 @@ export default function SearchPage() {
                     </button>
 
                     <span className="px-3 py-2 text-sm font-medium text-gray-700 dark:text-gray-200">
-                      {currentPage} / {searchResults.total_pages}
+                      {currentPage}
+                      {searchResults.total_pages !== null &&
+                        ` / ${searchResults.total_pages}`}
                     </span>
 
                     <button
@@ -516,12 +516,14 @@ export async function getPublicWordbooks(idToken: string) {
 // 検索レスポンス用のインターフェース
 export interface SearchResponse {
   wordbooks: WordBook[]
-  total: number
+  // 総数を数えられない検索 (Firestoreへのクエリでの部分一致・カーソル指定) では null
+  total: number | null
   page: number
-  total_pages: number
+  total_pages: number | null
   has_next: boolean
   has_prev: boolean
   query: string
+  next_cursor: string | null
 }
 
 /**